@@ -0,0 +1,88 @@
+"""Micro-benchmark for the routing graph node hashing.
+
+Creates the switch box nodes of arrays up to 64x64 with 5 tracks and two bit
+widths and measures dict insertion and lookup with the structural node keys,
+compared with the XOR-based hash used before. The XOR-based hash degrades
+quadratically, so it is only timed up to ``--max-xor-size``; the number of
+unique hash values is reported for every size.
+
+Usage:
+    python benchmarks/node_hash.py [--size 64] [--num-track 5]
+"""
+import argparse
+import time
+
+from kcanal.cyclone import SwitchBoxNode, SwitchBoxSide, SwitchBoxIO
+
+
+class XORHashNode(SwitchBoxNode):
+    # previous implementation: hash is recomputed by XOR-ing the attributes
+    # and equality is object identity
+    def __hash__(self):
+        return hash(self.width) ^ hash(self.x) ^ hash(self.y) ^ \
+            hash(self.track) ^ hash(self.side) ^ hash(self.io)
+
+    def __eq__(self, other):
+        return self is other
+
+
+def create_nodes(node_cls, size, num_track, bit_widths):
+    return [node_cls(x, y, track, width, side, io)
+            for width in bit_widths
+            for x in range(size)
+            for y in range(size)
+            for track in range(num_track)
+            for side in SwitchBoxSide
+            for io in SwitchBoxIO]
+
+
+def count_hashes(nodes):
+    return len({hash(node) for node in nodes})
+
+
+def measure(nodes, repeat):
+    build = []
+    lookup = []
+    table = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        table = {node: idx for idx, node in enumerate(nodes)}
+        build.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for node in nodes:
+            _ = table[node]
+        lookup.append(time.perf_counter() - start)
+    return min(build), min(lookup)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--num-track", type=int, default=5)
+    parser.add_argument("--max-xor-size", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    bit_widths = [1, 16]
+
+    print(f"{args.num_track} tracks, bit widths {bit_widths}")
+    print(f"{'size':<8}{'hash':<12}{'nodes':>10}{'unique':>10}"
+          f"{'build (s)':>12}{'lookup (s)':>12}{'ns/lookup':>12}")
+    size = 8
+    while size <= args.size:
+        for label, node_cls in (("xor", XORHashNode),
+                                ("node key", SwitchBoxNode)):
+            nodes = create_nodes(node_cls, size, args.num_track, bit_widths)
+            line = f"{f'{size}x{size}':<8}{label:<12}{len(nodes):>10}" \
+                   f"{count_hashes(nodes):>10}"
+            if node_cls is XORHashNode and size > args.max_xor_size:
+                line += f"{'skipped':>12}"
+            else:
+                build, lookup = measure(nodes, args.repeat)
+                line += f"{build:>12.4f}{lookup:>12.4f}" \
+                        f"{lookup / len(nodes) * 1e9:>12.1f}"
+            print(line)
+        size *= 2
+
+
+if __name__ == "__main__":
+    main()
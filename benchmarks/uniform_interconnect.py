@@ -0,0 +1,49 @@
+"""Benchmark for building the routing graph with create_uniform_interconnect.
+
+Builds a pipelined Imran interconnect with 5 tracks and compares the default
+construction path, followed by compaction, with the bulk construction path.
+
+Usage:
+    python benchmarks/uniform_interconnect.py [--size 64] [--num-track 5]
+"""
+import argparse
+import time
+
+from kcanal.cyclone import SwitchBoxSide, SwitchBoxIO
+from kcanal.util import create_uniform_interconnect, SwitchBoxType, DummyCore
+
+
+def build(size, num_track, bulk):
+    def dummy_col(_, __):
+        return DummyCore()
+
+    in_conn = [(side, SwitchBoxIO.SB_IN) for side in SwitchBoxSide]
+    out_conn = [(side, SwitchBoxIO.SB_OUT) for side in SwitchBoxSide]
+    pipeline_regs = [(track, side) for track in range(num_track)
+                     for side in SwitchBoxSide]
+    return create_uniform_interconnect(size, size, 16, dummy_col,
+                                       {"in16": in_conn, "out16": out_conn},
+                                       {1: num_track}, SwitchBoxType.Imran,
+                                       pipeline_regs, bulk=bulk)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--num-track", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.size}x{args.size}, {args.num_track} tracks")
+    for label, bulk in (("default", False), ("bulk", True)):
+        start = time.perf_counter()
+        ic = build(args.size, args.num_track, bulk)
+        built = time.perf_counter()
+        store = ic.compact()
+        end = time.perf_counter()
+        print(f"{label:<10}build {built - start:8.3f}s  "
+              f"compact {end - built:8.3f}s  "
+              f"{len(store)} nodes, {store.num_edges} edges")
+
+
+if __name__ == "__main__":
+    main()
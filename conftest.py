@@ -11,11 +11,10 @@ def clear_kratos_context():
     kratos.Generator.clear_context()
 
 
-def create_dummy_interconnect_fn(chip_size_x=2, chip_size_y=2, num_tracks=5):
-    addr_width = 8
+def create_dummy_interconnect_fn(chip_size_x=2, chip_size_y=2, num_tracks=5, addr_width=8, tile_id_width=16,
+                                  **kwargs):
     data_width = 32
     bit_widths = [1, 16]
-    tile_id_width = 16
     track_length = 1
     # creates all the cores here
     # we don't want duplicated cores when snapping into different interconnect
@@ -24,7 +23,7 @@ def create_dummy_interconnect_fn(chip_size_x=2, chip_size_y=2, num_tracks=5):
     core_type = DummyCore
     for x in range(chip_size_x):
         for y in range(chip_size_y):
-            cores[(x, y)] = core_type()
+            cores[(x, y)] = core_type(addr_width, data_width)
 
     def create_core(xx: int, yy: int):
         return cores[(xx, yy)]
@@ -48,8 +47,8 @@ def create_dummy_interconnect_fn(chip_size_x=2, chip_size_y=2, num_tracks=5):
                                          SwitchBoxType.Disjoint,
                                          pipeline_regs)
         ics[bit_width] = ic
-    interconnect = Interconnect(ics, addr_width, data_width, tile_id_width,
-                                lift_ports=True)
+    interconnect = Interconnect(ics, addr_width, data_width, tile_id_width=tile_id_width,
+                                lift_ports=True, **kwargs)
     # finalize the design
     interconnect.finalize()
     return interconnect
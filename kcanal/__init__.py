@@ -1,4 +1,6 @@
 from .circuit import CB, SB, TileCircuit
 from .cyclone import SwitchBoxIO, SwitchBoxSide
-from .util import create_uniform_interconnect
+from .util import create_uniform_interconnect, create_uniform_interconnects
 from .interconnect import Interconnect
+from .bitstream import Bitstream
+from .logic import ConfigPacking
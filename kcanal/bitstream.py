@@ -0,0 +1,304 @@
+"""
+Array-backed configuration bitstream.
+
+A bitstream is kept as parallel ``uint32`` address and data arrays, optionally
+with the field mask of every entry, so that merging, conflict checking and
+writing are done in bulk by NumPy instead of one Python tuple at a time.
+
+Besides the "%08X %08X" text format read by the testbench, bitstreams can be
+written as a packed little-endian binary file with a small header (see
+BitstreamHeader) or as a NumPy .npy file, both of which are memory-mapped
+when read back.
+"""
+import struct
+import zlib
+from typing import Iterable, Iterator, List, NamedTuple, Sequence, Tuple, Union
+
+import numpy as np
+
+DTYPE = np.uint32
+ENTRY_DTYPE = np.dtype([("addr", "<u4"), ("data", "<u4")])
+
+MAGIC = b"KCBS"
+VERSION = 1
+# magic, version, address width, data width, entry count, checksum
+_HEADER = struct.Struct("<4sHBBQI4x")
+
+# ASCII code -> hex digit value, 0xFF for anything else
+_HEX_VALUES = np.full(256, 0xFF, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789ABCDEF"):
+    _HEX_VALUES[_c] = _i
+    _HEX_VALUES[ord(chr(_c).lower())] = _i
+
+
+class Bitstream:
+    def __init__(self, addr: Union[Sequence[int], np.ndarray], data: Union[Sequence[int], np.ndarray],
+                 mask: Union[Sequence[int], np.ndarray, None] = None):
+        self.addr = np.asarray(addr, dtype=DTYPE)
+        self.data = np.asarray(data, dtype=DTYPE)
+        self.mask = None if mask is None else np.asarray(mask, dtype=DTYPE)
+        if self.addr.shape != self.data.shape or (self.mask is not None and self.mask.shape != self.addr.shape):
+            raise ValueError("Bitstream address, data and mask have to be of the same length")
+
+    @staticmethod
+    def from_configs(configs: Union[Iterable[Tuple[int, ...]], np.ndarray]) -> "Bitstream":
+        """creates a bitstream from (addr, data) pairs or (addr, mask, data)
+        entries, e.g. the ones from Interconnect.get_route_config_table(), or
+        from an array with one entry per row"""
+        if isinstance(configs, np.ndarray):
+            entries = configs.astype(DTYPE, copy=False)
+        else:
+            entries = np.array(list(configs), dtype=DTYPE)
+        if len(entries) == 0:
+            return Bitstream([], [])
+        if entries.ndim != 2 or entries.shape[1] not in (2, 3):
+            raise ValueError("Bitstream entries have to be (addr, data) or (addr, mask, data)")
+        if entries.shape[1] == 2:
+            return Bitstream(entries[:, 0], entries[:, 1])
+        return Bitstream(entries[:, 0], entries[:, 2], entries[:, 1])
+
+    @staticmethod
+    def concat(bitstreams: Sequence["Bitstream"]) -> "Bitstream":
+        addr = np.concatenate([b.addr for b in bitstreams] or [np.empty(0, DTYPE)])
+        data = np.concatenate([b.data for b in bitstreams] or [np.empty(0, DTYPE)])
+        if bitstreams and all(b.mask is not None for b in bitstreams):
+            mask = np.concatenate([b.mask for b in bitstreams])
+        else:
+            mask = None
+        return Bitstream(addr, data, mask)
+
+    def __len__(self):
+        return len(self.addr)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return iter(self.to_list())
+
+    def __eq__(self, other):
+        if not isinstance(other, Bitstream):
+            return False
+        return np.array_equal(self.addr, other.addr) and np.array_equal(self.data, other.data)
+
+    def __repr__(self):
+        return f"Bitstream({len(self)} entries)"
+
+    def to_list(self) -> List[Tuple[int, int]]:
+        return list(zip(self.addr.tolist(), self.data.tolist()))
+
+    def __group(self):
+        # stable sort so that the first entry of each group is the first
+        # occurrence of the address
+        order = np.argsort(self.addr, kind="stable")
+        addr = self.addr[order]
+        starts = np.flatnonzero(np.concatenate(([True], addr[1:] != addr[:-1]))) if len(addr) else \
+            np.empty(0, dtype=np.intp)
+        return order, starts
+
+    def merge(self, base: "Bitstream" = None, check: bool = True) -> "Bitstream":
+        """ORs all the entries with the same address together. addresses are
+        kept in the order of their first occurrence. if a base image is given,
+        the merged entries are written into it read-modify-write, i.e. only the
+        masked bits of each word are replaced; entries without a mask replace
+        the whole word. conflicting writes raise ValueError when check is set"""
+        if check:
+            self.check_conflicts()
+        if len(self) == 0:
+            result = Bitstream([], [], None if self.mask is None else [])
+        else:
+            order, starts = self.__group()
+            # restore the first occurrence order
+            first = np.argsort(order[starts], kind="stable")
+            addr = self.addr[order][starts][first]
+            data = np.bitwise_or.reduceat(self.data[order], starts)[first]
+            mask = None
+            if self.mask is not None:
+                mask = np.bitwise_or.reduceat(self.mask[order], starts)[first]
+            result = Bitstream(addr, data, mask)
+        if base is None:
+            return result
+        return base.merge(check=False).__update(result)
+
+    def __update(self, other: "Bitstream") -> "Bitstream":
+        # both bitstreams have unique addresses
+        mask = np.full(len(other), 0xFFFFFFFF, dtype=DTYPE) if other.mask is None else other.mask
+        idx, hit = self.__lookup(other.addr)
+        idx = idx[hit]
+        data = self.data.copy()
+        data[idx] = (data[idx] & ~mask[hit]) | (other.data[hit] & mask[hit])
+        return Bitstream(np.concatenate((self.addr, other.addr[~hit])),
+                         np.concatenate((data, other.data[~hit] & mask[~hit])))
+
+    def __lookup(self, addr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # positions of the addresses in this bitstream, whose addresses are
+        # unique, and whether they are found at all
+        if len(self) == 0:
+            return np.zeros(len(addr), dtype=np.intp), np.zeros(len(addr), dtype=bool)
+        order = np.argsort(self.addr, kind="stable")
+        pos = np.minimum(np.searchsorted(self.addr, addr, sorter=order), len(self) - 1)
+        idx = order[pos]
+        return idx, self.addr[idx] == addr
+
+    def delta(self, old: "Bitstream") -> "Bitstream":
+        """words to be written to turn the old configuration into this one.
+        words that are missing are at their reset value, zero, and words only
+        in the old configuration are cleared"""
+        new, old = self.merge(check=False), old.merge(check=False)
+        idx, hit = old.__lookup(new.addr)
+        old_data = np.zeros(len(new), dtype=DTYPE)
+        old_data[hit] = old.data[idx[hit]]
+        changed = new.data != old_data
+        _, kept = new.__lookup(old.addr)
+        cleared = ~kept & (old.data != 0)
+        return Bitstream(np.concatenate((new.addr[changed], old.addr[cleared])),
+                         np.concatenate((new.data[changed], np.zeros(np.count_nonzero(cleared), dtype=DTYPE))))
+
+    def conflicts(self) -> np.ndarray:
+        """returns the sorted addresses where the masked fields of different
+        entries overlap and are written with different values. entries
+        without a mask can't be checked"""
+        if self.mask is None or len(self) == 0:
+            return np.empty(0, dtype=DTYPE)
+        order, starts = self.__group()
+        mask, data = self.mask[order], self.data[order]
+        # a bit is in conflict if one entry sets it and another one clears it
+        ones = np.bitwise_or.reduceat(mask & data, starts)
+        zeros = np.bitwise_or.reduceat(mask & ~data, starts)
+        return self.addr[order][starts][(ones & zeros) != 0]
+
+    def check_conflicts(self):
+        conflicts = self.conflicts()
+        if len(conflicts) > 0:
+            addrs = ", ".join(f"0x{addr:08X}" for addr in conflicts[:10].tolist())
+            if len(conflicts) > 10:
+                addrs += ", ..."
+            raise ValueError(f"Conflicting bitstream writes to {len(conflicts)} address(es): {addrs}")
+
+    def to_bursts(self, step: int = 1) -> List[Tuple[int, List[int]]]:
+        """coalesces the words into (start addr, data) bursts, where every
+        data word is at step above the previous one. entries with the same
+        address are merged first. bursts are sorted by the address bits below
+        step, then by the start address"""
+        merged = self.merge(check=False)
+        if len(merged) == 0:
+            return []
+        addr = merged.addr.astype(np.int64)
+        word, offset = addr // step, addr % step
+        order = np.lexsort((word, offset))
+        word, offset = word[order], offset[order]
+        breaks = (offset[1:] != offset[:-1]) | (word[1:] != word[:-1] + 1)
+        starts = np.flatnonzero(np.concatenate(([True], breaks)))
+        data = np.split(merged.data[order], starts[1:])
+        return [(start, words.tolist()) for start, words in zip(addr[order][starts].tolist(), data)]
+
+    def to_hex(self) -> str:
+        """formats the bitstream as "%08X %08X" lines"""
+        n = len(self)
+        if n == 0:
+            return ""
+        words = np.empty((n, 2), dtype=">u4")
+        words[:, 0] = self.addr
+        words[:, 1] = self.data
+        digits = np.frombuffer(words.tobytes().hex().upper().encode("ascii"), dtype=np.uint8).reshape(n, 16)
+        lines = np.empty((n, 18), dtype=np.uint8)
+        lines[:, :8] = digits[:, :8]
+        lines[:, 8] = ord(" ")
+        lines[:, 9:17] = digits[:, 8:]
+        lines[:, 17] = ord("\n")
+        return lines.tobytes().decode("ascii")
+
+    def write(self, filename: str):
+        """writes the text format read by the testbench through fscanf"""
+        with open(filename, "w+") as f:
+            f.write(self.to_hex())
+
+    def to_bytes(self) -> bytes:
+        """packs the bitstream as little-endian (addr, data) uint32 pairs"""
+        words = np.empty(len(self), dtype=ENTRY_DTYPE)
+        words["addr"] = self.addr
+        words["data"] = self.data
+        return words.tobytes()
+
+    def write_binary(self, filename: str, addr_width: int = 32, data_width: int = 32):
+        """writes the packed entries after a header, see BitstreamHeader"""
+        for name, values, width in (("address", self.addr, addr_width), ("data", self.data, data_width)):
+            if not 0 < width <= 32:
+                raise ValueError(f"Invalid bitstream {name} width {width}")
+            if len(values) > 0 and int(values.max()) >> width:
+                raise ValueError(f"Bitstream {name} does not fit in {width} bits")
+        payload = self.to_bytes()
+        header = BitstreamHeader(addr_width, data_width, len(self), zlib.crc32(payload))
+        with open(filename, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, *header))
+            f.write(payload)
+
+    def write_npy(self, filename: str):
+        """writes a NumPy .npy file of (addr, data) records"""
+        with open(filename, "wb") as f:
+            np.save(f, np.frombuffer(self.to_bytes(), dtype=ENTRY_DTYPE))
+
+    @staticmethod
+    def read(filename: str, mmap: bool = True, verify: bool = True) -> "Bitstream":
+        """reads a bitstream in any of the formats written above, detected by
+        the start of the file. binary and .npy files are memory-mapped unless
+        mmap is off. verify checks the checksum of binary files"""
+        with open(filename, "rb") as f:
+            start = f.read(_HEADER.size)
+        if start.startswith(MAGIC):
+            header = read_header(filename)
+            if mmap and header.count > 0:
+                entries = np.memmap(filename, dtype=ENTRY_DTYPE, mode="r", offset=_HEADER.size,
+                                    shape=(header.count,))
+            else:
+                with open(filename, "rb") as f:
+                    f.seek(_HEADER.size)
+                    entries = np.frombuffer(f.read(header.count * ENTRY_DTYPE.itemsize), dtype=ENTRY_DTYPE)
+            if len(entries) != header.count:
+                raise ValueError(f"Invalid bitstream file {filename}: truncated")
+            if verify and zlib.crc32(entries) != header.checksum:
+                raise ValueError(f"Invalid bitstream file {filename}: checksum mismatch")
+        elif start.startswith(b"\x93NUMPY"):
+            entries = np.load(filename, mmap_mode="r" if mmap else None)
+            if entries.dtype.names != ENTRY_DTYPE.names:
+                raise ValueError(f"Invalid bitstream file {filename}: unexpected record type {entries.dtype}")
+        else:
+            with open(filename, "rb") as f:
+                return Bitstream.from_hex(f.read())
+        return Bitstream(entries["addr"], entries["data"])
+
+    @staticmethod
+    def from_hex(text: Union[str, bytes]) -> "Bitstream":
+        """parses the "%08X %08X" lines written by write()"""
+        if isinstance(text, str):
+            text = text.encode("ascii")
+        text = text.replace(b"\r\n", b"\n")
+        chars = np.frombuffer(text, dtype=np.uint8)
+        if len(chars) % 18 != 0 or not np.all(chars[8::18] == ord(" ")) or not np.all(chars[17::18] == ord("\n")):
+            # not the fixed width format, e.g. hand-written
+            return Bitstream.from_configs(tuple(int(v, 16) for v in line.split()) for line in text.splitlines()
+                                          if line.strip())
+        digits = _HEX_VALUES[chars.reshape(-1, 18)]
+        if np.any(digits[:, :8] > 15) or np.any(digits[:, 9:17] > 15):
+            raise ValueError("Invalid bitstream hex digits")
+        shifts = np.arange(28, -4, -4, dtype=DTYPE)
+        addr = np.bitwise_or.reduce(digits[:, :8].astype(DTYPE) << shifts, axis=1)
+        data = np.bitwise_or.reduce(digits[:, 9:17].astype(DTYPE) << shifts, axis=1)
+        return Bitstream(addr, data)
+
+
+class BitstreamHeader(NamedTuple):
+    """header of the binary format. it is followed by count little-endian
+    (addr, data) uint32 pairs, whose CRC-32 is the checksum"""
+    addr_width: int
+    data_width: int
+    count: int
+    checksum: int
+
+
+def read_header(filename: str) -> BitstreamHeader:
+    with open(filename, "rb") as f:
+        raw = f.read(_HEADER.size)
+    if len(raw) != _HEADER.size or not raw.startswith(MAGIC):
+        raise ValueError(f"Invalid bitstream file {filename}")
+    _, version, *header = _HEADER.unpack(raw)
+    if version != VERSION:
+        raise ValueError(f"Unsupported bitstream file version {version}")
+    return BitstreamHeader(*header)
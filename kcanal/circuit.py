@@ -1,10 +1,12 @@
+import hashlib
 import kratos
 import _kratos
+from kratos import always_ff, posedge, negedge
 
 from typing import List, Dict, Tuple, Union
 from .cyclone import InterconnectCore, PortNode, Node, SwitchBox, RegisterNode, RegisterMuxNode, SwitchBoxNode, \
-    SwitchBoxIO, ImranSwitchBox, Tile
-from .logic import Configurable, Mux, FIFO, ReadyValidGenerator
+    SwitchBoxIO, ImranSwitchBox, Tile, create_name
+from .logic import Configurable, ConfigPacking, Mux, FIFO, ReadyValidGenerator, WireMux, pack_config_fields
 from .pnr import PnRTag
 
 
@@ -42,38 +44,29 @@ class Core(Configurable, InterconnectCore):
         return PnRTag(tag, priority_major, priority_minor)
 
 
-def create_name(name: str):
-    tokens = " (),"
-    for t in tokens:
-        name = name.replace(t, "_")
-    name = name.replace("__", "_")
-    if name[-1] == "_":
-        name = name[:-1]
-    return name
-
-
-def _create_mux(node: Node):
+def _create_mux(node: Node, generator: kratos.Generator = None) -> Union[Mux, WireMux]:
+    """if generator is given, single-input muxes are inlined into it as wires"""
     conn_in = node.get_conn_in()
     height = len(conn_in)
     if height == 0:
         height = 1
-    if height > 1:
-        mux = Mux.clone(height=height, width=node.width)
-        # set width parameter
-        mux.width.value = node.width
-    else:
-        mux = Mux(height=height, width=node.width)
+    if height == 1 and generator is not None:
+        return WireMux(generator, "MUX_" + node.circuit_name(), node.width)
+    # the width is a parameter, so the muxes are only keyed on the height
+    mux = Mux.clone(height=height)
+    # set width parameter
+    mux.width.value = node.width
     return mux
 
 
 def _create_reg(width) -> FIFO:
-    reg = FIFO.clone(data_width=width, depth=2)
+    reg = FIFO.clone(depth=2)
     reg.data_width.value = width
     return reg
 
 
 def _get_mux_sel_name(node: Node):
-    name = create_name(str(node))
+    name = node.circuit_name()
     sel = f"{name}_sel"
     en = f"{name}_en"
     return sel, en
@@ -87,7 +80,7 @@ class CB(Configurable):
     def __init__(self, node: PortNode, config_addr_width: int, config_data_width: int, debug: bool = False):
         self.node = node
         self.width = node.width
-        super(CB, self).__init__(create_name(str(node)), config_addr_width, config_data_width, debug=debug)
+        super(CB, self).__init__(node.circuit_name(), config_addr_width, config_data_width, debug=debug)
 
         self.mux = _create_mux(node)
         self.in_ = self.input("I", self.width, size=[self.mux.height], packed=True)
@@ -106,9 +99,9 @@ class CB(Configurable):
                        ready_in=self.ready_in, ready_out=self.ready_out, enable=self.en, sel_out=self.sel_out)
 
     def get_route_bitstream_config(self, node: Node):
-        assert node in self.node.get_conn_in()
+        assert self.node in node
         sel_name, en_name = _get_mux_sel_name(self.node)
-        idx = self.node.get_conn_in().index(node)
+        idx = self.node.get_conn_in_index(node)
         config_data = [self.get_config_data(sel_name, idx), self.get_config_data(en_name, 1)]
         return config_data
 
@@ -122,15 +115,18 @@ def _create_cb(node: PortNode, config_addr_width: int, config_data_width: int) -
 
 class SB(Configurable):
     def __init__(self, switchbox: SwitchBox, config_addr_width: int, config_data_width: int, core_name: str,
-                 debug: bool = False):
+                 inline_mux: bool = False, debug: bool = False):
+        """if inline_mux is set, single-input muxes, e.g. of the incoming tracks, are wires instead of instances"""
         name = f"SB_ID{switchbox.id}_{switchbox.num_track}TRACKS_B{switchbox.width}_{core_name}"
         super(SB, self).__init__(name, config_addr_width, config_data_width, debug=debug)
         self.switchbox = switchbox
+        self.inline_mux = inline_mux
         self.clk_en = self.clock_en("clk_en", 1)
 
-        self.sb_muxs: Dict[str, Tuple[SwitchBoxNode, Mux]] = {}
-        self.regs: Dict[str, Tuple[RegisterNode, FIFO]] = {}
-        self.reg_muxs: Dict[str, Tuple[RegisterMuxNode, Mux]] = {}
+        # indexed by node. reg_muxs is indexed by the switch box node driving the register
+        self.sb_muxs: Dict[SwitchBoxNode, Tuple[SwitchBoxNode, Union[Mux, WireMux]]] = {}
+        self.regs: Dict[RegisterNode, Tuple[RegisterNode, FIFO]] = {}
+        self.reg_muxs: Dict[SwitchBoxNode, Tuple[RegisterMuxNode, Mux]] = {}
 
         self.__create_sb_mux()
         self.__create_regs()
@@ -138,21 +134,23 @@ class SB(Configurable):
 
         self.__lift_ports()
         self.__handle_port_connection()
+        self.__create_sel_ready_ports()
+        # the fields are known up front, so that the tile can pack them together with the ones of the other features
+        self.__add_config_reg()
 
     def __create_sb_mux(self):
         sbs = self.switchbox.get_all_sbs()
         for sb in sbs:
-            sb_name = str(sb)
-            mux = _create_mux(sb)
-            self.add_child("MUX_" + create_name(sb_name), mux)
-            self.sb_muxs[sb_name] = (sb, mux)
+            mux = _create_mux(sb, self if self.inline_mux else None)
+            if isinstance(mux, Mux):
+                self.add_child("MUX_" + sb.circuit_name(), mux)
+            self.sb_muxs[sb] = (sb, mux)
 
     def __create_regs(self):
-        for reg_name, reg_node in self.switchbox.registers.items():
+        for reg_node in self.switchbox.registers.values():
             reg = _create_reg(reg_node.width)
-            inst_name = create_name(str(reg_node))
-            self.add_child(inst_name, reg, clk=self.clk, reset=self.reset)
-            self.regs[reg_name] = reg_node, reg
+            self.add_child(reg_node.circuit_name(), reg, clk=self.clk, reset=self.reset)
+            self.regs[reg_node] = reg_node, reg
 
     def __create_reg_mux(self):
         for _, reg_mux in self.switchbox.reg_muxs.items():
@@ -172,58 +170,64 @@ class SB(Configurable):
                 sb_node = node1
             else:
                 raise ValueError("expect a sb connected to the reg_mux")
-            # we use the sb_name instead so that when we lift the port up,
+            # we use the sb node instead so that when we lift the port up,
             # we can use the mux output instead
-            sb_name = str(sb_node)
             mux = _create_mux(reg_mux)
-            self.reg_muxs[sb_name] = (reg_mux, mux)
-            self.add_child(create_name(str(reg_mux)), mux)
+            self.reg_muxs[sb_node] = (reg_mux, mux)
+            self.add_child(reg_mux.circuit_name(), mux)
 
     def __lift_ports(self):
-        for sb_name, (sb, mux) in self.sb_muxs.items():
+        for sb, mux in self.sb_muxs.values():
             # only lift them if the ports are connect to the outside world
-            port_name = create_name(sb_name)
+            port_name = sb.circuit_name()
             # ready valid interface
             ready_name = f"{port_name}_ready"
             valid_name = f"{port_name}_valid"
             if sb.io == SwitchBoxIO.SB_IN:
-                p, r, v = self.port_from_def_rv(mux.in_, port_name, check_param=False)
+                if isinstance(mux, WireMux):
+                    p = self.input(port_name, sb.width, size=[1], packed=True)
+                    r = self.output(ready_name, 1)
+                    v = self.input(valid_name, 1)
+                else:
+                    p, r, v = self.port_from_def_rv(mux.in_, port_name, check_param=False)
                 self.wire(p, mux.in_)
                 self.wire(r, mux.ready_out)
                 self.wire(v, mux.valid_in)
             else:
                 # to see if we have a register mux here
                 # if so , we need to lift the reg_mux output instead
-                if sb_name in self.reg_muxs:
+                if sb in self.reg_muxs:
                     # override the mux value
                     sb_mux = mux
-                    node, mux = self.reg_muxs[sb_name]
+                    node, mux = self.reg_muxs[sb]
                     assert isinstance(node, RegisterMuxNode)
                     assert node in sb
                     #     /-- reg--\
                     # sb /          | rmux
                     #    \---------/
-                    p = self.var(f"{sb_name}_ready_merge", 1)
+                    p = self.var(f"{sb}_ready_merge", 1)
                     reg_node: Union[RegisterNode, None] = None
                     for reg_node in sb:
                         if isinstance(reg_node, RegisterNode):
                             break
                     assert reg_node is not None
-                    conn_in = node.get_conn_in()
-                    rmux_idx = conn_in.index(sb)
-                    reg_idx = conn_in.index(reg_node)
-                    reg = self.regs[reg_node.name][1]
+                    rmux_idx = node.get_conn_in_index(sb)
+                    reg_idx = node.get_conn_in_index(reg_node)
+                    reg = self.regs[reg_node][1]
                     self.wire(p, (mux.ready_out[rmux_idx] & mux.sel_out[rmux_idx]) | (
                             reg.ready_out & mux.sel_out[reg_idx]))
                     self.wire(p, sb_mux.ready_in)
 
-                p = self.port_from_def(mux.ready_in, ready_name)
-                self.wire(p, mux.ready_in)
-                p = self.port_from_def(mux.out_, port_name, check_param=False)
-                self.wire(p, mux.out_)
-
-                p = self.port_from_def(mux.valid_out, valid_name)
-                self.wire(p, mux.valid_out)
+                if isinstance(mux, WireMux):
+                    ready, out, valid = (self.input(ready_name, 1), self.output(port_name, sb.width),
+                                         self.output(valid_name, 1))
+                else:
+                    ready, out, valid = (self.port_from_def(mux.ready_in, ready_name),
+                                         self.port_from_def(mux.out_, port_name, check_param=False),
+                                         self.port_from_def(mux.valid_out, valid_name))
+                self.wire(ready, mux.ready_in)
+                self.wire(out, mux.out_)
+                self.wire(valid, mux.valid_out)
 
     def __connect_sbs(self):
         # the principle is that it only connects to the nodes within
@@ -235,8 +239,8 @@ class SB(Configurable):
                         assert node.io == SwitchBoxIO.SB_OUT
                         assert node.x == sb.x and node.y == sb.y
                         output_port = mux.out_
-                        idx = node.get_conn_in().index(sb)
-                        node_, node_mux = self.sb_muxs[str(node)]
+                        idx = node.get_conn_in_index(sb)
+                        node_, node_mux = self.sb_muxs[node]
                         assert node_ == node
                         input_port = node_mux.in_[idx]
                         self.wire(input_port, output_port)
@@ -247,17 +251,15 @@ class SB(Configurable):
             if sb.io == SwitchBoxIO.SB_OUT:
                 for node in sb:
                     if isinstance(node, RegisterNode):
-                        reg_name = node.name
-                        reg_node, reg = self.regs[reg_name]
+                        reg_node, reg = self.regs[node]
                         assert len(reg_node.get_conn_in()) == 1
                         # wire 1
                         self.wire(mux.out_, reg.data_in)
                         self.wire(mux.valid_out, reg.push)
                     elif isinstance(node, RegisterMuxNode):
                         assert len(node.get_conn_in()) == 2
-                        idx = node.get_conn_in().index(sb)
-                        sb_name = str(sb)
-                        n, reg_mux = self.reg_muxs[sb_name]
+                        idx = node.get_conn_in_index(sb)
+                        n, reg_mux = self.reg_muxs[sb]
                         assert n == node
                         # wire 2
                         self.wire(mux.out_, reg_mux.in_[idx])
@@ -274,10 +276,9 @@ class SB(Configurable):
             assert isinstance(reg_mux_conn[0], SwitchBoxNode)
             sb_node: Node = reg_mux_conn[0]
             assert node in sb_node, "register has to be connected together with a reg mux"
-            sb_name = str(sb_node)
-            n, mux = self.reg_muxs[sb_name]
+            n, mux = self.reg_muxs[sb_node]
             assert n == reg_mux_node
-            idx = reg_mux_node.get_conn_in().index(node)
+            idx = reg_mux_node.get_conn_in_index(node)
             # wire 3
             self.wire(reg.data_out, mux.in_[idx])
 
@@ -310,6 +311,21 @@ class SB(Configurable):
                 self.wire(p, mux.in_[idx])
                 self.wire(r[ready_index], mux.ready_out[idx])
                 self.wire(v, mux.valid_in[idx])
+            # the tile merges the core ready with the select of the mux. all the ports are created here, so that
+            # clones have them as well
+            if mux.height > 1 and any(isinstance(node, PortNode) for node in nodes_from):
+                self.lift(mux.sel_out, sb.circuit_name() + "_sel_out")
+
+    def __create_sel_ready_ports(self):
+        # the CB ready & select, which the incoming tracks merge in __connect_sb_in()
+        for _, (sb, _) in self.sb_muxs.items():
+            if sb.io != SwitchBoxIO.SB_IN:
+                continue
+            for node in sb:
+                if isinstance(node, PortNode):
+                    sel_name = node.name + "_sel_ready"
+                    if sel_name not in self.ports:
+                        self.input(sel_name, len(node.get_conn_in()))
 
     def __connect_sb_in(self):
         for _, (sb, sb_mux) in self.sb_muxs.items():
@@ -317,25 +333,20 @@ class SB(Configurable):
                 continue
             nodes = list(sb)
             # need to merge the ready in properly
-            sb_name = create_name(str(sb))
-            merge = self.var(f"{sb_name}_ready_merge", 1)
+            merge = self.var(f"{sb.circuit_name()}_ready_merge", 1)
             merge_vars = []
             for node in nodes:
-                idx = node.get_conn_in().index(sb)
+                idx = node.get_conn_in_index(sb)
                 if isinstance(node, SwitchBoxNode):
                     # make sure it's a mux
                     assert len(node.get_conn_in()) > 1, "Invalid routing topology"
-                    mux = self.sb_muxs[str(node)][-1]
+                    mux = self.sb_muxs[node][-1]
                     ready = mux.sel_out[idx] & mux.ready_out[idx]
                     merge_vars.append(ready)
                 else:
                     assert isinstance(node, PortNode)
                     # notice this is sel_out & with ready from the CB side
-                    sel_name = node.name + "_sel_ready"
-                    if sel_name in self.ports:
-                        p = self.ports[sel_name]
-                    else:
-                        p = self.input(sel_name, len(node.get_conn_in()))
+                    p = self.ports[node.name + "_sel_ready"]
                     merge_vars.append(p[idx])
             self.wire(merge, kratos.util.reduce_or(*merge_vars))
             self.wire(sb_mux.ready_in, merge)
@@ -366,15 +377,15 @@ class SB(Configurable):
             # get rmux address
             config_name, _ = _get_mux_sel_name(rmux)
             config_reg = self.registers[config_name]
-            index_val = rmux.get_conn_in().index(reg_node)
-            en = self.var(create_name(str(rmux)) + "_clk_en", 1)
+            index_val = rmux.get_conn_in_index(reg_node)
+            en = self.var(rmux.circuit_name() + "_clk_en", 1)
             self.wire(en, (config_reg == index_val) & self.clk_en)
             self.wire(reg.clk_en, kratos.clock_en(en))
 
     def get_route_bitstream_config(self, node_from: Node, node_to: Node):
-        assert node_from in node_to.get_conn_in()
+        assert node_to in node_from
         sel_name, en_name = _get_mux_sel_name(node_to)
-        idx = node_to.get_conn_in().index(node_from)
+        idx = node_to.get_conn_in_index(node_from)
         config_data = [self.get_config_data(sel_name, idx), self.get_config_data(en_name, 1)]
         return config_data
 
@@ -392,26 +403,61 @@ class SB(Configurable):
         self.__connect_regs()
 
         self.__connect_sb_in()
-        self.__add_config_reg()
         self.__handle_reg_clk_en()
 
         super(SB, self).finalize()
 
 
-def _create_sb(switchbox: SwitchBox, config_addr_width: int, config_data_width: int, core_name: str) -> SB:
+def _create_sb(switchbox: SwitchBox, config_addr_width: int, config_data_width: int, core_name: str,
+               inline_mux: bool = False) -> SB:
     sb = SB.clone(switchbox=switchbox, config_addr_width=config_addr_width, config_data_width=config_data_width,
-                  core_name=core_name)
+                  core_name=core_name, inline_mux=inline_mux)
     setattr(sb, "switchbox", switchbox)
     return sb
 
 
+def _get_sb_mux(sb: kratos.Generator, node: SwitchBoxNode) -> Tuple[SwitchBoxNode, Union[Mux, WireMux]]:
+    # clone cache hits are plain generators. the muxes are kept by the definition, indexed by the nodes of its own
+    # switch box, which has the same structure
+    definition: SB = sb.def_instance
+    return definition.sb_muxs[definition.switchbox.get_sb(node.side, node.track, node.io)]
+
+
+class TileConfig(Configurable):
+    """configuration registers of a tile with ConfigPacking.Tile, which holds the fields of all its features. every
+    field is an output config_<feature>_<name>, which drives the config_<name> input of the feature"""
+    def __init__(self, name: str, config_addr_width: int, config_data_width: int):
+        super(TileConfig, self).__init__(name, config_addr_width, config_data_width)
+        self.config_packing = ConfigPacking.FirstFitDecreasing
+        # (feature address, field name) -> name of the field in the tile
+        self.fields: Dict[Tuple[int, str], str] = {}
+
+    def add_field(self, feature_addr: int, feature_name: str, name: str, width: int) -> kratos.Port:
+        field_name = f"{feature_name}_{name}"
+        v = self.add_config(field_name, width)
+        p = self.output(f"config_{field_name}", width)
+        self.wire(p, v)
+        self.fields[feature_addr, name] = field_name
+        return p
+
+
 class TileCircuit(ReadyValidGenerator):
     def __init__(self, tiles: Dict[int, Tile], config_addr_width: int, config_data_width: int,
                  tile_id_width: int = 16,
-                 full_config_addr_width: int = 32, debug: bool = False):
+                 full_config_addr_width: int = 32, debug: bool = False, definition: "TileCircuit" = None,
+                 inline_mux: bool = False, register_file: bool = False,
+                 config_packing: ConfigPacking = ConfigPacking.FirstFit, burst: bool = False):
+        """if definition is given, which has to have the same signature and its ports lifted, the tile is a
+        lightweight instance of it: only the ports are created, and the CBs, SBs and configuration features are
+        shared with the definition. inline_mux is passed on to the SBs. if register_file is set, the features keep
+        their configuration in a register file. config_packing is used by all the features. if burst is set, the
+        tile has a config_en input that marks the valid beats of the configuration bus and a config_burst input: while
+        it is high, config_addr is ignored and every valid beat writes the word after the previous one"""
         self.__setup_tile_cores(tiles)
 
-        if self.core is None:
+        if definition is not None:
+            name = definition.name
+        elif self.core is None:
             name = "Tile_Empty"
         else:
             name = f"Tile_{self.core.core_name()}"
@@ -421,30 +467,67 @@ class TileCircuit(ReadyValidGenerator):
         self.config_addr_width = config_addr_width
         self.config_data_width = config_data_width
         self.tile_id_width = tile_id_width
-
-        self.clk = self.clock("clk")
-        self.clk_en = self.clock_en("clk_en")
-        # reset low
-        self.reset = self.reset("rst_n", active_high=False)
-        self.config_addr = self.input("config_addr", full_config_addr_width)
-        self.config_data = self.input("config_data", config_data_width)
+        self.definition = self if definition is None else definition
+        # instances are built like their definition
+        if definition is not None:
+            inline_mux, register_file = definition.inline_mux, definition.register_file
+            config_packing, burst = definition.config_packing, definition.burst
+        self.inline_mux = inline_mux
+        self.register_file = register_file
+        self.config_packing = config_packing
+        self.burst = burst
+        # configuration registers of the tile with ConfigPacking.Tile, created when the definition is finalized
+        self.tile_config: Union[TileConfig, None] = None
+
+        if definition is None:
+            self.clk = self.clock("clk")
+            self.clk_en = self.clock_en("clk_en")
+            # reset low
+            self.reset = self.reset("rst_n", active_high=False)
+            self.config_addr = self.input("config_addr", full_config_addr_width)
+            self.config_data = self.input("config_data", config_data_width)
+            if burst:
+                self.config_en = self.input("config_en", 1)
+                self.config_burst = self.input("config_burst", 1)
+        else:
+            self.internal_generator.copy_over_missing_ports(definition.internal_generator)
+            self.internal_generator.set_clone_ref(definition.internal_generator)
+            self.clk = self.ports.clk
+            self.clk_en = self.ports.clk_en
+            self.reset = self.ports.rst_n
+            self.config_addr = self.ports.config_addr
+            self.config_data = self.ports.config_data
+            if self.burst:
+                self.config_en = self.ports.config_en
+                self.config_burst = self.ports.config_burst
 
         # compute config addr sizes
         # (16, 24)
         full_width = full_config_addr_width
         self.full_config_addr_width = full_config_addr_width
-        self.feature_addr_slice = slice(full_width - self.tile_id_width,
-                                        full_width - self.config_addr_width)
+        self.feature_addr_slice = slice(self.tile_id_width, full_width - self.config_addr_width)
         self.feature_addr_size = self.feature_addr_slice.stop - self.feature_addr_slice.start
         # (0, 16)
         self.tile_id_slice = slice(0, self.tile_id_width)
         # (24, 32)
         self.feature_config_slice = slice(full_width - self.config_addr_width,
                                           full_width)
+        # width of the register address of every feature
+        self.feature_config_size = self.feature_config_slice.stop - self.feature_config_slice.start
+        # address increment of a burst beat, which is the next register word in Interconnect.get_config_addr()
+        self.config_burst_step = 1 << self.feature_config_slice.start
 
         self.tile_id: kratos.Port
         self.tile_en: kratos.Var
 
+        if definition is not None:
+            self.cbs: Dict[str, CB] = definition.cbs
+            self.sbs: Dict[int, SB] = definition.sbs
+            self.features: List[Configurable] = definition.features
+            self.tile_id = self.ports.tile_id
+            self.__port_lifted = True
+            return
+
         # create cb and switchbox
         self.cbs: Dict[str, CB] = {}
         self.sbs: Dict[int, SB] = {}
@@ -455,10 +538,34 @@ class TileCircuit(ReadyValidGenerator):
         self.__create_cb()
         self.__create_sb()
 
+        self.__setup_config_burst()
         self.__setup_tile_id()
 
         self.__port_lifted = False
 
+    @staticmethod
+    def get_signature(tiles: Dict[int, Tile]) -> str:
+        """structural hash of what the tile circuit is built from: the cores and, for every bit width, the switch box
+        structure (topology, pipeline registers and fanins) and the ordered fanins and fanouts of the ports, which
+        include the connections to other tiles, e.g. of margin tiles. tiles with the same signature share one
+        definition"""
+        tile = next(iter(tiles.values()))
+        core = tile.core
+        core_names = None if core is None else (core.core_name(),
+                                                tuple(a_core.name() for a_core, _ in tile.additional_cores))
+        structure = [core_names]
+        for bit_width in sorted(tiles):
+            tile = tiles[bit_width]
+            x, y = tile.x, tile.y
+            ports = tuple((name, tuple(n.relative_key(x, y) for n in node.get_conn_in()),
+                           tuple(n.relative_key(x, y) for n in node)) for name, node in sorted(tile.ports.items()))
+            structure.append((bit_width, tile.switchbox.get_structure(), ports))
+        return hashlib.blake2b(repr(structure).encode(), digest_size=16).hexdigest()
+
+    @property
+    def is_definition(self) -> bool:
+        return self.definition is self
+
     def __setup_tile_cores(self, tiles):
         x = -1
         y = -1
@@ -500,6 +607,9 @@ class TileCircuit(ReadyValidGenerator):
         self.wire(self.reset, feature.reset)
         if "clk_en" in feature.ports:
             self.wire(self.clk_en, feature.ports.clk_en)
+        if self.config_packing == ConfigPacking.Tile and not feature.is_cloned:
+            # before the feature is cloned by another tile, so that the clones have the field ports as well
+            feature.lift_config_fields()
 
     def __create_cb(self):
         for bit_width, tile in self.tiles.items():
@@ -512,7 +622,7 @@ class TileCircuit(ReadyValidGenerator):
                     if len(port_node.get_conn_in()) == 0:
                         continue
                     # create a CB
-                    cb = _create_cb(port_node, self.feature_addr_size, self.config_data_width)
+                    cb = _create_cb(port_node, self.feature_config_size, self.config_data_width)
                     self.add_feature(f"CB_{port_name}", cb)
                     self.cbs[port_name] = cb
                 else:
@@ -523,8 +633,8 @@ class TileCircuit(ReadyValidGenerator):
     def __create_sb(self):
         for bit_width, tile in self.tiles.items():
             core_name = self.core.name if self.core is not None else ""
-            sb = _create_sb(tile.switchbox, self.feature_addr_size, self.config_data_width,
-                            core_name)
+            sb = _create_sb(tile.switchbox, self.feature_config_size, self.config_data_width,
+                            core_name, self.inline_mux)
             self.add_feature(sb.name, sb)
             self.sbs[sb.switchbox.width] = sb
 
@@ -552,12 +662,12 @@ class TileCircuit(ReadyValidGenerator):
                 sb_circuit = self.sbs[bit_width]
                 if not isinstance(node, PortNode):
                     # get the internal wire
-                    n, sb_mux = sb_circuit.sb_muxs[str(node)]
-                    assert n == node
-                    sb_name = create_name(str(node))
+                    n, sb_mux = _get_sb_mux(sb_circuit, node)
+                    assert n.circuit_name() == node.circuit_name()
+                    sb_name = node.circuit_name()
                     if node.io == SwitchBoxIO.SB_IN:
                         self.wire(self.ports[sb_name], cb.in_[idx])
-                        port_name = create_name(str(node)) + "_valid"
+                        port_name = sb_name + "_valid"
                         self.wire(self.ports[port_name],
                                   cb.ports.valid_in[idx])
                     else:
@@ -597,16 +707,9 @@ class TileCircuit(ReadyValidGenerator):
                     # for IO tiles they have connections to other tiles
                     if sb_node.x != self.x or sb_node.y != self.y:
                         continue
-                    idx = sb_node.get_conn_in().index(port_node)
-                    # we need to find the actual mux
-                    n, mux = sb_circuit.sb_muxs[str(sb_node)]
-                    assert n == sb_node
-                    # check if the sel_out has been exposed to the sb_circuit
-                    sel_out_name = create_name(str(sb_node)) + "_sel_out"
-                    if sel_out_name in sb_circuit.ports:
-                        sel_out = sb_circuit.ports[sel_out_name]
-                    else:
-                        sel_out = sb_circuit.lift(mux.sel_out, sel_out_name)
+                    idx = sb_node.get_conn_in_index(port_node)
+                    # the select of the mux is lifted by the SB
+                    sel_out = sb_circuit.ports[sb_node.circuit_name() + "_sel_out"]
                     ready_name = f"{port_name}_ready"
                     ready_ports.append(sb_circuit.ports[ready_name][sb_index].and_(sel_out[idx]))
                 merge = self.var(f"{port_name}_ready_merge", 1)
@@ -628,7 +731,7 @@ class TileCircuit(ReadyValidGenerator):
             assert switchbox.switchbox.x == self.x
             assert switchbox.switchbox.y == self.y
             for sb in sbs:
-                sb_name = create_name(str(sb))
+                sb_name = sb.circuit_name()
                 assert sb.x == self.x
                 assert sb.y == self.y
                 port: _kratos.Port = switchbox.ports[sb_name]
@@ -678,11 +781,33 @@ class TileCircuit(ReadyValidGenerator):
                 else:
                     self.lift_rv(port)
 
+    def __setup_config_burst(self):
+        # the address that is decoded. during a burst, every tile increments the address of the previous beat by
+        # itself, so that only the start address has to be sent over the configuration bus. only the valid beats
+        # advance the address, the bus can be idle in between
+        if not self.burst:
+            self.config_decode_addr = self.config_addr
+            return
+        self.config_decode_addr = self.var("config_decode_addr", self.full_config_addr_width)
+        self.config_next_addr = self.var("config_next_addr", self.full_config_addr_width)
+        self.wire(self.config_decode_addr, kratos.ternary(self.config_burst, self.config_next_addr, self.config_addr))
+        self.add_always(self.config_next_addr_ff)
+
+    @always_ff((posedge, "clk"), (negedge, "rst_n"))
+    def config_next_addr_ff(self):
+        if ~self.reset:
+            self.config_next_addr = 0
+        elif self.config_en:
+            self.config_next_addr = self.config_decode_addr + self.config_burst_step
+
     def __setup_tile_id(self):
         # tile id is set up as an external port to avoid unq in synthesis
         self.tile_id = self.input("tile_id", self.tile_id_width)
         self.tile_en = self.var("tile_en", 1)
-        en = self.config_addr[self.tile_id_slice.stop - 1, self.tile_id_slice.start] == self.tile_id
+        en = self.config_decode_addr[self.tile_id_slice.stop - 1, self.tile_id_slice.start] == self.tile_id
+        if self.burst:
+            # nothing is written without a valid beat
+            en = en & self.config_en
         self.wire(self.tile_en, en)
 
     def __add_cores(self):
@@ -694,27 +819,36 @@ class TileCircuit(ReadyValidGenerator):
             self.add_feature(core.name, core)
 
     def finalize(self):
-        if self.is_cloned:
+        if self.is_cloned or not self.is_definition:
             return
 
         if not self.__port_lifted:
             self.lift_ports()
 
         for feat in self.features:
-            feat.finalize()
+            # clones, e.g. of a CB shared with another tile definition, are finalized through their definition
+            if not feat.is_cloned:
+                feat.register_file = self.register_file
+                feat.config_packing = self.config_packing
+                feat.finalize()
+        if self.config_packing == ConfigPacking.Tile:
+            self.__add_tile_config()
 
         self.__wire_cb()
         self.__connect_cb_sb()
         self.__connect_core()
 
-        # set up config addr
-        for feat_addr, feat in enumerate(self.features):
+        # set up config addr. the tile configuration is addressed after the features
+        features = self.features if self.tile_config is None else self.features + [self.tile_config]
+        assert len(features) <= 1 << self.feature_addr_size, "not enough feature address bits"
+        for feat_addr, feat in enumerate(features):
             en = self.var(feat.instance_name + "_en", 1)
-            self.wire(en, self.config_addr[self.feature_config_slice.stop - 1,
-                                           self.feature_config_slice.start].eq(feat_addr).eq(self.tile_en))
+            # the same address map as Interconnect.get_config_addr()
+            self.wire(en, self.config_decode_addr[self.feature_addr_slice.stop - 1,
+                                                  self.feature_addr_slice.start].eq(feat_addr) & self.tile_en)
             self.wire(en, feat.config_en)
             self.wire(feat.config_addr,
-                      self.config_addr[self.feature_addr_slice.stop - 1, self.feature_addr_slice.start])
+                      self.config_decode_addr[self.feature_config_slice.stop - 1, self.feature_config_slice.start])
             self.wire(feat.config_data, self.config_data)
 
     def __get_core_port(self, port_name):
@@ -725,7 +859,66 @@ class TileCircuit(ReadyValidGenerator):
                 return core.ports[port_name]
         return None
 
+    def __get_tile_field_widths(self) -> Dict[str, int]:
+        # fields of all the features, by their name in the tile configuration
+        widths = {}
+        for feature in self.features:
+            for name, v in feature.def_instance.registers.items():
+                widths[f"{feature.instance_name}_{name}"] = v.width
+        return widths
+
+    def __add_tile_config(self):
+        # all the fields are packed into the registers of the tile, which drive the field inputs of the features
+        config = TileConfig(f"{self.name}_Config", self.feature_config_size, self.config_data_width)
+        config.register_file = self.register_file
+        self.add_child("TILE_CONFIG", config)
+        self.wire(self.clk, config.clk)
+        self.wire(self.reset, config.reset)
+        for feature_addr, feature in enumerate(self.features):
+            for name, v in feature.def_instance.registers.items():
+                port = config.add_field(feature_addr, feature.instance_name, name, v.width)
+                self.wire(port, feature.ports[f"config_{name}"])
+        config.finalize()
+        self.tile_config = config
+
+    def get_num_config_words(self, packing: ConfigPacking = None) -> int:
+        """number of configuration words of the tile with the given packing, by default the one of the tile"""
+        if packing is None:
+            packing = self.config_packing
+        if packing == ConfigPacking.Tile:
+            regs, _ = pack_config_fields(self.__get_tile_field_widths(), self.config_data_width, packing)
+            return len(regs)
+        return sum(feature.def_instance.get_num_config_words(packing) for feature in self.features)
+
+    def get_config_field(self, feature_addr: int, name: str) -> Tuple[int, int, int, int]:
+        """(reg_idx, feature_addr, lo, hi) of the register that holds a configuration field of the feature at
+        feature_addr. with ConfigPacking.Tile, that is a register of the tile configuration, which is at the feature
+        address after the features. the definition has to be finalized"""
+        definition = self.definition
+        if definition.tile_config is not None:
+            feature = definition.tile_config
+            name = feature.fields[feature_addr, name]
+            feature_addr = len(definition.features)
+        else:
+            # clone cache hits are plain generators, the configuration layout is kept by the definition
+            feature = definition.features[feature_addr].def_instance
+        reg_idx, lo, hi = feature.get_config_field(name)
+        return reg_idx, feature_addr, lo, hi
+
+    def __get_field_config(self, feature_addr: int, name: str, value: int) -> Tuple[int, int, int, int]:
+        # (reg_idx, feature_addr, mask, value) of a configuration field
+        reg_idx, feature_addr, lo, hi = self.get_config_field(feature_addr, name)
+        width = hi - lo + 1
+        assert value < (1 << width)
+        return reg_idx, feature_addr, ((1 << width) - 1) << lo, value << lo
+
     def get_route_bitstream_config(self, src_node: Node, dst_node: Node) -> _BITSTREAM_TYPE:
+        return [(reg_idx, feature_addr, value)
+                for reg_idx, feature_addr, _, value in self.get_route_config_mask(src_node, dst_node)]
+
+    def get_route_config_mask(self, src_node: Node, dst_node: Node) -> List[Tuple[int, int, int, int]]:
+        """same as get_route_bitstream_config(), with the mask of the configuration field added to each entry as
+        (reg_idx, feature_addr, mask, value)"""
         assert src_node.width == dst_node.width
         tile = self.tiles[src_node.width]
         assert dst_node.x == tile.x and dst_node.y == tile.y, \
@@ -733,7 +926,7 @@ class TileCircuit(ReadyValidGenerator):
         assert dst_node in src_node, \
             f"{dst_node} is not connected to {src_node}"
 
-        config_data = dst_node.get_conn_in().index(src_node)
+        config_data = dst_node.get_conn_in_index(src_node)
         # find the circuit
         if isinstance(dst_node, SwitchBoxNode):
             circuit = self.sbs[src_node.width]
@@ -744,15 +937,51 @@ class TileCircuit(ReadyValidGenerator):
         else:
             raise NotImplementedError(type(dst_node))
         sel_name, en_name = _get_mux_sel_name(dst_node)
-        configs = []
-        reg_idx, config_data = circuit.get_config_data(sel_name, config_data)
         feature_addr = self.features.index(circuit)
-        configs.append((reg_idx, feature_addr, config_data))
-        reg_idx, config_data = circuit.get_config_data(en_name, 1)
-        feature_addr = self.features.index(circuit)
-        configs.append((reg_idx, feature_addr, config_data))
-
-        return configs
+        return [self.__get_field_config(feature_addr, sel_name, config_data),
+                self.__get_field_config(feature_addr, en_name, 1)]
+
+    def get_core_config_mask(self, configs: Dict[str, int], core: Core = None,
+                             definition: "TileCircuit" = None) -> List[Tuple[int, int, int, int]]:
+        """(reg_idx, feature_addr, mask, value) of the core configuration fields, given as name -> value. core defaults
+        to the main core of the tile. definition is the same as in get_route_config_table()"""
+        if core is None:
+            core = self.core
+        if definition is None:
+            definition = self.definition
+        # features are shared with the definition, whose cores are at the same position
+        core_idx = ([self.core] + self.additional_cores).index(core)
+        feature_addr = self.features.index(([definition.core] + definition.additional_cores)[core_idx])
+        return [definition.__get_field_config(feature_addr, name, value) for name, value in configs.items()]
+
+    def get_route_config_table(self, definition: "TileCircuit" = None) \
+            -> Dict[Tuple[Node, Node], List[Tuple[int, int, int, int]]]:
+        """(reg_idx, feature_addr, mask, value) of every connection into a configurable mux of this tile, computed in
+        one pass. the values are the same as get_route_bitstream_config(). definition is the tile whose features hold
+        the configuration register layout, by default the definition of this tile"""
+        if definition is None:
+            definition = self.definition
+        table = {}
+        for bit_width, tile in self.tiles.items():
+            sb = self.sbs.get(bit_width, None)
+            dst_nodes = []
+            if sb is not None:
+                dst_nodes += [(node, sb) for node in tile.switchbox.get_all_sbs()]
+                dst_nodes += [(node, sb) for node in tile.switchbox.reg_muxs.values()]
+            dst_nodes += [(node, self.cbs[name]) for name, node in tile.ports.items() if name in self.cbs]
+            for dst_node, circuit in dst_nodes:
+                conn_in = dst_node.get_conn_in()
+                if len(conn_in) <= 1:
+                    # no mux created
+                    continue
+                feature_addr = self.features.index(circuit)
+                sel_name, en_name = _get_mux_sel_name(dst_node)
+                sel_idx, sel_addr, sel_lo, sel_hi = definition.get_config_field(feature_addr, sel_name)
+                sel_mask = ((1 << (sel_hi - sel_lo + 1)) - 1) << sel_lo
+                en_config = definition.__get_field_config(feature_addr, en_name, 1)
+                for idx, src_node in enumerate(conn_in):
+                    table[src_node, dst_node] = [(sel_idx, sel_addr, sel_mask, idx << sel_lo), en_config]
+        return table
 
 
 if __name__ == "__main__":
@@ -4,14 +4,26 @@ https://github.com/Kuree/cgra_pnr/blob/master/cyclone/src/graph.hh
 with adjustments due to language difference.
 
 """
+import array
 import enum
+import json
+import mmap
+import struct
+import sys
 import kratos
-from typing import List, Tuple, Dict, Union, NamedTuple, Iterator
+from typing import List, Tuple, Dict, Union, NamedTuple, Iterator, Callable, \
+    Iterable, Sequence, Mapping
 from abc import abstractmethod
 
 
 MAX_DEFAULT_DELAY = 100000
 
+# binary graph file, see InterconnectGraph.save()
+GRAPH_MAGIC = b"KCGRAPH\0"
+GRAPH_VERSION = 1
+# magic, version, metadata offset and size
+GRAPH_HEADER = struct.Struct("<8sIQQ")
+
 
 @enum.unique
 class NodeType(enum.IntEnum):
@@ -19,6 +31,7 @@ class NodeType(enum.IntEnum):
     Port = enum.auto()
     Register = enum.auto()
     Generic = enum.auto()
+    RegisterMux = enum.auto()
 
 
 @enum.unique
@@ -60,6 +73,19 @@ class SBConnectionType(NamedTuple):
     io: SwitchBoxIO
 
 
+class NodeKey(NamedTuple):
+    """structural identity of a routing graph node. fields that do not apply
+    to a node type are zero or empty"""
+    kind: NodeType
+    width: int
+    x: int
+    y: int
+    track: int
+    side: int
+    io: int
+    name: str
+
+
 class InterconnectPolicy(enum.Enum):
     PassThrough = enum.auto()
     Ignore = enum.auto()
@@ -80,40 +106,98 @@ class InterconnectCore:
 
 
 class Node:
+    # graphs hold a lot of nodes, slots keep them small
+    __slots__ = ("x", "y", "width", "__neighbors", "__conn_ins",
+                 "__conn_in_list", "__conn_in_index", "__key", "__hash",
+                 "__circuit_name")
+
     def __init__(self, x: int, y: int, width: int):
         self.x = x
         self.y = y
         self.width = width
 
-        self.__neighbors = []
-        self.__conn_ins = []
-        self.__edge_cost = {}
+        # dicts keep the insertion order, which determines the mux port
+        # ordering, and give constant time membership test
+        # neighbor -> edge cost
+        self.__neighbors: Dict["Node", int] = {}
+        self.__conn_ins: Dict["Node", None] = {}
+        # cached fanin list and node -> fanin position index. both are
+        # invalidated whenever the incoming connections change
+        self.__conn_in_list: Union[List["Node"], None] = None
+        self.__conn_in_index: Union[Dict["Node", int], None] = None
+
+        # structural identity, set by the concrete node types. generic nodes
+        # fall back to object identity
+        self.__key: Union[NodeKey, None] = None
+        self.__hash = object.__hash__(self)
+        # create_name(str(self)), computed on first use
+        self.__circuit_name: Union[str, None] = None
+
+    def _set_key(self, kind: NodeType, track: int = 0, side: int = 0,
+                 io: int = 0, name: str = ""):
+        self.__key = NodeKey(kind, self.width, self.x, self.y, track,
+                             int(side), int(io), name)
+        self.__hash = hash(self.__key)
+
+    def key(self) -> Union["NodeKey", None]:
+        return self.__key
+
+    def circuit_name(self) -> str:
+        """name of the node in the generated circuit, i.e.
+        create_name(str(node)). it is computed once and interned"""
+        name = self.__circuit_name
+        if name is None:
+            name = self.__circuit_name = sys.intern(create_name(str(self)))
+        return name
+
+    def relative_key(self, x: int, y: int) -> "NodeKey":
+        """structural key with the location relative to (x, y)"""
+        key = self.key()
+        return key._replace(x=key.x - x, y=key.y - y)
 
     def add_edge(self, node: "Node", delay: int = 0,
                  force_connect: bool = False):
         if not force_connect:
             assert self.width == node.width
         if node not in self.__neighbors:
-            self.__neighbors.append(node)
-            node.__conn_ins.append(self)
-            self.__edge_cost[node] = delay
+            self.__neighbors[node] = delay
+            node.__conn_ins[self] = None
+            node.__invalidate_conn_in()
 
     def remove_edge(self, node: "Node"):
         if node in self.__neighbors:
-            self.__edge_cost.pop(node)
-            self.__neighbors.remove(node)
+            self.__neighbors.pop(node)
 
             # remove the incoming connections as well
-            node.__conn_ins.remove(self)
+            node.__conn_ins.pop(self)
+            node.__invalidate_conn_in()
+
+    def __invalidate_conn_in(self):
+        self.__conn_in_list = None
+        self.__conn_in_index = None
 
     def get_edge_cost(self, node: "Node") -> int:
-        if node not in self.__edge_cost:
-            return MAX_DEFAULT_DELAY
-        else:
-            return self.__edge_cost[node]
+        return self.__neighbors.get(node, MAX_DEFAULT_DELAY)
 
     def get_conn_in(self) -> List["Node"]:
-        return self.__conn_ins
+        # the returned list is shared, make a copy before modifying it
+        if self.__conn_in_list is None:
+            self.__conn_in_list = list(self.__conn_ins)
+        return self.__conn_in_list
+
+    def iter_conn_in(self) -> Iterator["Node"]:
+        """same as iter(get_conn_in()), without caching the list"""
+        return iter(self.__conn_ins)
+
+    def get_conn_in_index(self, node: "Node") -> int:
+        """same as get_conn_in().index(node), but in constant time"""
+        if self.__conn_in_index is None:
+            self.__conn_in_index = {n: idx for idx, n in
+                                    enumerate(self.__conn_ins)}
+        idx = self.__conn_in_index.get(node, None)
+        if idx is None:
+            raise ValueError(f"{node} is not connected to {self}")
+        return idx
 
     def __iter__(self) -> Iterator["Node"]:
         return iter(self.__neighbors)
@@ -131,21 +215,32 @@ class Node:
 
     def clear(self):
         self.__neighbors.clear()
-        self.__edge_cost.clear()
         self.__conn_ins.clear()
+        self.__invalidate_conn_in()
 
     def __contains__(self, item):
         return item in self.__neighbors
 
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Node):
+            return NotImplemented
+        key = self.key()
+        return key is not None and key == other.key()
+
     def __hash__(self):
-        return hash(self.width) ^ hash(self.x) ^ hash(self.y)
+        return self.__hash
 
 
 class PortNode(Node):
+    __slots__ = ("name",)
+
     def __init__(self, name: str, x: int, y: int, width: int):
         super().__init__(x, y, width)
 
         self.name: str = name
+        self._set_key(NodeType.Port, name=name)
 
     def node_str(self):
         return f"PORT {self.name} ({self.x}, {self.y}, {self.width})"
@@ -153,19 +248,20 @@ class PortNode(Node):
     def __repr__(self):
         return f"CB_{self.name}"
 
-    def __hash__(self):
-        return super().__hash__() ^ hash(self.name)
-
     def hash(self):
-        return hash(self.name)
+        # used by the CB clone cache: the CB mux depends on the width and fanin
+        return hash((self.name, self.width, len(self.get_conn_in())))
 
 
 class RegisterNode(Node):
+    __slots__ = ("name", "track")
+
     def __init__(self, name: str, x: int, y: int, track: int, width: int):
         super().__init__(x, y, width)
 
         self.name: str = name
         self.track: int = track
+        self._set_key(NodeType.Register, track, name=name)
 
     def node_str(self):
         return f"REG {self.name} ({self.track}, {self.x},"\
@@ -174,11 +270,10 @@ class RegisterNode(Node):
     def __repr__(self):
         return f"REG_{self.name}_B{self.width}"
 
-    def __hash__(self):
-        return super().__hash__() ^ hash(self.name) ^ hash(self.track)
-
 
 class SwitchBoxNode(Node):
+    __slots__ = ("track", "side", "io")
+
     def __init__(self, x: int, y: int, track: int, width: int,
                  side: SwitchBoxSide, io: SwitchBoxIO):
         super().__init__(x, y, width)
@@ -186,6 +281,7 @@ class SwitchBoxNode(Node):
         self.track = track
         self.side = side
         self.io = io
+        self._set_key(NodeType.SwitchBox, track, side, io)
 
     def node_str(self):
         return f"SB ({self.track}, {self.x}, {self.y}, " + \
@@ -194,12 +290,10 @@ class SwitchBoxNode(Node):
     def __repr__(self):
         return f"SB_T{self.track}_{self.side.name}_{self.io.name}_B{self.width}"
 
-    def __hash__(self):
-        return super().__hash__() ^ hash(self.track) ^ hash(self.side) ^ \
-            hash(self.io)
-
 
 class RegisterMuxNode(Node):
+    __slots__ = ("track", "side", "name")
+
     def __init__(self, x: int, y: int, track: int, width: int,
                  side: SwitchBoxSide):
         super().__init__(x, y, width)
@@ -208,6 +302,7 @@ class RegisterMuxNode(Node):
         self.side = side
 
         self.name = f"{self.side.value}_{self.track}"
+        self._set_key(NodeType.RegisterMux, track, side)
 
     def node_str(self):
         return f"RMUX ({self.track}, {self.x}, {self.y}, " +\
@@ -216,14 +311,24 @@ class RegisterMuxNode(Node):
     def __repr__(self):
         return f"RMUX_T{self.track}_{self.side.name}_B{self.width}"
 
-    def __hash__(self):
-        return super().__hash__() ^ hash(self.track) ^ hash(self.side)
+
+class SwitchBoxTemplate(NamedTuple):
+    """switch box topology shared by all the switch boxes with the same
+    number of tracks, width and internal wires. nodes are indexed in the same
+    order as get_all_sbs()"""
+    nodes: List[Tuple[int, SwitchBoxSide, SwitchBoxIO]]
+    # internal connections in wiring order, without duplicates
+    edges: List[Tuple[int, int]]
 
 
 class SwitchBox:
+    # topology templates, indexed by (num_track, width, internal_wires)
+    __templates: Dict[Tuple, SwitchBoxTemplate] = {}
+
     def __init__(self, x: int, y: int, num_track: int, width: int,
                  internal_wires: List[Tuple[int, SwitchBoxSide,
-                                            int, SwitchBoxSide]]):
+                                            int, SwitchBoxSide]],
+                 nodes: Sequence[SwitchBoxNode] = None):
         self.x = x
         self.y = y
         self.width = width
@@ -234,32 +339,60 @@ class SwitchBox:
         # TODO: set this id externally when creating ths switchbox to identify unique topology
         self.id = 0
 
-        self.__sbs: List[List[List[SwitchBoxNode]]] = \
-            [[[SwitchBoxNode(0, 0, t, 0, s, i) for t in range(self.num_track)]
-              for i in SwitchBoxIO] for s in SwitchBoxSide]
+        # hold the pipeline register related nodes
+        self.registers: Dict[str, RegisterNode] = {}
+        self.reg_muxs: Dict[str, RegisterMuxNode] = {}
 
-        # construct the internal connections
+        if nodes is None:
+            # nodes are created and connected from the topology template
+            template = SwitchBox.get_template(num_track, width,
+                                              internal_wires)
+            nodes = [SwitchBoxNode(x, y, track, width, side, io)
+                     for track, side, io in template.nodes]
+            for idx_from, idx_to in template.edges:
+                # internal sb connection has no delay
+                nodes[idx_from].add_edge(nodes[idx_to], 0)
+        self.__sbs: List[List[Sequence[SwitchBoxNode]]] = []
+        self.set_nodes(nodes)
+
+    def set_nodes(self, nodes: Sequence[Union[SwitchBoxNode, None]]):
+        """replaces the switch box nodes. nodes are given in the same order
+        as get_all_sbs() with all the sides, where removed nodes are None,
+        e.g. the nodes of a compacted graph that are created on access"""
+        assert len(nodes) == self.num_track * len(SwitchBoxSide) * \
+            len(SwitchBoxIO)
+        self.__sbs = [[[] for _ in SwitchBoxIO] for _ in SwitchBoxSide]
+        stride = len(SwitchBoxSide) * len(SwitchBoxIO)
+        idx = 0
         for side in SwitchBoxSide:
             for io in SwitchBoxIO:
-                for track in range(self.num_track):
-                    node = SwitchBoxNode(self.x, self.y, track, width,
-                                         side, io)
-                    self.__sbs[side][io][track] = node
+                self.__sbs[side][io] = nodes[idx::stride]
+                idx += 1
 
-        # assign internal wiring
+    @staticmethod
+    def get_template(num_track: int, width: int,
+                     internal_wires: List[Tuple[int, SwitchBoxSide,
+                                                int, SwitchBoxSide]]) \
+            -> SwitchBoxTemplate:
+        key = (num_track, width, tuple(internal_wires))
+        template = SwitchBox.__templates.get(key, None)
+        if template is not None:
+            return template
+        nodes = [(track, side, io) for track in range(num_track)
+                 for side in SwitchBoxSide for io in SwitchBoxIO]
+        indices = {node: idx for idx, node in enumerate(nodes)}
         # the order is in -> out
-        for conn in self.internal_wires:
-            track_from, side_from, track_to, side_to = conn
-            sb_from = \
-                self.__sbs[side_from][SwitchBoxIO.SB_IN][track_from]
-            sb_to = \
-                self.__sbs[side_to][SwitchBoxIO.SB_OUT][track_to]
-            # internal sb connection has no delay
-            sb_from.add_edge(sb_to, 0)
-
-        # hold the pipeline register related nodes
-        self.registers: Dict[str, RegisterNode] = {}
-        self.reg_muxs: Dict[str, RegisterMuxNode] = {}
+        edges: Dict[Tuple[int, int], None] = {}
+        for track_from, side_from, track_to, side_to in internal_wires:
+            if not (0 <= track_from < num_track and
+                    0 <= track_to < num_track):
+                raise IndexError("list index out of range")
+            edge = (indices[track_from, side_from, SwitchBoxIO.SB_IN],
+                    indices[track_to, side_to, SwitchBoxIO.SB_OUT])
+            edges[edge] = None
+        template = SwitchBoxTemplate(nodes, list(edges))
+        SwitchBox.__templates[key] = template
+        return template
 
     def __eq__(self, other):
         if not isinstance(other, SwitchBox):
@@ -267,14 +400,37 @@ class SwitchBox:
         if len(self.internal_wires) != len(other.internal_wires):
             return False
         # check bijection
+        other_wires = set(other.internal_wires)
         for conn in self.internal_wires:
-            if conn not in other.internal_wires:
+            if conn not in other_wires:
                 return False
         return True
 
     def __repr__(self):
         return f"SWITCH {self.width} {self.id} {self.num_track}"
 
+    def get_structure(self) -> Tuple:
+        """what the switch box circuit is built from: the topology, the
+        pipeline registers, the ordered fanins of the outgoing nodes, which
+        include the core ports, and the fanin positions of the incoming nodes
+        in the core ports they drive"""
+        fanins = tuple(tuple(n.relative_key(self.x, self.y)
+                             for n in node.get_conn_in())
+                       for node in self.get_all_sbs()
+                       if node.io == SwitchBoxIO.SB_OUT)
+        port_fanouts = tuple(tuple((n.name, n.get_conn_in_index(node),
+                                    len(n.get_conn_in()))
+                                   for n in node if isinstance(n, PortNode))
+                             for node in self.get_all_sbs()
+                             if node.io == SwitchBoxIO.SB_IN)
+        return (self.width, self.id, self.num_track,
+                tuple(sorted(self.registers)), fanins, port_fanouts)
+
+    def hash(self):
+        # structural, so that only structurally equal switch boxes hash the
+        # same, e.g. in generator caches
+        return hash(self.get_structure())
+
     def __getitem__(self, item: Tuple[SwitchBoxSide, int, SwitchBoxIO]):
         if not isinstance(item, tuple):
             raise ValueError("index has to be a tuple")
@@ -287,13 +443,24 @@ class SwitchBox:
         side, track, io = item
         return self.__sbs[side][io][track]
 
-    def get_all_sbs(self) -> List[SwitchBoxNode]:
+    def __setitem__(self, item: Tuple[SwitchBoxSide, int, SwitchBoxIO],
+                    node: SwitchBoxNode):
+        # only used to swap in a node with the same attributes, e.g. when the
+        # graph is compacted
+        side, track, io = item
+        assert node.side == side and node.track == track and node.io == io
+        self.__sbs[side][io][track] = node
+
+    def get_all_sbs(self, with_removed: bool = False) \
+            -> List[Union[SwitchBoxNode, None]]:
+        """switch box nodes in track, side, io order. removed nodes are
+        skipped, or None if with_removed is set"""
         result = []
         for track in range(self.num_track):
             for side in SwitchBoxSide:
                 for io in SwitchBoxIO:
                     sb = self.get_sb(side, track, io)
-                    if sb is not None:
+                    if sb is not None or with_removed:
                         result.append(sb)
         return result
 
@@ -390,9 +557,6 @@ class SwitchBox:
 
         return switchbox
 
-    def hash(self):
-        return hash(str(self))
-
 
 # helper class
 class DisjointSwitchBox(SwitchBox):
@@ -437,10 +601,11 @@ class Tile:
         self.height = height
 
         # create a copy of switch box because the switchbox nodes have to be
-        # created
+        # created. the internal wires are copied as well, so that the same
+        # switchbox can be used to create multiple tiles
         self.switchbox: SwitchBox = SwitchBox(x, y, switchbox.num_track,
                                               switchbox.width,
-                                              switchbox.internal_wires)
+                                              list(switchbox.internal_wires))
 
         self.ports: Dict[str, PortNode] = {}
 
@@ -595,6 +760,8 @@ class InterconnectGraph:
     def __init__(self, bit_width: int):
         self.__tiles: Dict[Tuple[int, int], Tile] = {}
         self.__switch_ids: Dict[int, SwitchBox] = {}
+        # (number of wires, set of wires) -> switch id
+        self.__switch_keys: Dict[Tuple[int, frozenset], int] = {}
 
         # this is a 2d grid  designed to support fast query with irregular
         # tile height.
@@ -602,6 +769,19 @@ class InterconnectGraph:
 
         self.bit_width = bit_width
 
+        # array-backed storage, only set when the graph is compacted
+        self.__store = None
+
+    @property
+    def store(self):
+        return self.__store
+
+    @store.setter
+    def store(self, store):
+        # only used when the graph is built directly on top of a store
+        assert self.__store is None
+        self.__store = store
+
     def add_tile(self, tile: Tile):
         tile.switchbox.id = self.__assign_id(tile.switchbox)
         x = tile.x
@@ -622,6 +802,12 @@ class InterconnectGraph:
             # adding reference to that tile
             self.__assign_tile_grid(x, i, tile)
 
+    def add_switch(self, switch: SwitchBox) -> int:
+        """registers a switch box topology ahead of the tiles and returns its
+        id, which is then shared by all the tiles with the same topology"""
+        switch.id = self.__assign_id(switch)
+        return switch.id
+
     def __assign_tile_grid(self, x: int, y: int, tile: Tile) -> None:
         self.__check_grid(x, y)
         self.__tile_grid[y][x] = tile
@@ -632,11 +818,20 @@ class InterconnectGraph:
             raise RuntimeError(f"{str(tile)} already exists")
 
     def __assign_id(self, switch: SwitchBox) -> int:
-        for switch_id, s in self.__switch_ids.items():
+        # switches with the same set of internal wires are equal, so the
+        # linear search only happens once per topology
+        key = (len(switch.internal_wires), frozenset(switch.internal_wires))
+        switch_id = self.__switch_keys.get(key, None)
+        if switch_id is not None:
+            return switch_id
+        for s_id, s in self.__switch_ids.items():
             if switch == s:
-                return switch_id
-        switch_id = len(self.__switch_ids)
-        self.__switch_ids[switch_id] = switch
+                switch_id = s_id
+                break
+        else:
+            switch_id = len(self.__switch_ids)
+            self.__switch_ids[switch_id] = switch
+        self.__switch_keys[key] = switch_id
         return switch_id
 
     def get_tile(self, x: int, y: int) -> Union[Tile, None]:
@@ -738,59 +933,14 @@ class InterconnectGraph:
             return tile.get_sb(item.side, item.track, item.io) == item
         return False
 
-    def dump_graph(self, filename: str, max_num_col):
-        with open(filename, "w+") as f:
-            padding = "  "
-            begin = "BEGIN"
-            end = "END"
-
-            def write_line(value):
-                f.write(value + "\n")
-
-            def write_conn(node_):
-                if len(node_) == 0:
-                    # don't output if it doesn't have any connections
-                    return
-                if node_.x >= max_num_col:
-                    return
-                # TODO: need to test if it is deterministic
-                write_line(padding + node_.node_str())
-                write_line(padding + begin)
-                for n in node_:
-                    if isinstance(node_, SwitchBoxNode) and \
-                            isinstance(n, SwitchBoxNode):
-                        if node_.x == n.x and node_.y == n.y:
-                            # this is internal connection so we skip
-                            continue
-                    if n.x >= max_num_col:
-                        continue
-                    write_line(padding * 3 + n.node_str())
-                write_line(padding + end)
-
-            for _, switch in self.__switch_ids.items():
-                write_line(str(switch))
-                write_line(begin)
-                for conn in switch.internal_wires:
-                    track_from, side_from, track_to, side_to = conn
-                    write_line(padding + " ".join([str(track_from),
-                                                  str(side_from.value),
-                                                  str(track_to),
-                                                  str(side_to.value)]))
-                write_line(end)
-            for (x, _), tile in self.__tiles.items():
-                if x >= max_num_col:
-                    # since x starts from 0, if x == max_num_col, we are actually out of bound
-                    continue
-                write_line(str(tile))
-                sbs = tile.switchbox.get_all_sbs()
-                for sb in sbs:
-                    write_conn(sb)
-                for _, node in tile.ports.items():
-                    write_conn(node)
-                for _, reg in tile.switchbox.registers.items():
-                    write_conn(reg)
-                for _, reg_mux in tile.switchbox.reg_muxs.items():
-                    write_conn(reg_mux)
+    def dump_graph(self, filename: str, max_num_col,
+                   check_roundtrip: bool = False) -> List[str]:
+        """writes the graph in the .graph format. with check_roundtrip, the
+        returned list holds what GraphReader can't read back the same, see
+        GraphWriter"""
+        writer = GraphWriter(self.__switch_ids.values(), self.__tiles.items(),
+                             max_num_col, self.__store, check_roundtrip)
+        return writer.write(filename)
 
     def connect_switchbox(self, x0: int, y0: int, x1: int, y1: int,
                           expected_length: int, track: int,
@@ -918,6 +1068,7 @@ class InterconnectGraph:
         # notice that we are very slopy with the switch id
         # since the equality check will make it working
         graph.__switch_ids = self.__switch_ids.copy()
+        graph.__switch_keys = self.__switch_keys.copy()
         # clone the tile grid
         for row in self.__tile_grid:
             new_row = []
@@ -969,10 +1120,687 @@ class InterconnectGraph:
             assert isinstance(node, RegisterMuxNode)
             return tile.switchbox.reg_muxs[node.name]
 
+    def get_node_index(self) -> Dict[NodeKey, Node]:
+        """maps the structural key of every node to the node"""
+        store = self.__store
+        if store is not None:
+            return dict(zip(map(store.get_key, range(len(store))),
+                            store.nodes()))
+        index = {}
+        for tile in self.__tiles.values():
+            switchbox = tile.switchbox
+            for nodes in (switchbox.get_all_sbs(), tile.ports.values(),
+                          switchbox.registers.values(),
+                          switchbox.reg_muxs.values()):
+                index.update((node.key(), node) for node in nodes)
+        return index
+
+    def compact(self):
+        """moves all the nodes into an array-backed GraphStore. the tiles
+        and switch boxes keep node ids instead of the node objects, and the
+        views into the store are created when the nodes are accessed. the
+        graph becomes read-only afterwards. the compacted graph takes less
+        memory, but the node objects are alive until the store is built, hence
+        the peak memory is above the one of the graph itself. use the bulk
+        mode of create_uniform_interconnect to build a compacted graph
+        directly"""
+        # local import since the store is built on top of the node classes
+        from .store import GraphStore, StoreNodeList, StoreNodeDict
+        if self.__store is not None:
+            return self.__store
+        nodes: List[Node] = []
+        for tile in self.__tiles.values():
+            nodes += tile.switchbox.get_all_sbs()
+            nodes += tile.ports.values()
+            nodes += tile.switchbox.registers.values()
+            nodes += tile.switchbox.reg_muxs.values()
+        store = GraphStore.from_nodes(self.bit_width, nodes)
+        # swap in the node ids, which are given in the same order as the
+        # nodes are collected. the views are created when the nodes are
+        # accessed
+        node_id = 0
+        for tile in self.__tiles.values():
+            switchbox = tile.switchbox
+            sb_ids = array.array("i")
+            for sb in switchbox.get_all_sbs(with_removed=True):
+                if sb is None:
+                    sb_ids.append(-1)
+                else:
+                    sb_ids.append(node_id)
+                    node_id += 1
+            switchbox.set_nodes(StoreNodeList(store, sb_ids))
+            ids = []
+            for nodes_dict in (tile.ports, switchbox.registers,
+                               switchbox.reg_muxs):
+                ids.append(range(node_id, node_id + len(nodes_dict)))
+                node_id += len(nodes_dict)
+            tile.ports = StoreNodeDict(store, ids[0])
+            switchbox.registers = StoreNodeDict(store, ids[1])
+            switchbox.reg_muxs = StoreNodeDict(store, ids[2])
+        self.__store = store
+        return store
+
+    def __getstate__(self):
+        """compacted graphs can be pickled, e.g. to send them across
+        processes. nodes are kept as ids into the store, and the cores are
+        dropped since they are circuits, including the additional ones. use
+        resolve_cores() to set them after unpickling"""
+        if self.__store is None:
+            raise TypeError("Only compacted graphs can be pickled")
+        # tiles may be referenced by the grid only
+        tiles: Dict[int, Tile] = {}
+        for tile in self.__tiles.values():
+            tiles[id(tile)] = tile
+        for row in self.__tile_grid:
+            for tile in row:
+                if tile is not None:
+                    tiles[id(tile)] = tile
+        tile_indices = {key: idx for idx, key in enumerate(tiles)}
+        # internal wires are shared by many tiles
+        wires: Dict[Tuple, int] = {}
+        tile_states = []
+        # node ids of each tile: switch boxes, ports, registers and register
+        # muxes. node names are the keys of the port and register dicts
+        tile_nodes = array.array("i")
+        for tile in tiles.values():
+            switchbox = tile.switchbox
+            wire_idx = wires.setdefault(tuple(switchbox.internal_wires),
+                                        len(wires))
+            sbs = switchbox.get_all_sbs()
+            for nodes in (sbs, tile.ports.values(),
+                          switchbox.registers.values(),
+                          switchbox.reg_muxs.values()):
+                tile_nodes.extend(n.node_id for n in nodes)
+            tile_states.append((
+                tile.x, tile.y, tile.track_width, tile.height,
+                switchbox.num_track, switchbox.width, switchbox.id, wire_idx,
+                len(sbs), len(tile.ports), len(switchbox.registers),
+                len(switchbox.reg_muxs), tile.inputs, tile.outputs))
+        switch_ids = {}
+        for switch_id, switch in self.__switch_ids.items():
+            switch_ids[switch_id] = (switch.x, switch.y, switch.num_track,
+                                     switch.width, switch.internal_wires)
+        return {"bit_width": self.bit_width,
+                "store": self.__store,
+                "wires": list(wires),
+                "tiles": tile_states,
+                "tile_nodes": tile_nodes,
+                "coords": [(coord, tile_indices[id(tile)])
+                           for coord, tile in self.__tiles.items()],
+                "grid": [[-1 if tile is None else tile_indices[id(tile)]
+                          for tile in row] for row in self.__tile_grid],
+                "switch_ids": switch_ids}
+
+    def __setstate__(self, state):
+        from .store import StoreNodeList, StoreNodeDict
+        self.__init__(state["bit_width"])
+        store = state["store"]
+        wires = state["wires"]
+        tile_nodes = state["tile_nodes"]
+        offset = 0
+
+        def take_nodes(count: int):
+            nonlocal offset
+            node_ids = tile_nodes[offset:offset + count]
+            offset += count
+            return node_ids
+
+        empty_switchbox = SwitchBox(0, 0, 0, self.bit_width, [])
+        tiles: List[Tile] = []
+        for x, y, track_width, height, num_track, width, switch_id, \
+                wire_idx, num_sbs, num_ports, num_registers, num_reg_muxs, \
+                inputs, outputs in state["tiles"]:
+            tile = Tile(x, y, track_width, empty_switchbox, height)
+            sbs = take_nodes(num_sbs)
+            num_sb = num_track * len(SwitchBoxSide) * len(SwitchBoxIO)
+            if len(sbs) != num_sb:
+                # some sides are removed. place the nodes by their attributes
+                sb_ids = array.array("i", [-1]) * num_sb
+                for node_id in sbs:
+                    sb_ids[(store.track[node_id] * len(SwitchBoxSide) +
+                            store.side[node_id]) * len(SwitchBoxIO) +
+                           store.io[node_id]] = node_id
+                sbs = sb_ids
+            switchbox = SwitchBox(x, y, num_track, width,
+                                  list(wires[wire_idx]),
+                                  StoreNodeList(store, sbs))
+            switchbox.id = switch_id
+            tile.ports = StoreNodeDict(store, take_nodes(num_ports))
+            switchbox.registers = StoreNodeDict(store,
+                                                take_nodes(num_registers))
+            switchbox.reg_muxs = StoreNodeDict(store,
+                                               take_nodes(num_reg_muxs))
+            tile.switchbox = switchbox
+            tile.inputs = inputs
+            tile.outputs = outputs
+            tile.core = None
+            tiles.append(tile)
+        for coord, idx in state["coords"]:
+            self.__tiles[coord] = tiles[idx]
+        self.__tile_grid = [[None if idx < 0 else tiles[idx] for idx in row]
+                            for row in state["grid"]]
+        for switch_id, (x, y, num_track, width, internal_wires) in \
+                state["switch_ids"].items():
+            tile = self.__tiles.get((x, y), None)
+            if tile is not None and tile.switchbox.id == switch_id:
+                self.__switch_ids[switch_id] = tile.switchbox
+            else:
+                self.__switch_ids[switch_id] = SwitchBox(x, y, num_track,
+                                                         width,
+                                                         internal_wires)
+        self.__store = store
+
+    def save(self, filename: str):
+        """saves the graph to a binary file, which can be loaded back with
+        load(). the graph is compacted first, hence read-only afterwards.
+        cores are not saved, see resolve_cores()
+
+        file layout: header, the store columns and the tile node ids, each
+        aligned so that they can be memory-mapped, and the rest of the tile
+        metadata (tiles, switch box topologies and the tile grid) in JSON"""
+        # local import since the store is built on top of the node classes
+        from .store import write_column
+        self.compact()
+        state = self.__getstate__()
+        store = state.pop("store")
+        tile_nodes = state.pop("tile_nodes")
+        with open(filename, "wb") as f:
+            f.write(b"\0" * GRAPH_HEADER.size)
+            state["store"] = store.write(f)
+            state["tile_nodes"] = (write_column(f, tile_nodes),
+                                   len(tile_nodes))
+            meta = json.dumps(state).encode()
+            meta_offset = f.tell()
+            f.write(meta)
+            f.seek(0)
+            f.write(GRAPH_HEADER.pack(GRAPH_MAGIC, GRAPH_VERSION, meta_offset,
+                                      len(meta)))
+
+    @staticmethod
+    def load(filename: str) -> "InterconnectGraph":
+        """loads a graph saved by save(). node and edge arrays are
+        memory-mapped. use resolve_cores() to set the cores"""
+        # local import since the store is built on top of the node classes
+        from .store import GraphStore, read_column
+        with open(filename, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(buffer) < GRAPH_HEADER.size:
+            raise ValueError(f"{filename} is not a graph file")
+        magic, version, meta_offset, meta_size = \
+            GRAPH_HEADER.unpack_from(buffer)
+        if magic != GRAPH_MAGIC:
+            raise ValueError(f"{filename} is not a graph file")
+        if version != GRAPH_VERSION:
+            raise ValueError(f"Unsupported graph file version {version}")
+        state = json.loads(buffer[meta_offset:meta_offset + meta_size])
+        state["store"] = GraphStore.from_buffer(buffer, state["store"])
+        state["tile_nodes"] = read_column(memoryview(buffer), "i",
+                                          *state["tile_nodes"])
+
+        # restore the types lost in JSON
+        def to_wires(wires):
+            return [(track_from, SwitchBoxSide(side_from), track_to,
+                     SwitchBoxSide(side_to))
+                    for track_from, side_from, track_to, side_to in wires]
+        state["wires"] = [to_wires(wires) for wires in state["wires"]]
+        state["coords"] = [(tuple(coord), idx)
+                           for coord, idx in state["coords"]]
+        state["switch_ids"] = {int(switch_id): (x, y, num_track, width,
+                                                to_wires(wires))
+                               for switch_id, (x, y, num_track, width, wires)
+                               in state["switch_ids"].items()}
+        graph = InterconnectGraph.__new__(InterconnectGraph)
+        graph.__setstate__(state)
+        return graph
+
+    def resolve_cores(self, column_core_fn: Callable[[int, int],
+                                                     InterconnectCore]):
+        """sets the cores after the graph is unpickled. the cores have to
+        have the same ports as the ones the graph is created with"""
+        for (x, y), tile in self.__tiles.items():
+            core = column_core_fn(x, y)
+            if core is not None:
+                ports = {p.name for p in core.inputs() + core.outputs()
+                         if p.width == tile.track_width}
+                assert ports.issubset(tile.ports), \
+                    f"{core.core_name()} does not match tile ({x}, {y})"
+            tile.core = core
+
     def __iter__(self):
         return iter(self.__tiles)
 
 
+class GraphWriter:
+    """writes the routing graph in the cyclone .graph format. each node is
+    serialized once, and the lines are joined into large chunks before they
+    are written to the file. compacted graphs are written directly from the
+    store arrays. with check_roundtrip, write() also returns what
+    GraphReader can't read back as it is, i.e. ports or registers without
+    any connection, e.g. the unused ports of IO tiles, and fanins of a node
+    that are not in file order"""
+    PADDING = "  "
+    BEGIN = "BEGIN"
+    END = "END"
+    # number of lines joined into a single write
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, switches: Iterable[SwitchBox],
+                 tiles: Iterable[Tuple[Tuple[int, int], Tile]],
+                 max_num_col: int, store=None, check_roundtrip: bool = False):
+        self.switches = list(switches)
+        # since x starts from 0, if x == max_num_col, we are actually out of
+        # bound
+        self.tiles = [tile for (x, _), tile in tiles if x < max_num_col]
+        self.max_num_col = max_num_col
+        self.store = store
+        self.check_roundtrip = check_roundtrip
+
+        self.__lines: List[str] = []
+        self.__f = None
+
+    def write(self, filename: str) -> List[str]:
+        """writes the graph and returns the round trip findings, which are
+        empty unless check_roundtrip is set"""
+        with open(filename, "w+") as f:
+            self.__f = f
+            try:
+                self.__write_switches()
+                if self.store is None:
+                    findings = self.__write_tiles()
+                else:
+                    findings = self.__write_tiles_compact()
+                self.__flush(force=True)
+                return findings
+            finally:
+                self.__f = None
+                self.__lines.clear()
+
+    def __flush(self, force: bool = False):
+        # lines are appended directly in the loops and flushed in between
+        if force or len(self.__lines) >= self.CHUNK_SIZE:
+            self.__f.write("".join(self.__lines))
+            self.__lines.clear()
+
+    def __write_switches(self):
+        padding = self.PADDING
+        append = self.__lines.append
+        for switch in self.switches:
+            append(f"{switch}\n{self.BEGIN}\n")
+            for track_from, side_from, track_to, side_to in \
+                    switch.internal_wires:
+                append(f"{padding}{track_from} {side_from.value} "
+                       f"{track_to} {side_to.value}\n")
+            append(self.END + "\n")
+            self.__flush()
+
+    @staticmethod
+    def __tile_nodes(tile: Tile) -> Iterator[Node]:
+        yield from tile.switchbox.get_all_sbs()
+        yield from tile.ports.values()
+        yield from tile.switchbox.registers.values()
+        yield from tile.switchbox.reg_muxs.values()
+
+    def __sink_info(self, node: Node) -> Tuple[Union[str, None],
+                                               Union[Tuple[int, int], None]]:
+        """line of the node as a connection, None if it is out of bound, and
+        its location if it is a switch box node, to skip the connections
+        inside a switch box"""
+        line = None
+        if node.x < self.max_num_col:
+            line = f"{self.PADDING * 3}{node.node_str()}\n"
+        if isinstance(node, SwitchBoxNode):
+            return line, (node.x, node.y)
+        return line, None
+
+    @staticmethod
+    def __get_findings(unconnected: Union[Node, None],
+                       unordered: Union[Node, None]) -> List[str]:
+        findings = []
+        if unconnected is not None:
+            findings.append(f"{unconnected.node_str()} has no connections and "
+                            f"is not restored by GraphReader")
+        if unordered is not None:
+            findings.append(f"fanins of {unordered.node_str()} are not in "
+                            f"file order, GraphReader restores a different "
+                            f"mux select order")
+        return findings
+
+    def __write_tiles(self) -> List[str]:
+        # indexed by node object id
+        sinks: Dict[int, Tuple] = {}
+        # fanin index of the last source written of each sink. the reader
+        # restores the fanins in file order
+        last_fanins: Dict[int, int] = {}
+        unconnected = unordered = None
+        check = self.check_roundtrip
+        sink_info = self.__sink_info
+        # node lines are the connection lines without the extra indentation
+        indent = len(self.PADDING) * 2
+        begin = f"{self.PADDING}{self.BEGIN}\n"
+        end = f"{self.PADDING}{self.END}\n"
+        append = self.__lines.append
+        for tile in self.tiles:
+            append(f"{tile}\n")
+            for node in self.__tile_nodes(tile):
+                if len(node) == 0:
+                    # don't output if it doesn't have any connections
+                    if check and unconnected is None and \
+                            not isinstance(node, SwitchBoxNode) and \
+                            not node.get_conn_in():
+                        unconnected = node
+                    continue
+                sink = sinks.get(id(node))
+                if sink is None:
+                    sink = sinks[id(node)] = sink_info(node)
+                line, location = sink
+                if line is None:
+                    continue
+                append(line[indent:] + begin)
+                for n in node:
+                    sink = sinks.get(id(n))
+                    if sink is None:
+                        sink = sinks[id(n)] = sink_info(n)
+                    line, sink_location = sink
+                    if line is None or (location is not None and
+                                        location == sink_location):
+                        # out of bound or internal connection
+                        continue
+                    append(line)
+                    if check:
+                        fanin = n.get_conn_in_index(node)
+                        if fanin < last_fanins.get(id(n), -1):
+                            unordered = unordered or n
+                        last_fanins[id(n)] = fanin
+                append(end)
+            self.__flush()
+        return self.__get_findings(unconnected, unordered)
+
+    def __write_tiles_compact(self) -> List[str]:
+        store = self.store
+        padding = self.PADDING * 3
+        sb = int(NodeType.SwitchBox)
+        sinks = [(f"{padding}{node_str}\n" if x < self.max_num_col else None,
+                  (x, y) if kind == sb else None)
+                 for node_str, kind, x, y in zip(store.node_strs(), store.kind,
+                                                 store.x, store.y)]
+        offsets = store.fanout_offsets.tolist()
+        fanouts = store.fanouts.tolist()
+        indent = len(self.PADDING) * 2
+        begin = f"{self.PADDING}{self.BEGIN}\n"
+        end = f"{self.PADDING}{self.END}\n"
+        append = self.__lines.append
+        # nodes in file order, for the checks
+        node_ids = array.array("q")
+        for tile in self.tiles:
+            append(f"{tile}\n")
+            for node in self.__tile_nodes(tile):
+                node_id = node.node_id
+                node_ids.append(node_id)
+                lo = offsets[node_id]
+                hi = offsets[node_id + 1]
+                line, location = sinks[node_id]
+                if lo == hi or line is None:
+                    continue
+                append(line[indent:] + begin)
+                for sink_id in fanouts[lo:hi]:
+                    line, sink_location = sinks[sink_id]
+                    if line is None or (location is not None and
+                                        location == sink_location):
+                        continue
+                    append(line)
+                append(end)
+            self.__flush()
+        if not self.check_roundtrip:
+            return []
+        return self.__check_compact(node_ids)
+
+    def __check_compact(self, node_ids: array.array) -> List[str]:
+        # same checks as in __write_tiles, on the store arrays
+        import numpy as np
+        store = self.store
+        node_ids = np.frombuffer(node_ids, dtype=np.int64)
+        fanout_offsets = np.asarray(store.fanout_offsets, dtype=np.int64)
+        fanin_offsets = np.asarray(store.fanin_offsets, dtype=np.int64)
+        fanouts = np.asarray(store.fanouts, dtype=np.int64)
+        fanins = np.asarray(store.fanins, dtype=np.int64)
+        kind = np.asarray(store.kind)
+        num_fanouts = np.diff(fanout_offsets)
+        num_fanins = np.diff(fanin_offsets)
+        is_sb = kind == int(NodeType.SwitchBox)
+        unconnected = node_ids[(num_fanouts[node_ids] == 0) &
+                               (num_fanins[node_ids] == 0) & ~is_sb[node_ids]]
+        # fanin index of every connection, found through the (src, dst) keys
+        num_nodes = len(store)
+        fanin_dst = np.repeat(np.arange(num_nodes), num_fanins)
+        fanin_keys = fanins * num_nodes + fanin_dst
+        key_order = np.argsort(fanin_keys)
+        fanin_index = np.arange(len(fanins)) - fanin_offsets[fanin_dst]
+        # connections in file order
+        counts = num_fanouts[node_ids]
+        edges = np.repeat(fanout_offsets[node_ids], counts) + \
+            np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                counts)
+        src = np.repeat(node_ids, counts)
+        dst = fanouts[edges]
+        x = np.asarray(store.x)
+        y = np.asarray(store.y)
+        in_bound = x < self.max_num_col
+        internal = is_sb[src] & is_sb[dst] & (x[src] == x[dst]) & \
+            (y[src] == y[dst])
+        written = in_bound[src] & in_bound[dst] & ~internal
+        src, dst = src[written], dst[written]
+        keys = fanin_keys[key_order]
+        index = fanin_index[key_order][np.searchsorted(keys,
+                                                       src * num_nodes + dst)]
+        # per sink in file order, the fanin index has to increase
+        order = np.argsort(dst, kind="stable")
+        unordered = np.nonzero((np.diff(dst[order]) == 0) &
+                               (np.diff(index[order]) < 0))[0]
+        return self.__get_findings(
+            store.node(int(unconnected[0])) if len(unconnected) else None,
+            store.node(int(dst[order][unordered[0] + 1]))
+            if len(unordered) else None)
+
+
+class GraphReader:
+    """reads a .graph file written by GraphWriter back into a compacted, i.e.
+    read-only, InterconnectGraph. the nodes and connections go straight into
+    a GraphStore without creating node objects. node strings are parsed once,
+    and the node of each string is kept in nodes, so that routing results can
+    be resolved in bulk.
+
+    the format only keeps the connections, hence:
+        - internal switch box connections are recreated from the switch
+          topologies, and nodes without any connection are not restored
+        - connection delays are not kept, and connections are added in file
+          order. fanin order, i.e. the mux select order, matches the original
+          graph when the cores are connected to the switch boxes in track then
+          side order, as create_uniform_interconnect does
+        - cores are not kept. use resolve_cores() to set them
+
+    the file itself can't tell if the first two hold. GraphWriter reports a
+    graph that is not read back the same with check_roundtrip"""
+    def __init__(self, filename: str):
+        self.filename = filename
+        # node string -> node, whose views are created on access
+        self.nodes: Mapping[str, Node] = {}
+
+        self.__ids: Dict[str, int] = {}
+        # node columns, see GraphStore.add_nodes()
+        self.__columns: Tuple[List, ...] = ()
+        self.__edges: Tuple[List[int], List[int]] = ([], [])
+        self.__width = 0
+        # switch id -> switch, topology template and switch box nodes
+        self.__switches: Dict[int, Tuple[SwitchBox, SwitchBoxTemplate,
+                                         List[Tuple[int, int, int]]]] = {}
+        # per tile: tile, switch id, base node id and node ids of the ports,
+        # registers and register muxes
+        self.__tiles: List[Tuple[Tile, int, int, List[int], List[int],
+                                 List[int]]] = []
+        self.__tile_index: Dict[Tuple[int, int], int] = {}
+
+    def read(self) -> InterconnectGraph:
+        # local import since the store is built on top of the node classes
+        from .store import GraphStore, StoreNodeList, StoreNodeDict
+        import numpy as np
+        with open(self.filename) as f:
+            lines = f.read().splitlines()
+        self.__columns = ([], [], [], [], [], [], [])
+        self.__edges = ([], [])
+        try:
+            start = self.__read_tiles(lines)
+            self.__read_connections(lines, start)
+        except (ValueError, IndexError, KeyError) as ex:
+            raise ValueError(f"Invalid graph file {self.filename}: {ex}") \
+                from ex
+
+        width = self.__width
+        kind, xs, ys, tracks, sides, ios, names = self.__columns
+        store = GraphStore(width)
+        store.add_nodes(kind, xs, ys, [width] * len(kind), tracks, sides, ios,
+                        names)
+        src, dst = self.__edges
+        store.set_edges(np.array(src, dtype=np.int64),
+                        np.array(dst, dtype=np.int64),
+                        np.zeros(len(src), dtype=np.int64))
+
+        graph = InterconnectGraph(width)
+        for switch_id, (switch, _, _) in self.__switches.items():
+            if graph.add_switch(switch) != switch_id:
+                raise ValueError(f"Invalid graph file {self.filename}: "
+                                 f"duplicated switch {switch_id}")
+        fanout_offsets = store.fanout_offsets
+        for tile, switch_id, base, ports, registers, reg_muxs in self.__tiles:
+            switch, template, _ = self.__switches[switch_id]
+            num_sb = len(template.nodes)
+            tile.switchbox = SwitchBox(tile.x, tile.y, switch.num_track, width,
+                                       list(switch.internal_wires),
+                                       StoreNodeList(store,
+                                                     range(base,
+                                                           base + num_sb)))
+            tile.ports = StoreNodeDict(store, ports)
+            for node_id in ports:
+                # core outputs drive the switch boxes
+                if fanout_offsets[node_id + 1] > fanout_offsets[node_id]:
+                    tile.outputs.append(store.names[node_id])
+                else:
+                    tile.inputs.append(store.names[node_id])
+            tile.switchbox.registers = StoreNodeDict(store, registers)
+            tile.switchbox.reg_muxs = StoreNodeDict(store, reg_muxs)
+            graph.add_tile(tile)
+        graph.store = store
+        self.nodes = StoreNodeDict(store, self.__ids)
+        return graph
+
+    def __read_tiles(self, lines: List[str]) -> int:
+        """reads the switches and tiles, and adds the switch box nodes and
+        the other nodes that have connections, in file order. returns the
+        line where the tiles start"""
+        idx = 0
+        while idx < len(lines) and lines[idx].startswith("SWITCH"):
+            _, width, switch_id, num_track = lines[idx].split()
+            # BEGIN
+            idx += 2
+            wires = []
+            while lines[idx] != "END":
+                track_from, side_from, track_to, side_to = \
+                    map(int, lines[idx].split())
+                wires.append((track_from, SwitchBoxSide(side_from),
+                              track_to, SwitchBoxSide(side_to)))
+                idx += 1
+            idx += 1
+            self.__width = int(width)
+            switch = SwitchBox(0, 0, int(num_track), int(width), wires)
+            template = SwitchBox.get_template(switch.num_track, switch.width,
+                                              wires)
+            self.__switches[int(switch_id)] = (switch, template, [
+                (track, side.value, io.value)
+                for track, side, io in template.nodes])
+
+        ids = self.__ids
+        width = self.__width
+        src, dst = self.__edges
+        empty_switchbox = SwitchBox(0, 0, 0, 0, [])
+        for line in lines[idx:]:
+            if line[0] == "T":
+                x, y, height, switch_id = map(int, line[6:-1].split(", "))
+                _, template, sbs = self.__switches[switch_id]
+                tile = Tile(x, y, width, empty_switchbox, height)
+                tile.core = None
+                base = self.__add_nodes(
+                    [(NodeType.SwitchBox, x, y, track, side, io, "")
+                     for track, side, io in sbs])
+                # switch box nodes are known up front, so there is no need
+                # to parse them
+                for node_id, (track, side, io) in enumerate(sbs, base):
+                    ids[f"SB ({track}, {x}, {y}, {side}, {io}, {width})"] = \
+                        node_id
+                for idx_from, idx_to in template.edges:
+                    src.append(base + idx_from)
+                    dst.append(base + idx_to)
+                self.__tile_index[x, y] = len(self.__tiles)
+                self.__tiles.append((tile, switch_id, base, [], [], []))
+            elif line[2] == "P" or line[2] == "R":
+                # ports, registers and register muxes with connections are
+                # listed in the same order as they are stored in the tile
+                self.__get_id(line[2:])
+        return idx
+
+    def __read_connections(self, lines: List[str], start: int):
+        ids = self.__ids
+        get_id = self.__get_id
+        src, dst = self.__edges
+        node_id = -1
+        for line in lines[start:]:
+            if line.startswith("      "):
+                name = line[6:]
+                sink_id = ids.get(name)
+                if sink_id is None:
+                    sink_id = get_id(name)
+                src.append(node_id)
+                dst.append(sink_id)
+            elif line[0] == " " and line != "  BEGIN" and line != "  END":
+                name = line[2:]
+                node_id = ids.get(name)
+                if node_id is None:
+                    node_id = get_id(name)
+
+    def __add_nodes(self, nodes: List[Tuple]) -> int:
+        base = len(self.__columns[0])
+        for column, values in zip(self.__columns, zip(*nodes)):
+            column.extend(values)
+        return base
+
+    def __get_id(self, name: str) -> int:
+        node_id = self.__ids.get(name)
+        if node_id is not None:
+            return node_id
+        kind, _, args = name.partition(" ")
+        node_name, _, values = args.rpartition("(")
+        values = list(map(int, values[:-1].split(", ")))
+        if kind == "PORT":
+            x, y, _ = values
+            node = (NodeType.Port, x, y, 0, 0, 0, node_name[:-1])
+            slot = 3
+        elif kind == "REG":
+            track, x, y, _ = values
+            node = (NodeType.Register, x, y, track, 0, 0, node_name[:-1])
+            slot = 4
+        elif kind == "RMUX":
+            track, x, y, side, _ = values
+            node = (NodeType.RegisterMux, x, y, track, side, 0, "")
+            slot = 5
+        else:
+            # switch box nodes are added with the tiles
+            raise ValueError(f"unknown node {name}")
+        node_id = len(self.__columns[0])
+        for column, value in zip(self.__columns, node):
+            column.append(value)
+        self.__tiles[self.__tile_index[x, y]][slot].append(node_id)
+        self.__ids[name] = node_id
+        return node_id
+
+
 def mod(a: int, b: int):
     while a < 0:
         a += b
@@ -1136,10 +1964,12 @@ class SwitchBoxHelper:
         return result
 
 
+# replaces the tokens " (),", which are not allowed in names, with "_"
+_NAME_TABLE = str.maketrans(" (),", "____")
+
+
 def create_name(name: str):
-    tokens = " (),"
-    for t in tokens:
-        name = name.replace(t, "_")
+    name = name.translate(_NAME_TABLE)
     name = name.replace("__", "_")
     if name[-1] == "_":
         name = name[:-1]
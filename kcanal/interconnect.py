@@ -1,26 +1,47 @@
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Union
 
-from .cyclone import InterconnectGraph, Tile, SwitchBoxIO, Node, SwitchBoxNode, RegisterMuxNode, create_name, \
-    SwitchBoxSide, PortNode
+from .cyclone import InterconnectGraph, Tile, SwitchBoxIO, Node, SwitchBoxNode, RegisterMuxNode, \
+    SwitchBoxSide, PortNode, NodeKey, NodeType
 from .circuit import TileCircuit
-from .logic import ReadyValidGenerator
-from .pnr import PnRTag
+from .bitstream import Bitstream
+from .logic import ReadyValidGenerator, ConfigPacking
+from .parallel import parallel_map, get_num_processes
+from .pnr import PnRTag, RouteDiagnostic, validate_routes
 
+import json
 import kratos
+import numpy as np
 import os
+import warnings
 
 
 class Interconnect(ReadyValidGenerator):
     def __init__(self, interconnects: Dict[int, InterconnectGraph],
                  config_addr_width: int = 8, config_data_width: int = 32,
                  full_config_addr_width: int = 32, tile_id_width: int = 16,
-                 lift_ports=False):
+                 lift_ports=False, inline_mux: bool = False, register_file: bool = False,
+                 config_packing: ConfigPacking = ConfigPacking.FirstFit, burst: bool = False):
+        """if inline_mux is set, single-input switch box muxes are generated as wires instead of instances. if
+        register_file is set, every configurable feature keeps its configuration words in one register file instead
+        of one register per word, with the same address map. config_packing is how the configuration fields of every
+        feature are packed into words. with ConfigPacking.Tile, the fields of all the features of a tile are packed
+        together into the registers of the tile. if burst is set, there are config_en and config_burst inputs: only
+        the beats with config_en high are written, a burst starts with a normal (config_addr, config_data) beat, and
+        every following valid beat with config_burst high only carries the data of the next word, see
+        get_burst_bitstream(). the bus may be idle, i.e. config_en low, between the beats of a burst"""
         super().__init__("Interconnect")
         self.config_data_width = config_data_width
         self.config_addr_width = config_addr_width
         self.tile_id_width = tile_id_width
+        self.burst = burst
+        # address increment of a burst beat
+        self.config_burst_step = 1 << (full_config_addr_width - config_addr_width)
         self.__graphs: Dict[int, InterconnectGraph] = interconnects
         self.__lifted_ports = lift_ports
+        # node key -> node of all the bit widths, built on demand
+        self.__node_index: Union[Dict[NodeKey, Node], None] = None
+        # (src node, dst node) -> (addr, mask, value) of the configurations, compiled on demand after finalize
+        self.__config_table: Union[Dict[Tuple[Node, Node], List[Tuple[int, int, int]]], None] = None
 
         self.__tiles: Dict[Tuple[int, int], Dict[int, Tile]] = {}
         self.tile_circuits: Dict[Tuple[int, int], TileCircuit] = {}
@@ -61,19 +82,41 @@ class Interconnect(ReadyValidGenerator):
         self.x_min, self.x_max = x_min, x_max
         self.y_min, self.y_max = y_min, y_max
 
-        # create individual tile circuits
-        unique_tiles: Dict[str, TileCircuit] = {}
+        # create individual tile circuits. tiles are deduplicated by their signature computed from the graph, so
+        # that only one circuit is elaborated per tile type and the others are lightweight instances of it
+        definition_tiles: Dict[str, TileCircuit] = {}
+        num_tile_names: Dict[str, int] = {}
+        num_module_names: Dict[str, int] = {}
         for coord, tiles in self.__tiles.items():
-            tile = TileCircuit(tiles, config_addr_width, config_data_width,
-                               tile_id_width=tile_id_width, full_config_addr_width=full_config_addr_width)
-            self.tile_circuits[coord] = tile
-            if tile.name in unique_tiles:
-                ref = unique_tiles[tile.name]
-                tile.internal_generator.copy_over_missing_ports(ref.internal_generator)
-                tile.internal_generator.set_clone_ref(ref.internal_generator)
-            else:
+            signature = TileCircuit.get_signature(tiles)
+            definition = definition_tiles.get(signature, None)
+            if definition is None:
+                tile = TileCircuit(tiles, config_addr_width, config_data_width,
+                                   tile_id_width=tile_id_width, full_config_addr_width=full_config_addr_width,
+                                   inline_mux=inline_mux, register_file=register_file,
+                                   config_packing=config_packing, burst=burst)
+                # tiles with the same core but a different structure need their own module
+                num_names = num_tile_names.get(tile.name, 0)
+                num_tile_names[tile.name] = num_names + 1
+                if num_names > 0:
+                    tile.name = f"{tile.name}_{num_names}"
+                # the same holds for switch boxes that only differ in their pipeline registers or connections, and
+                # CBs of ports with a different fanin, so that every module name is unique across the tiles, which
+                # are generated separately
+                for feature in list(tile.cbs.values()) + list(tile.sbs.values()):
+                    if feature.def_instance is not feature:
+                        continue
+                    num_names = num_module_names.get(feature.name, 0)
+                    num_module_names[feature.name] = num_names + 1
+                    if num_names > 0:
+                        feature.name = f"{feature.name}_{num_names}"
                 tile.lift_ports()
-                unique_tiles[tile.name] = tile
+                definition_tiles[signature] = tile
+            else:
+                tile = TileCircuit(tiles, config_addr_width, config_data_width,
+                                   tile_id_width=tile_id_width, full_config_addr_width=full_config_addr_width,
+                                   definition=definition)
+            self.tile_circuits[coord] = tile
             x, y = coord
             self.add_child("Tile_X{0:02X}Y{1:02X}".format(x, y), tile)
 
@@ -100,11 +143,14 @@ class Interconnect(ReadyValidGenerator):
         self.clk_en = self.clock_en("clk_en")
         self.config_data = self.input("config_data", self.config_data_width)
         self.config_addr = self.input("config_addr", full_config_addr_width)
+        if burst:
+            self.config_en = self.input("config_en", 1)
+            self.config_burst = self.input("config_burst", 1)
 
     def __wire_tiles(self):
         for (x, y), tile in self.tile_circuits.items():
-            for bit_width, switch_box in tile.sbs.items():
-                all_sbs = switch_box.switchbox.get_all_sbs()
+            for bit_width, graph_tile in tile.tiles.items():
+                all_sbs = graph_tile.switchbox.get_all_sbs()
                 for sb in all_sbs:
                     if sb.io != SwitchBoxIO.SB_OUT:
                         continue
@@ -117,7 +163,7 @@ class Interconnect(ReadyValidGenerator):
                     neighbors: List[Tuple[Node, str, Node]] = []
                     for node in sb:
                         if isinstance(node, SwitchBoxNode):
-                            neighbors.append((node, create_name(str(sb)), sb))
+                            neighbors.append((node, sb.circuit_name(), sb))
                         elif isinstance(node, RegisterMuxNode):
                             # making sure the register is inserted properly
                             assert len(sb) == 2
@@ -125,7 +171,7 @@ class Interconnect(ReadyValidGenerator):
                             for n in node:
                                 neighbors.clear()
                                 if isinstance(n, SwitchBoxNode):
-                                    neighbors.append((n, create_name(str(sb)),
+                                    neighbors.append((n, sb.circuit_name(),
                                                       node))
                             break
                     for sb_node, src_sb_name, src_node in neighbors:
@@ -136,7 +182,7 @@ class Interconnect(ReadyValidGenerator):
                         # using the tile-level port is fine
                         dst_tile = self.tile_circuits[(sb_node.x, sb_node.y)]
                         # wire them up
-                        dst_sb_name = create_name(str(sb_node))
+                        dst_sb_name = sb_node.circuit_name()
                         assert len(sb_node.get_conn_in()) == 1, \
                             "Currently only one to one allowed for inter-tile connections"
                         # no array
@@ -183,7 +229,7 @@ class Interconnect(ReadyValidGenerator):
                             # depends on whether there is a pipeline register
                             # or not, we need to be very careful
                             if isinstance(sb_node, SwitchBoxNode):
-                                sb_name = create_name(str(sb_node))
+                                sb_name = sb_node.circuit_name()
                             else:
                                 assert isinstance(sb_node, RegisterMuxNode)
                                 # because margin tiles won't connect to
@@ -194,7 +240,7 @@ class Interconnect(ReadyValidGenerator):
                                          isinstance(x, SwitchBoxNode)]
                                 assert len(nodes) == 1
                                 sb_node = nodes[0]
-                                sb_name = create_name(str(sb_node))
+                                sb_name = sb_node.circuit_name()
 
                             next_port = self.tile_circuits[next_coord].ports[sb_name]
                             if len(port_node.get_conn_in()) <= 1:
@@ -207,11 +253,10 @@ class Interconnect(ReadyValidGenerator):
             x, y = coord
             tile = self.tile_circuits[(x, y)]
             # we only lift sb ports
-            sbs = tile.sbs
-            for bit_width, switchbox in sbs.items():
-                all_sbs = switchbox.switchbox.get_all_sbs()
+            for bit_width, graph_tile in tile.tiles.items():
+                all_sbs = graph_tile.switchbox.get_all_sbs()
                 for sb in all_sbs:
-                    sb_name = create_name(str(sb))
+                    sb_name = sb.circuit_name()
                     sb_port = self.tile_circuits[coord].ports[sb_name]
                     if sb.io == SwitchBoxIO.SB_IN:
                         if len(sb.get_conn_in()) > 0:
@@ -238,7 +283,7 @@ class Interconnect(ReadyValidGenerator):
         for coord, tile_dict in self.__tiles.items():
             for bit_width, tile in tile_dict.items():
                 for sb in tile.switchbox.get_all_sbs():
-                    sb_name = create_name(str(sb))
+                    sb_name = sb.circuit_name()
                     sb_port = self.tile_circuits[coord].ports[sb_name]
                     if sb.io == SwitchBoxIO.SB_IN:
                         if sb.get_conn_in():
@@ -280,12 +325,9 @@ class Interconnect(ReadyValidGenerator):
             self.tile_circuits.pop(coord)
 
     def finalize(self):
-        # we assume that users knows what's going on with the tile definition
-        definition_tiles: Dict[str, TileCircuit] = {}
         for tile_circuit in self.tile_circuits.values():
-            if tile_circuit.name in definition_tiles:
-                ref = definition_tiles[tile_circuit.name].internal_generator
-                tile_circuit.internal_generator.set_clone_ref(ref)
+            if not tile_circuit.is_definition:
+                tile_circuit.internal_generator.set_clone_ref(tile_circuit.definition.internal_generator)
                 continue
             if "clk" in tile_circuit.ports:
                 self.wire(self.clk, tile_circuit.clk)
@@ -293,22 +335,100 @@ class Interconnect(ReadyValidGenerator):
                 self.wire(self.reset, tile_circuit.reset)
                 self.wire(self.config_addr, tile_circuit.config_addr)
                 self.wire(self.config_data, tile_circuit.config_data)
+                if self.burst:
+                    self.wire(self.config_en, tile_circuit.config_en)
+                    self.wire(self.config_burst, tile_circuit.config_burst)
             tile_circuit.finalize()
-            definition_tiles[tile_circuit.name] = tile_circuit
+
+    def get_config_packing_report(self, packing: ConfigPacking = None) -> Tuple[int, int]:
+        """number of configuration words of the whole array with the first fit packing and with the given packing,
+        by default the one the interconnect is built with. the difference is the number of words saved, e.g. in a full
+        bitstream"""
+        # instances have the same features as their definition
+        num_words: Dict[TileCircuit, Tuple[int, int]] = {}
+        first_fit = 0
+        packed = 0
+        for tile in self.tile_circuits.values():
+            definition = tile.definition
+            if definition not in num_words:
+                num_words[definition] = (definition.get_num_config_words(ConfigPacking.FirstFit),
+                                         definition.get_num_config_words(packing))
+            first_fit += num_words[definition][0]
+            packed += num_words[definition][1]
+        return first_fit, packed
+
+    def write_verilog(self, dir_name: str, processes: int = None,
+                      codegen_options: kratos.SystemVerilogCodeGenOptions = None) -> Dict:
+        """generates the finalized design with one file per module into dir_name. every tile definition, together
+        with the CBs, SBs and other modules it contains, is generated in its own worker process, with at most
+        processes workers, which defaults to the number of CPUs. the top level file only contains the interconnect,
+        which instantiates the tiles. the list of files and the module of each one are written to manifest.json,
+        which is returned as well"""
+        if not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+        definitions = [tile for tile in self.tile_circuits.values() if tile.is_definition]
+
+        def generate(tile: TileCircuit) -> Dict[str, str]:
+            return _get_verilog_src(tile, codegen_options)
+
+        results = parallel_map(generate, definitions, processes)
+
+        # the top level is generated once all the tile workers are done, with the tiles as black boxes
+        for tile_circuit in self.tile_circuits.values():
+            tile_circuit.external = True
+        try:
+            src = _get_verilog_src(self, codegen_options)
+        finally:
+            for tile_circuit in self.tile_circuits.values():
+                tile_circuit.external = False
+        results.append({self.name: src[self.name]})
+
+        # modules shared by tiles, e.g. clones of the same mux, are generated by each of them
+        modules: Dict[str, str] = {}
+        for result in results:
+            for mod_name, src in result.items():
+                if modules.setdefault(mod_name, src) != src:
+                    raise ValueError(f"Module {mod_name} is generated differently by different tiles")
+
+        files = {}
+        for mod_name, src in modules.items():
+            filename = f"{mod_name}.sv"
+            with open(os.path.join(dir_name, filename), "w+") as f:
+                f.write(src)
+            files[mod_name] = filename
+
+        tiles = {tile.name: [] for tile in definitions}
+        for (x, y), tile in self.tile_circuits.items():
+            tiles[tile.definition.name].append([x, y])
+        manifest = {"top": self.name, "top_file": files[self.name], "files": list(files.values()),
+                    "modules": files, "tiles": tiles}
+        with open(os.path.join(dir_name, "manifest.json"), "w+") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
 
     # software interaction
-    def dump_pnr(self, dir_name, design_name, max_num_col=None):
+    def dump_pnr(self, dir_name, design_name, max_num_col=None, processes: int = 1,
+                 check_roundtrip: bool = False) -> Dict[int, List[str]]:
+        """dumps the PnR collateral. with more than one process, graphs of different bit widths are written
+        concurrently in a process pool, processes=None uses all the CPUs. the files are the same in either case. with
+        check_roundtrip, what GraphReader
+        can't read back the same is warned about and returned per bit width, see GraphWriter"""
         if not os.path.isdir(dir_name):
             os.mkdir(dir_name)
         dir_name = os.path.abspath(dir_name)
         if max_num_col is None:
             max_num_col = self.x_max + 1
 
-        graph_path_dict = {}
-        for bit_width, graph in self.__graphs.items():
-            graph_path = os.path.join(dir_name, f"{bit_width}.graph")
-            graph_path_dict[bit_width] = graph_path
-            graph.dump_graph(graph_path, max_num_col)
+        graph_path_dict = {bit_width: os.path.join(dir_name, f"{bit_width}.graph") for bit_width in self.__graphs}
+
+        def dump_graph(bit_width: int) -> List[str]:
+            return self.__graphs[bit_width].dump_graph(graph_path_dict[bit_width], max_num_col, check_roundtrip)
+
+        # the findings are returned by the workers and warned about here, where the caller can catch them
+        findings = dict(zip(self.__graphs, parallel_map(dump_graph, self.__graphs, processes)))
+        for bit_width, messages in findings.items():
+            for message in messages:
+                warnings.warn(f"{bit_width}.graph: {message}")
 
         # generate the layout file
         layout_file = os.path.join(dir_name, f"{design_name}.layout")
@@ -320,6 +440,7 @@ class Interconnect(ReadyValidGenerator):
                              bit_width in self.__graphs]
             graph_config_str = " ".join(graph_configs)
             f.write(f"graph={graph_config_str}\n")
+        return findings
 
     def __get_core_info(self) -> Dict[str, Tuple[PnRTag, List[PnRTag]]]:
         result = {}
@@ -437,9 +558,84 @@ class Interconnect(ReadyValidGenerator):
         else:
             raise Exception("Unknown node " + " ".join(node_str))
 
-    def get_route_bitstream(self, routes: Dict[str, List[List[Node]]]):
+    @staticmethod
+    def get_node_key(node_str) -> NodeKey:
+        """structural key of a node given in the tokenized form taken by parse_node()"""
+        kind = node_str[0]
+        if kind == "SB":
+            track, x, y, side, io_, bit_width = node_str[1:]
+            return NodeKey(NodeType.SwitchBox, int(bit_width), int(x), int(y), int(track), int(side), int(io_), "")
+        elif kind == "PORT":
+            port_name, x, y, bit_width = node_str[1:]
+            return NodeKey(NodeType.Port, int(bit_width), int(x), int(y), 0, 0, 0, port_name)
+        elif kind == "REG":
+            reg_name, track, x, y, bit_width = node_str[1:]
+            return NodeKey(NodeType.Register, int(bit_width), int(x), int(y), int(track), 0, 0, reg_name)
+        elif kind == "RMUX":
+            rmux_name, x, y, bit_width = node_str[1:]
+            side, track = rmux_name.split("_")
+            return NodeKey(NodeType.RegisterMux, int(bit_width), int(x), int(y), int(track), int(side), 0, "")
+        else:
+            raise ValueError("Unknown node " + " ".join(map(str, node_str)))
+
+    def get_node_index(self) -> Dict[NodeKey, Node]:
+        """maps the structural key of every node in all the bit widths to the node. the index is built on the first
+        call"""
+        if self.__node_index is None:
+            index = {}
+            for graph in self.__graphs.values():
+                index.update(graph.get_node_index())
+            self.__node_index = index
+        return self.__node_index
+
+    def parse_routes(self, routes: Dict[str, List[List[Tuple]]]) -> Dict[str, List[List[Node]]]:
+        """resolves a routing result, i.e. net -> segments of nodes in the tokenized form taken by parse_node(), in one
+        pass through the node index. the result can be passed to get_route_bitstream(). all the nodes that cannot be
+        resolved are reported together"""
+        index = self.get_node_index()
+        get_node_key = self.get_node_key
+        result = {}
+        unresolved = []
+        for net, route in routes.items():
+            segments = []
+            for segment in route:
+                nodes = []
+                for node_str in segment:
+                    try:
+                        node = index.get(get_node_key(node_str), None)
+                    except ValueError:
+                        node = None
+                    if node is None:
+                        unresolved.append(f"{net}: {' '.join(map(str, node_str))}")
+                    nodes.append(node)
+                segments.append(nodes)
+            result[net] = segments
+        if unresolved:
+            raise ValueError(f"Unable to resolve {len(unresolved)} node(s):\n" + "\n".join(unresolved))
+        return result
+
+    def validate_routes(self, routes: Dict[str, List[List[Node]]]) -> List[RouteDiagnostic]:
+        """checks the routing result, e.g. before generating its bitstream. see kcanal.pnr.validate_routes()"""
+        return validate_routes(routes, self.__graphs)
+
+    def get_route_config_table(self) -> Dict[Tuple[Node, Node], List[Tuple[int, int, int]]]:
+        """maps every connection into a configurable mux to its (addr, mask, value) configurations, so that bitstream
+        generation is a table lookup per hop. the table is compiled on the first call, which has to be after
+        finalize()"""
+        if self.__config_table is None:
+            table = {}
+            for (x, y), tile_circuit in self.tile_circuits.items():
+                tile_configs = tile_circuit.get_route_config_table()
+                for edge, configs in tile_configs.items():
+                    table[edge] = [(self.get_config_addr(reg_addr, feat_addr, x, y), mask, value)
+                                   for reg_addr, feat_addr, mask, value in configs]
+            self.__config_table = table
+        return self.__config_table
+
+    def __get_route_configs(self, routes: List[List[List[Node]]]) -> List[Tuple[int, int, int]]:
+        config_table = self.get_route_config_table()
         result = []
-        for _, route in routes.items():
+        for route in routes:
             for segment in route:
                 for i in range(len(segment) - 1):
                     pre_node = segment[i]
@@ -454,31 +650,88 @@ class Interconnect(ReadyValidGenerator):
                     if len(next_node.get_conn_in()) == 1:
                         # no mux created. skip
                         continue
-                    configs = self.get_node_bitstream_config(pre_node,
-                                                             next_node)
-                    for addr, data in configs:
-                        result.append((addr, data))
+                    configs = config_table.get((pre_node, next_node), None)
+                    if configs is None:
+                        configs = self.get_node_config_mask(pre_node, next_node)
+                    result += configs
         return result
 
+    def __get_route_config_array(self, routes: Dict[str, List[List[Node]]], processes: int) -> np.ndarray:
+        # (addr, mask, value) rows of the routes. nets are split into contiguous chunks, one per process, so that
+        # concatenating the chunks gives the same order as the serial walk
+        nets = list(routes.values())
+        # compiled before the workers fork so that the table is shared with all of them
+        self.get_route_config_table()
+        num_chunks = get_num_processes(processes, len(nets))
+        bounds = [len(nets) * i // num_chunks for i in range(num_chunks + 1)]
+        chunks = [nets[bounds[i]:bounds[i + 1]] for i in range(num_chunks)]
+
+        def get_configs(chunk: List[List[List[Node]]]) -> np.ndarray:
+            return np.array(self.__get_route_configs(chunk), dtype=np.uint32).reshape(-1, 3)
+
+        return np.concatenate(parallel_map(get_configs, chunks, processes))
+
+    def get_route_bitstream(self, routes: Dict[str, List[List[Node]]], processes: int = 1):
+        """(addr, data) configurations of the routes. with more than one process, nets are split across a process
+        pool, processes=None uses all the CPUs. the result is the same in either case"""
+        if processes == 1:
+            return [(addr, data) for addr, _, data in self.__get_route_configs(routes.values())]
+        configs = self.__get_route_config_array(routes, processes)
+        return list(zip(configs[:, 0].tolist(), configs[:, 2].tolist()))
+
+    def get_core_config_mask(self, x: int, y: int, configs: Dict[str, int]) -> List[Tuple[int, int, int]]:
+        """(addr, mask, value) of the configuration fields of the core at (x, y), given as name -> value"""
+        tile = self.tile_circuits[(x, y)]
+        return [(self.get_config_addr(reg_addr, feat_addr, x, y), mask, data)
+                for reg_addr, feat_addr, mask, data in tile.get_core_config_mask(configs)]
+
+    def get_bitstream(self, routes: Dict[str, List[List[Node]]], base: Bitstream = None,
+                      core_configs: Dict[Tuple[int, int], Dict[str, int]] = None, processes: int = 1) -> Bitstream:
+        """merged bitstream of the routes and the core configurations, with the field mask carried by every entry.
+        raises ValueError if two routes configure the same mux differently. if a base image is given, the
+        configurations are written into it read-modify-write. processes is the same as in get_route_bitstream()"""
+        configs = [self.__get_route_config_array(routes, processes)]
+        if core_configs:
+            for (x, y), values in core_configs.items():
+                configs.append(np.array(self.get_core_config_mask(x, y, values), dtype=np.uint32).reshape(-1, 3))
+        return Bitstream.from_configs(np.concatenate(configs)).merge(base=base)
+
+    def get_burst_bitstream(self, routes: Dict[str, List[List[Node]]], base: Bitstream = None,
+                            core_configs: Dict[Tuple[int, int], Dict[str, int]] = None,
+                            processes: int = 1) -> List[Tuple[int, List[int]]]:
+        """the bitstream of get_bitstream() as (start addr, data words) bursts for the burst configuration mode.
+        the words of a burst are at consecutive register addresses of the same feature"""
+        bitstream = self.get_bitstream(routes, base=base, core_configs=core_configs, processes=processes)
+        return bitstream.to_bursts(self.config_burst_step)
+
+    def get_bitstream_delta(self, old_routes: Dict[str, List[List[Node]]], new_routes: Dict[str, List[List[Node]]],
+                            old_core_configs: Dict[Tuple[int, int], Dict[str, int]] = None,
+                            new_core_configs: Dict[Tuple[int, int], Dict[str, int]] = None,
+                            processes: int = 1) -> Bitstream:
+        """config words that have to be written to go from the old configuration to the new one. the fabric is
+        assumed to hold exactly the old configuration on top of the reset values, so that fields no longer used are
+        written back to zero"""
+        old = self.get_bitstream(old_routes, core_configs=old_core_configs, processes=processes)
+        new = self.get_bitstream(new_routes, core_configs=new_core_configs, processes=processes)
+        return new.delta(old)
+
     def get_node_bitstream_config(self, src_node: Node, dst_node: Node, ):
         # this is the complete one which includes the tile_id
+        return [(addr, data) for addr, _, data in self.get_node_config_mask(src_node, dst_node)]
+
+    def get_node_config_mask(self, src_node: Node, dst_node: Node) -> List[Tuple[int, int, int]]:
+        """(addr, mask, value) of the configuration fields for the connection"""
         x, y = dst_node.x, dst_node.y
         tile = self.tile_circuits[(x, y)]
-        res = []
-        configs = tile.get_route_bitstream_config(src_node, dst_node)
-
-        def add_config(entry):
-            reg_addr, feat_addr, data = entry
-            addr = self.get_config_addr(reg_addr, feat_addr, x, y)
-            res.append((addr, data))
-
-        if isinstance(configs, list):
-            for en in configs:
-                add_config(en)
-        else:
-            add_config(configs)
-
-        return res
+        return [(self.get_config_addr(reg_addr, feat_addr, x, y), mask, data)
+                for reg_addr, feat_addr, mask, data in tile.get_route_config_mask(src_node, dst_node)]
 
     def get_graph(self, bit_width: int):
         return self.__graphs[bit_width]
+
+
+def _get_verilog_src(generator: kratos.Generator,
+                     codegen_options: kratos.SystemVerilogCodeGenOptions = None) -> Dict[str, str]:
+    src = kratos.verilog(generator, codegen_options=codegen_options)
+    # additional info such as struct definitions is appended
+    return src[0] if isinstance(src, list) else src
@@ -2,11 +2,12 @@ from kratos import Generator, always_ff, always_comb, const, posedge, negedge
 from kratos.util import clog2
 from typing import Dict, List, Tuple
 import _kratos
+import enum
 import kratos
 
 
 class Mux(Generator):
-    def __init__(self, height: int, width: int, is_clone: bool = False):
+    def __init__(self, height: int, width: int = 16, is_clone: bool = False):
         name = "Mux_{0}".format(height)
         super().__init__(name, is_clone=is_clone)
         self.width = self.param("width", value=width, initial_value=16)
@@ -42,8 +43,25 @@ class Mux(Generator):
         self.wire(self.ready_out, kratos.ternary(self.en, self.ready_in.duplicate(height), 0))
 
 
+class WireMux:
+    """single-input mux inlined into the parent generator as wires instead of a child instance. it has the same
+    interface as a Mux of height 1"""
+    def __init__(self, generator: Generator, name: str, width: int):
+        self.height = 1
+        self.in_ = generator.var(f"{name}_I", width, size=[1], packed=True)
+        self.out_ = generator.var(f"{name}_O", width)
+        self.valid_in = generator.var(f"{name}_valid_in", 1)
+        self.valid_out = generator.var(f"{name}_valid_out", 1)
+        self.ready_in = generator.var(f"{name}_ready_in", 1)
+        self.ready_out = generator.var(f"{name}_ready_out", 1)
+
+        generator.wire(self.out_, self.in_)
+        generator.wire(self.ready_out, self.ready_in)
+        generator.wire(self.valid_out, self.valid_in)
+
+
 class ConfigRegister(Generator):
-    def __init__(self, width, addr, addr_width):
+    def __init__(self, width=1, addr=0, addr_width=8):
         super(ConfigRegister, self).__init__(f"ConfigRegister")
         self.width = self.param("width", value=width, initial_value=1)
         self.addr_width = self.param("addr_width", value=addr_width, initial_value=8)
@@ -72,13 +90,55 @@ class ConfigRegister(Generator):
 
 
 def _get_config_reg(width, addr, addr_width) -> ConfigRegister:
-    reg = ConfigRegister.clone(width=width, addr=addr, addr_width=addr_width)
+    # all the config registers share one definition since they only differ in parameters
+    reg = ConfigRegister.clone()
     reg.width.value = width
     reg.addr.value = addr
     reg.addr_width.value = addr_width
     return reg
 
 
+class ConfigRegisterFile(Generator):
+    """all the configuration words of a feature in one generator. the words are packed into one storage vector, which
+    is written through a single address decoder. word i is value[i], at config address i"""
+    def __init__(self, num_words=1, width=32, addr_width=8):
+        super(ConfigRegisterFile, self).__init__(f"ConfigRegisterFile_{num_words}")
+        self.num_words = num_words
+        self.width = self.param("width", value=width, initial_value=32)
+        self.addr_width = self.param("addr_width", value=addr_width, initial_value=8)
+
+        self.config_addr = self.input("config_addr", self.addr_width)
+        self.config_data = self.input("config_data", self.width)
+        self.config_en = self.input("config_en", 1)
+
+        self.clk = self.clock("clk")
+        self.rst_n = self.reset("rst_n")
+
+        self.value = self.output("value", self.width, size=num_words, packed=True, explicit_array=True)
+
+        self.addr = self.var("addr", max(1, clog2(num_words)))
+        self.wire(self.addr, self.config_addr[self.addr.width - 1, 0])
+        self.enable = self.var("enable", 1)
+        self.wire(self.enable, self.config_addr.extend(32) < num_words)
+
+        self.add_always(self.value_logic)
+
+    @always_ff((posedge, "clk"), (negedge, "rst_n"))
+    def value_logic(self):
+        if ~self.rst_n:
+            self.value = 0
+        elif self.config_en and self.enable:
+            self.value[self.addr] = self.config_data
+
+
+def _get_config_reg_file(num_words, width, addr_width) -> ConfigRegisterFile:
+    # the structure only depends on the number of words
+    reg_file = ConfigRegisterFile.clone(num_words=num_words)
+    reg_file.width.value = width
+    reg_file.addr_width.value = addr_width
+    return reg_file
+
+
 ReadyValidTuple = Tuple[_kratos.Port, _kratos.Port, _kratos.Port]
 
 
@@ -141,6 +201,52 @@ class ReadyValidGenerator(Generator):
         return p
 
 
+class ConfigPacking(enum.Enum):
+    """how the configuration fields of a Configurable, or of all the features of a tile, are packed into words"""
+    # first fit in name order
+    FirstFit = enum.auto()
+    # first fit with the widest fields first, which leaves fewer partial words
+    FirstFitDecreasing = enum.auto()
+    # first fit decreasing over all the fields of a tile, which are kept in the registers of the tile instead of the
+    # ones of each feature. see TileCircuit
+    Tile = enum.auto()
+
+
+def pack_config_fields(widths: Dict[str, int], data_width: int,
+                        packing: ConfigPacking) -> Tuple[List[int], Dict[str, Tuple[int, int]]]:
+    """greedy bin packing of the fields, given as name -> width. returns the unused bits of every word and
+    name -> (word index, low bit)"""
+    regs: List[int] = []
+    reg_map: Dict[str, Tuple[int, int]] = {}
+
+    def place(n: str, w: int):
+        res = False
+        assert w <= data_width
+        for idx, rest in enumerate(regs):
+            if rest >= w:
+                # place it
+                reg_map[n] = (idx, data_width - rest)
+                regs[idx] = rest - w
+                res = True
+                break
+        if not res:
+            # place a new one
+            rest = data_width - w
+            reg_map[n] = (len(regs), 0)
+            regs.append(rest)
+
+    # to ensure deterministic behavior, names are sorted first
+    names = list(widths.keys())
+    names.sort()
+    if packing != ConfigPacking.FirstFit:
+        # stable, so fields of the same width stay in name order
+        names.sort(key=lambda n: widths[n], reverse=True)
+    for name in names:
+        place(name, widths[name])
+
+    return regs, reg_map
+
+
 class Configurable(ReadyValidGenerator):
     def __init__(self, name: str, config_addr_width: int, config_data_width: int, debug: bool = False):
         super(Configurable, self).__init__(name, debug)
@@ -156,6 +262,12 @@ class Configurable(ReadyValidGenerator):
         self.config_data = self.input("config_data", config_data_width)
         self.config_en = self.input("config_en", 1)
 
+        # if set before finalize(), the configuration words are kept in one ConfigRegisterFile instead of one
+        # ConfigRegister each. the address map is the same
+        self.register_file = False
+        # packing of the fields into words, also to be set before finalize()
+        self.config_packing = ConfigPacking.FirstFit
+
         # register map
         # index, low, high
         self.__register_map: Dict[str, Tuple[int, int, int]] = {}
@@ -166,70 +278,87 @@ class Configurable(ReadyValidGenerator):
         self.registers[name] = v
         return v
 
+    def lift_config_fields(self):
+        """every configuration field becomes an input config_<name>, which is driven by the registers of the tile, see
+        ConfigPacking.Tile. fields that are already lifted are skipped"""
+        for name, v in self.registers.items():
+            port_name = f"config_{name}"
+            if port_name not in self.ports:
+                self.wire(v, self.input(port_name, v.width))
+
     def finalize(self):
+        if self.config_packing == ConfigPacking.Tile:
+            # the tile keeps the configuration registers
+            self.lift_config_fields()
+            return
         # instantiate the configuration registers
         # we use greedy bin packing
-        regs, reg_map = self.__compute_reg_packing()
-        registers: List[ConfigRegister] = []
-        for addr, reg_rest in enumerate(regs):
-            reg_width = self.config_data_width - reg_rest
-            reg = _get_config_reg(reg_width, addr, self.config_addr_width)
-
-            self.add_child_generator(f"config_reg_{addr}", reg, clk=self.clk,
+        regs, reg_map = pack_config_fields(self.__get_field_widths(), self.config_data_width, self.config_packing)
+        words: List[kratos.Var] = []
+        if not self.register_file:
+            for addr, reg_rest in enumerate(regs):
+                reg_width = self.config_data_width - reg_rest
+                reg = _get_config_reg(reg_width, addr, self.config_addr_width)
+
+                self.add_child_generator(f"config_reg_{addr}", reg, clk=self.clk,
+                                         rst_n=self.reset, config_addr=self.config_addr,
+                                         config_data=self.config_data[reg_width - 1, 0], config_en=self.config_en)
+                words.append(reg.value)
+        elif regs:
+            # unused bits of the words are removed in synthesis
+            reg_file = _get_config_reg_file(len(regs), self.config_data_width, self.config_addr_width)
+            self.add_child_generator("config_reg_file", reg_file, clk=self.clk,
                                      rst_n=self.reset, config_addr=self.config_addr,
-                                     config_data=self.config_data[reg_width - 1, 0], config_en=self.config_en)
-            registers.append(reg)
+                                     config_data=self.config_data, config_en=self.config_en)
+            words = [reg_file.value[addr] for addr in range(len(regs))]
 
         # assign slice
         for name, (idx, start_addr) in reg_map.items():
             v = self.registers[name]
             hi: int = start_addr + v.width - 1
             lo: int = start_addr
-            slice_ = registers[idx].value[hi, lo]
+            slice_ = words[idx][hi, lo]
             self.wire(v, slice_)
             self.__register_map[name] = (idx, lo, hi)
 
-    def __compute_reg_packing(self):
-        # greedy bin packing
-        regs: List[int] = []
-        reg_map: Dict[str, Tuple[int, int]] = {}
-
-        def place(n: str, var: kratos.Var):
-            res = False
-            w = var.width
-            assert w <= self.config_data_width
-            for idx, rest in enumerate(regs):
-                if rest >= w:
-                    # place it
-                    reg_map[n] = (idx, self.config_data_width - rest)
-                    regs[idx] = rest - w
-                    res = True
-                    break
-            if not res:
-                # place a new one
-                rest = self.config_data_width - w
-                reg_map[n] = (len(regs), 0)
-                regs.append(rest)
-
-        # to ensure deterministic behavior, names are sorted first
-        names = list(self.registers.keys())
-        names.sort()
-        for name in names:
-            v = self.registers[name]
-            place(name, v)
+    def __get_field_widths(self) -> Dict[str, int]:
+        return {name: v.width for name, v in self.registers.items()}
+
+    def get_num_config_words(self, packing: ConfigPacking = None) -> int:
+        """number of configuration words the fields are packed into, by default with config_packing"""
+        if packing is None:
+            packing = self.config_packing
+        regs, _ = pack_config_fields(self.__get_field_widths(), self.config_data_width, packing)
+        return len(regs)
 
-        return regs, reg_map
+    def __get_register(self, name) -> Tuple[int, int, int]:
+        # clones share the register map of their definition
+        definition = self.def_instance
+        if definition.config_packing == ConfigPacking.Tile:
+            raise ValueError(f"configuration fields of {definition.name} are kept by its tile with ConfigPacking.Tile, "
+                             "use TileCircuit.get_config_field() instead")
+        return definition.__register_map[name]
 
     def get_config_data(self, name, value) -> Tuple[int, int]:
-        idx, lo, hi = self.__register_map[name]
+        idx, lo, hi = self.__get_register(name)
         width = hi - lo + 1
         assert value < (1 << width)
         return idx, value << lo
 
+    def get_config_field(self, name) -> Tuple[int, int, int]:
+        """register index, low and high bit of a configuration field. raises ValueError with ConfigPacking.Tile, where
+        the fields are in the registers of the tile"""
+        return self.__get_register(name)
+
+    def get_config_mask(self, name) -> Tuple[int, int]:
+        """register index and bit mask of a configuration field"""
+        idx, lo, hi = self.__get_register(name)
+        return idx, ((1 << (hi - lo + 1)) - 1) << lo
+
 
 class FIFO(Generator):
     # based on https://github.com/StanfordAHA/garnet/blob/spVspV/global_buffer/design/fifo.py
-    def __init__(self, data_width, depth):
+    def __init__(self, data_width=16, depth=2):
 
         super().__init__(f"reg_fifo_d_{depth}")
 
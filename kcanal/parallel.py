@@ -0,0 +1,47 @@
+"""
+Process-based parallel map used by the graph construction and code generation.
+
+Workers are forked from the current process and inherit the job, so neither
+the function nor the items have to be picklable, only the results do. When
+fork is not available, e.g. on Windows, the jobs run serially.
+"""
+import multiprocessing
+import os
+from typing import Callable, List, Sequence, TypeVar, Union
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# function and items of the running parallel_map, inherited by the workers
+_job = None
+
+
+def _run_job(idx: int):
+    fn, items = _job
+    return fn(items[idx])
+
+
+def get_num_processes(processes: Union[int, None], num_jobs: int) -> int:
+    if processes is None:
+        processes = os.cpu_count() or 1
+    return max(min(processes, num_jobs), 1)
+
+
+def parallel_map(fn: Callable[[T], R], items: Sequence[T],
+                 processes: int = None) -> List[R]:
+    """applies fn to each item in worker processes and returns the results in
+    order. processes defaults to the number of CPUs"""
+    global _job
+    items = list(items)
+    processes = get_num_processes(processes, len(items))
+    if processes == 1 or _job is not None or \
+            "fork" not in multiprocessing.get_all_start_methods():
+        # nested calls run serially as well
+        return [fn(item) for item in items]
+    _job = (fn, items)
+    try:
+        ctx = multiprocessing.get_context("fork")
+        with ctx.Pool(processes) as pool:
+            return pool.map(_run_job, range(len(items)), chunksize=1)
+    finally:
+        _job = None
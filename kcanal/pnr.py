@@ -1,3 +1,13 @@
+import collections
+import enum
+import os
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Tuple
+
+import numpy as np
+
+from .cyclone import InterconnectGraph, GraphReader, Node, NodeKey, PortNode, RegisterMuxNode
+
+
 class PnRTag:
     DEFAULT_PRIORITY = 20
 
@@ -16,4 +26,224 @@ class PnRTag:
             and self.priority_minor == self.priority_minor
 
     def __hash__(self):
-        return hash(self.tag_name)
\ No newline at end of file
+        return hash(self.tag_name)
+
+
+class PnRCollateral(NamedTuple):
+    # tag name -> tag and its rows. each row is a string of 0/1 per column
+    layout: Dict[str, Tuple[PnRTag, List[str]]]
+    graphs: Dict[int, InterconnectGraph]
+    # node string -> node, for all the bit widths
+    nodes: Mapping[str, Node]
+
+
+def read_layout(filename: str) -> Dict[str, Tuple[PnRTag, List[str]]]:
+    """reads the .layout file written by Interconnect.dump_pnr()"""
+    layout = {}
+    with open(filename) as f:
+        lines = f.read().splitlines()
+    idx = 0
+    while idx < len(lines):
+        line = lines[idx]
+        if not line.startswith("LAYOUT "):
+            raise ValueError(f"Invalid layout file {filename}: {line}")
+        # the tag of empty tiles is a space
+        tag_name = line[len("LAYOUT ")]
+        priority_major, priority_minor = line[len("LAYOUT ") + 1:].split()
+        # BEGIN
+        idx += 2
+        rows = []
+        while lines[idx] != "END":
+            rows.append(lines[idx])
+            idx += 1
+        layout[tag_name] = (PnRTag(tag_name, int(priority_major),
+                                   int(priority_minor)), rows)
+        idx += 1
+    return layout
+
+
+def read_pnr(info_filename: str) -> PnRCollateral:
+    """reads the PnR collateral written by Interconnect.dump_pnr() from its
+    .info file. graphs are read back in compacted form, see GraphReader, so
+    that routing results can be processed without creating the interconnect.
+    relative paths are resolved against the directory of the .info file"""
+    dir_name = os.path.dirname(os.path.abspath(info_filename))
+    entries = {}
+    with open(info_filename) as f:
+        for line in f.read().splitlines():
+            if line:
+                key, _, value = line.partition("=")
+                entries[key] = value
+    if "layout" not in entries or "graph" not in entries:
+        raise ValueError(f"Invalid info file {info_filename}")
+    layout = read_layout(os.path.join(dir_name, entries["layout"]))
+    values = entries["graph"].split()
+    graphs = {}
+    nodes = []
+    for bit_width, graph_file in zip(values[::2], values[1::2]):
+        reader = GraphReader(os.path.join(dir_name, graph_file))
+        graphs[int(bit_width)] = reader.read()
+        nodes.append(reader.nodes)
+    # node strings include the bit width. the nodes are only created when
+    # they are looked up
+    return PnRCollateral(layout, graphs, collections.ChainMap(*nodes))
+
+
+def build_node_index(graphs: Iterable[InterconnectGraph]) -> Dict[str, Node]:
+    """maps the node strings used in the .graph files to the nodes, e.g. to
+    resolve the routing results of graphs that are created in place"""
+    nodes = {}
+    for graph in graphs:
+        store = graph.store
+        if store is not None:
+            nodes.update(zip(store.node_strs(), store.nodes()))
+            continue
+        for coord in graph:
+            tile = graph[coord]
+            for node_dict in (tile.ports, tile.switchbox.registers,
+                              tile.switchbox.reg_muxs):
+                nodes.update((node.node_str(), node)
+                             for node in node_dict.values())
+            nodes.update((node.node_str(), node) for node in
+                         tile.switchbox.get_all_sbs())
+    return nodes
+
+
+@enum.unique
+class RouteErrorKind(enum.Enum):
+    # node used by more than one net
+    Conflict = enum.auto()
+    # consecutive nodes of a segment are not connected
+    Disconnected = enum.auto()
+    # node width differs from the width of the net
+    WidthMismatch = enum.auto()
+    # segment starting neither at a driver nor at a node of the same net
+    InvalidDriver = enum.auto()
+    # segment not ending at a port, e.g. stopping at a pipeline register
+    # instead of going through its register mux
+    Dangling = enum.auto()
+    # node not found in the graphs
+    UnknownNode = enum.auto()
+    # node reached by the net from more than one node, i.e. a mux with more
+    # than one selected input
+    MultipleDrivers = enum.auto()
+    # register mux reached by the net both through its pipeline register and
+    # through the bypass
+    RegisterBypass = enum.auto()
+
+
+class RouteDiagnostic(NamedTuple):
+    kind: RouteErrorKind
+    net: str
+    # segment index and node index in the segment
+    segment: int
+    index: int
+    node: Node
+    message: str
+
+    def __str__(self):
+        return f"{self.net}[{self.segment}][{self.index}] {self.kind.name}: {self.message}"
+
+
+class _Occupancy:
+    # owning net of every node of a graph, -1 if unused, and the node it is
+    # reached from in that net, -1 if none. nodes of a compacted graph are
+    # indexed by their IDs in the store, other nodes through a node key to ID
+    # map and the list of the nodes in ID order, which are only built when
+    # needed
+    def __init__(self, graph: InterconnectGraph):
+        self.graph = graph
+        self.store = graph.store
+        self.ids = None
+        self.nodes: List[Node] = []
+        num_nodes = len(self.store) if self.store is not None else len(self.__get_ids())
+        self.owners = np.full(num_nodes, -1, dtype=np.int32)
+        self.drivers = np.full(num_nodes, -1, dtype=np.int32)
+
+    def __get_ids(self) -> Dict[NodeKey, int]:
+        if self.ids is None:
+            if self.store is not None:
+                # keys come from the store arrays, without creating the views
+                self.ids = {self.store.get_key(i): i for i in range(len(self.store))}
+            else:
+                index = self.graph.get_node_index()
+                self.ids = {key: i for i, key in enumerate(index)}
+                self.nodes = list(index.values())
+        return self.ids
+
+    def get_node(self, node_id: int) -> Node:
+        if self.store is not None:
+            return self.store.node(node_id)
+        self.__get_ids()
+        return self.nodes[node_id]
+
+    def get_id(self, node: Node) -> int:
+        if self.store is not None and getattr(node, "store", None) is self.store:
+            return node.node_id
+        return self.__get_ids().get(node.key(), -1)
+
+
+def validate_routes(routes: Dict[str, List[List[Node]]],
+                    graphs: Dict[int, InterconnectGraph]) -> List[RouteDiagnostic]:
+    """checks a routing result, e.g. from Interconnect.parse_routes(), against
+    the graphs in one pass over all the nodes and returns the problems found,
+    which is empty for legal routes. each net has to start from a node without
+    fanins, i.e. a core output, every segment has to start at a node of its
+    net and end at a port, consecutive nodes have to be connected, and nodes
+    can't be shared between nets. a net may revisit its nodes, e.g. to start a
+    segment, but it has to reach each of them from the same node"""
+    occupancy: Dict[int, _Occupancy] = {}
+    net_names = list(routes)
+    result = []
+    for net_idx, (net, route) in enumerate(routes.items()):
+        width = None
+        for seg_idx, segment in enumerate(route):
+            pre_node = None
+            pre_nodes, pre_id = None, -1
+            for idx, node in enumerate(segment):
+                # kind and message of each problem, the node string is only
+                # computed when there is one
+                errors = []
+                if width is None:
+                    width = node.width
+                elif node.width != width:
+                    errors.append((RouteErrorKind.WidthMismatch, f"is {node.width}-bit in a {width}-bit net"))
+                nodes = occupancy.get(node.width, None)
+                if nodes is None and node.width in graphs:
+                    nodes = occupancy[node.width] = _Occupancy(graphs[node.width])
+                node_id = -1 if nodes is None else nodes.get_id(node)
+                if node_id < 0:
+                    errors.append((RouteErrorKind.UnknownNode, "is not in the graphs"))
+                else:
+                    owner = nodes.owners[node_id]
+                    if idx == 0:
+                        if seg_idx == 0 and len(node.get_conn_in()) > 0:
+                            errors.append((RouteErrorKind.InvalidDriver, "is not a driver"))
+                        elif seg_idx > 0 and owner != net_idx:
+                            errors.append((RouteErrorKind.InvalidDriver, "is not reached by the net"))
+                    if owner < 0:
+                        nodes.owners[node_id] = net_idx
+                    elif owner != net_idx:
+                        errors.append((RouteErrorKind.Conflict, f"is used by {net_names[owner]}"))
+                    if pre_node is not None and node not in pre_node:
+                        errors.append((RouteErrorKind.Disconnected, f"is not connected from {pre_node.node_str()}"))
+                    if pre_nodes is nodes and pre_id >= 0 and owner in (-1, net_idx):
+                        driver = nodes.drivers[node_id]
+                        if driver < 0:
+                            nodes.drivers[node_id] = pre_id
+                        elif driver != pre_id:
+                            if isinstance(node, RegisterMuxNode):
+                                errors.append((RouteErrorKind.RegisterBypass,
+                                               "is reached both through the register and the bypass"))
+                            else:
+                                errors.append((RouteErrorKind.MultipleDrivers,
+                                               f"is reached from {pre_node.node_str()} and "
+                                               f"{nodes.get_node(driver).node_str()}"))
+                result += [RouteDiagnostic(kind, net, seg_idx, idx, node, f"{node.node_str()} {message}")
+                           for kind, message in errors]
+                pre_node = node
+                pre_nodes, pre_id = nodes, node_id
+            if segment and not isinstance(segment[-1], PortNode):
+                result.append(RouteDiagnostic(RouteErrorKind.Dangling, net, seg_idx, len(segment) - 1, segment[-1],
+                                              f"{segment[-1].node_str()} is not a port"))
+    return result
@@ -0,0 +1,561 @@
+"""
+Array-backed storage for the routing graph.
+
+Nodes are integer IDs with their attributes kept in typed columns, and the
+connections are kept in CSR (compressed sparse row) format, i.e. the fanout of
+node ``i`` is ``fanouts[fanout_offsets[i]:fanout_offsets[i + 1]]``. Once a
+graph is compacted, the tiles and switch boxes keep node IDs, see
+StoreNodeList and StoreNodeDict, and the nodes are views into the store that
+implement the same interface as the cyclone nodes. views are created on first
+access.
+"""
+import array
+import contextlib
+import gc
+import itertools
+import sys
+from collections.abc import MutableMapping, MutableSequence
+from typing import List, Dict, Iterator, Iterable, Sequence, BinaryIO, Any, Union
+
+import numpy as np
+
+from .cyclone import Node, NodeKey, NodeType, SwitchBoxNode, PortNode, RegisterNode, RegisterMuxNode, SwitchBoxSide, \
+    SwitchBoxIO, MAX_DEFAULT_DELAY
+
+
+# enum lookup tables, indexed by value
+_SIDES = [SwitchBoxSide(i) for i in range(len(SwitchBoxSide))]
+_IOS = [SwitchBoxIO(i) for i in range(len(SwitchBoxIO))]
+
+
+# array columns and their type codes, in file order
+_COLUMNS = (("kind", "b"), ("x", "i"), ("y", "i"), ("track", "i"), ("side", "b"), ("io", "b"), ("width", "i"),
+            ("fanout_offsets", "q"), ("fanouts", "i"), ("delays", "i"), ("fanin_offsets", "q"), ("fanins", "i"))
+# columns are aligned in the file so that they can be used in place
+_ALIGNMENT = 8
+
+
+def _hash_check() -> int:
+    # str hashes are randomized per process, which invalidates the precomputed hashes of named nodes
+    return hash("kcanal.store")
+
+
+def write_column(f: BinaryIO, column) -> int:
+    """writes an array to a binary file, aligned so that it can be used in place by read_column(). returns the
+    offset"""
+    offset = f.tell()
+    padding = -offset % _ALIGNMENT
+    f.write(b"\0" * padding)
+    f.write(column)
+    return offset + padding
+
+
+def read_column(buffer: memoryview, code: str, offset: int, length: int) -> memoryview:
+    return buffer[offset:offset + length * array.array(code).itemsize].cast(code)
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # views are created in large numbers and contain no cycles by themselves, so there is no need for the garbage
+    # collector to scan them over and over while they are being created
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class GraphStore:
+    def __init__(self, bit_width: int):
+        self.bit_width = bit_width
+
+        # node attribute columns, indexed by node id
+        self.kind = array.array("b")
+        self.x = array.array("i")
+        self.y = array.array("i")
+        self.track = array.array("i")
+        self.side = array.array("b")
+        self.io = array.array("b")
+        self.width = array.array("i")
+        self.names: List[str] = []
+        # precomputed hash of the node keys
+        self.hashes = array.array("q")
+
+        # connections in CSR format. both fanouts and fanins are kept in
+        # insertion order so that mux port ordering stays the same
+        self.fanout_offsets = array.array("q", [0])
+        self.fanouts = array.array("i")
+        self.delays = array.array("i")
+        self.fanin_offsets = array.array("q", [0])
+        self.fanins = array.array("i")
+
+        # views of the nodes, created on first access
+        self.__views: List[Union[Node, None]] = []
+        self.__all_views = True
+
+    def __len__(self):
+        return len(self.kind)
+
+    def __getstate__(self):
+        # views are cheap to recreate
+        state = self.__dict__.copy()
+        state.pop("_GraphStore__views")
+        state.pop("_GraphStore__all_views")
+        for name, _ in _COLUMNS:
+            column = state[name]
+            if isinstance(column, memoryview):
+                state[name] = array.array(column.format, column.tobytes())
+        state["hash_check"] = _hash_check()
+        return state
+
+    def __setstate__(self, state):
+        hash_check = state.pop("hash_check")
+        self.__dict__.update(state)
+        if hash_check != _hash_check():
+            self.__compute_hashes()
+        self.__create_views()
+
+    def __compute_hashes(self):
+        # NodeKey hashes the same as a plain tuple
+        self.hashes = array.array("q", map(hash, zip(self.kind, self.width, self.x, self.y, self.track, self.side,
+                                                     self.io, self.names)))
+
+    def __create_views(self):
+        self.__views = [None] * len(self.kind)
+        self.__all_views = not self.__views
+
+    def write(self, f: BinaryIO) -> Dict[str, Any]:
+        """writes the columns to a binary file, aligned so that they can be memory-mapped. returns the layout to be
+        passed to from_buffer()"""
+        names = "\0".join(self.names).encode()
+        columns = {}
+        for name, code in _COLUMNS + (("names", "B"),):
+            column = names if name == "names" else getattr(self, name)
+            columns[name] = (code, write_column(f, column), len(column))
+        return {"bit_width": self.bit_width, "num_nodes": len(self), "byteorder": sys.byteorder,
+                "itemsizes": {code: array.array(code).itemsize for _, code in _COLUMNS}, "columns": columns}
+
+    @staticmethod
+    def from_buffer(buffer, layout: Dict[str, Any]) -> "GraphStore":
+        """creates a store from the columns written by write(). columns are used in place without copying, e.g.
+        from a mmap. node names are decoded and the node hashes are recomputed. the store is read-only"""
+        if layout["byteorder"] != sys.byteorder:
+            raise ValueError(f"Graph is stored in {layout['byteorder']} endian")
+        for code, itemsize in layout["itemsizes"].items():
+            if array.array(code).itemsize != itemsize:
+                raise ValueError(f"Item size of type {code} does not match")
+        store = GraphStore(layout["bit_width"])
+        buffer = memoryview(buffer)
+        for name, (code, offset, length) in layout["columns"].items():
+            column = read_column(buffer, code, offset, length)
+            if name == "names":
+                store.names = bytes(column).decode().split("\0") if layout["num_nodes"] else []
+            else:
+                setattr(store, name, column)
+        store.__compute_hashes()
+        store.__create_views()
+        return store
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.fanouts)
+
+    @property
+    def num_views(self) -> int:
+        """number of node views created so far"""
+        if self.__all_views:
+            return len(self.__views)
+        return len(self.__views) - self.__views.count(None)
+
+    def add_node(self, kind: NodeType, x: int, y: int, width: int, track: int = 0, side: int = 0, io: int = 0,
+                 name: str = "") -> int:
+        node_id = len(self.kind)
+        self.kind.append(kind)
+        self.x.append(x)
+        self.y.append(y)
+        self.width.append(width)
+        self.track.append(track)
+        self.side.append(side)
+        self.io.append(io)
+        self.names.append(name)
+        self.hashes.append(hash(NodeKey(kind, width, x, y, track, side, io, name)))
+        self.__views.append(None)
+        self.__all_views = False
+        return node_id
+
+    def add_nodes(self, kind: Sequence[int], x: Sequence[int], y: Sequence[int], width: Sequence[int],
+                  track: Sequence[int], side: Sequence[int], io: Sequence[int], names: Sequence[str]) -> int:
+        """bulk version of add_node, one entry per node in each column. returns the id of the first node"""
+        start = len(self.kind)
+        self.kind.extend(kind)
+        self.x.extend(x)
+        self.y.extend(y)
+        self.width.extend(width)
+        self.track.extend(track)
+        self.side.extend(side)
+        self.io.extend(io)
+        self.names.extend(names)
+        self.hashes.extend(map(hash, zip(kind, width, x, y, track, side, io, names)))
+        self.__views.extend(None for _ in range(len(self.kind) - start))
+        self.__all_views = start == len(self.kind)
+        return start
+
+    def node_strs(self) -> List[str]:
+        """node_str() of all the nodes, formatted from the columns directly"""
+        sb, port, reg = int(NodeType.SwitchBox), int(NodeType.Port), int(NodeType.Register)
+        result = []
+        append = result.append
+        for kind, x, y, width, track, side, io, name in zip(self.kind, self.x, self.y, self.width, self.track,
+                                                            self.side, self.io, self.names):
+            if kind == sb:
+                append(f"SB ({track}, {x}, {y}, {side}, {io}, {width})")
+            elif kind == port:
+                append(f"PORT {name} ({x}, {y}, {width})")
+            elif kind == reg:
+                append(f"REG {name} ({track}, {x}, {y}, {width})")
+            else:
+                append(f"RMUX ({track}, {x}, {y}, {side}, {width})")
+        return result
+
+    def set_edges(self, src: np.ndarray, dst: np.ndarray, delays: np.ndarray):
+        """builds the CSR arrays from an edge list given in insertion order, which is the order fanouts and fanins
+        are kept in"""
+        num_nodes = len(self.kind)
+        fanout_order = np.argsort(src, kind="stable")
+        fanin_order = np.argsort(dst, kind="stable")
+        fanout_offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_nodes), out=fanout_offsets[1:])
+        fanin_offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst, minlength=num_nodes), out=fanin_offsets[1:])
+        self.set_csr(fanout_offsets.tolist(), dst[fanout_order].tolist(), delays[fanout_order].tolist(),
+                     fanin_offsets.tolist(), src[fanin_order].tolist())
+
+    def set_csr(self, fanout_offsets, fanouts, delays, fanin_offsets, fanins):
+        num_nodes = len(self.kind)
+        assert len(fanout_offsets) == num_nodes + 1 and len(fanin_offsets) == num_nodes + 1
+        assert len(fanouts) == len(delays) == len(fanins)
+        self.fanout_offsets = array.array("q", fanout_offsets)
+        self.fanouts = array.array("i", fanouts)
+        self.delays = array.array("i", delays)
+        self.fanin_offsets = array.array("q", fanin_offsets)
+        self.fanins = array.array("i", fanins)
+
+    def get_name(self, node_id: int) -> str:
+        """name of the node, which the tiles and switch boxes index ports, registers and register muxes by"""
+        if self.kind[node_id] == NodeType.RegisterMux:
+            return f"{self.side[node_id]}_{self.track[node_id]}"
+        return self.names[node_id]
+
+    def get_key(self, node_id: int) -> NodeKey:
+        return NodeKey(self.kind[node_id], self.width[node_id], self.x[node_id], self.y[node_id],
+                       self.track[node_id], self.side[node_id], self.io[node_id], self.names[node_id])
+
+    def node(self, node_id: int) -> Node:
+        view = self.__views[node_id]
+        if view is None:
+            view = self.__views[node_id] = _VIEW_TYPES[self.kind[node_id]](self, node_id)
+        return view
+
+    def nodes(self) -> List[Node]:
+        """views of all the nodes, indexed by node id"""
+        if not self.__all_views:
+            views = self.__views
+            with _gc_paused():
+                for node_id, view in enumerate(views):
+                    if view is None:
+                        views[node_id] = _VIEW_TYPES[self.kind[node_id]](self, node_id)
+            self.__all_views = True
+        return self.__views
+
+    def get_fanouts(self, node_id: int) -> array.array:
+        return self.fanouts[self.fanout_offsets[node_id]:self.fanout_offsets[node_id + 1]]
+
+    def get_fanins(self, node_id: int) -> array.array:
+        return self.fanins[self.fanin_offsets[node_id]:self.fanin_offsets[node_id + 1]]
+
+    @staticmethod
+    def from_nodes(bit_width: int, nodes: List[Node]) -> "GraphStore":
+        """creates a store from node objects. node ``i`` in ``nodes`` gets
+        id ``i``. nodes that are only reachable through connections are
+        appended after them"""
+        store = GraphStore(bit_width)
+        nodes = list(nodes)
+        ids: Dict[int, int] = {}
+
+        def add(n: Node):
+            ids[id(n)] = len(store)
+            if isinstance(n, SwitchBoxNode):
+                store.add_node(NodeType.SwitchBox, n.x, n.y, n.width, n.track, n.side, n.io)
+            elif isinstance(n, PortNode):
+                store.add_node(NodeType.Port, n.x, n.y, n.width, name=n.name)
+            elif isinstance(n, RegisterNode):
+                store.add_node(NodeType.Register, n.x, n.y, n.width, n.track, name=n.name)
+            elif isinstance(n, RegisterMuxNode):
+                store.add_node(NodeType.RegisterMux, n.x, n.y, n.width, n.track, n.side)
+            else:
+                raise ValueError(f"Unable to store node type {type(n).__name__}")
+
+        for node in nodes:
+            assert id(node) not in ids, f"{node} added twice"
+            add(node)
+        idx = 0
+        while idx < len(nodes):
+            node = nodes[idx]
+            for n in itertools.chain(node, node.iter_conn_in()):
+                if id(n) not in ids:
+                    add(n)
+                    nodes.append(n)
+            idx += 1
+
+        # typed arrays keep the peak memory down while the node objects are still alive
+        fanout_offsets = array.array("q", [0])
+        fanouts = array.array("i")
+        delays = array.array("i")
+        fanin_offsets = array.array("q", [0])
+        fanins = array.array("i")
+        for node in nodes:
+            for n in node:
+                fanouts.append(ids[id(n)])
+                delays.append(node.get_edge_cost(n))
+            fanout_offsets.append(len(fanouts))
+            # the fanin lists are not cached on the node objects on the way
+            for n in node.iter_conn_in():
+                fanins.append(ids[id(n)])
+            fanin_offsets.append(len(fanins))
+        store.set_csr(fanout_offsets, fanouts, delays, fanin_offsets, fanins)
+        return store
+
+
+class StoreNodeList(MutableSequence):
+    """list of nodes kept as ids into a GraphStore, e.g. the switch box nodes of a compacted graph. the views are
+    only created when the nodes are accessed. id -1 stands for None"""
+    __slots__ = ("store", "ids")
+
+    def __init__(self, store: GraphStore, ids: Iterable[int]):
+        self.store = store
+        self.ids = array.array("i", ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return StoreNodeList(self.store, self.ids[idx])
+        node_id = self.ids[idx]
+        return None if node_id < 0 else self.store.node(node_id)
+
+    def __setitem__(self, idx: int, node: Union[Node, None]):
+        self.ids[idx] = -1 if node is None else node.node_id
+
+    def __delitem__(self, idx):
+        del self.ids[idx]
+
+    def insert(self, idx: int, node: Union[Node, None]):
+        self.ids.insert(idx, -1 if node is None else node.node_id)
+
+    def clear(self):
+        del self.ids[:]
+
+
+class StoreNodeDict(MutableMapping):
+    """name -> node dict whose nodes are kept as ids into a GraphStore, e.g. the ports of a compacted tile. the
+    views are only created when the nodes are accessed"""
+    __slots__ = ("store", "ids")
+
+    def __init__(self, store: GraphStore, ids: Union[Iterable[int], Dict[str, int]] = ()):
+        """the nodes are keyed by their names, unless the ids are given as a dict, which is used as is"""
+        self.store = store
+        if isinstance(ids, dict):
+            self.ids: Dict[str, int] = ids
+        else:
+            self.ids = {store.get_name(node_id): node_id for node_id in ids}
+
+    def __getitem__(self, name: str) -> Node:
+        return self.store.node(self.ids[name])
+
+    def __setitem__(self, name: str, node: Node):
+        self.ids[name] = node.node_id
+
+    def __delitem__(self, name: str):
+        del self.ids[name]
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def clear(self):
+        self.ids.clear()
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class _NodeView:
+    """Shared implementation for nodes backed by a GraphStore. Compacted graphs
+    are read-only. the slots are declared by the concrete views, since the node
+    classes have slots of their own"""
+    __slots__ = ()
+
+    def __init__(self, store: GraphStore, node_id: int):
+        self._store = store
+        self._id = node_id
+        # cache of Node.circuit_name()
+        self._Node__circuit_name = None
+
+    @property
+    def node_id(self) -> int:
+        return self._id
+
+    @property
+    def store(self) -> GraphStore:
+        return self._store
+
+    @property
+    def x(self) -> int:
+        return self._store.x[self._id]
+
+    @property
+    def y(self) -> int:
+        return self._store.y[self._id]
+
+    @property
+    def width(self) -> int:
+        return self._store.width[self._id]
+
+    def key(self) -> NodeKey:
+        return self._store.get_key(self._id)
+
+    def __eq__(self, other):
+        if isinstance(other, _NodeView) and other._store is self._store:
+            return other._id == self._id
+        return Node.__eq__(self, other)
+
+    def __hash__(self):
+        return self._store.hashes[self._id]
+
+    def add_edge(self, node: Node, delay: int = 0, force_connect: bool = False):
+        raise RuntimeError("Compacted graph is read-only")
+
+    def remove_edge(self, node: Node):
+        raise RuntimeError("Compacted graph is read-only")
+
+    def clear(self):
+        raise RuntimeError("Compacted graph is read-only")
+
+    def _find(self, offsets, targets, node: Node) -> int:
+        """position of node in the fanouts or fanins, -1 if not connected. nodes that are not from the same store
+        are compared by their keys"""
+        store = self._store
+        lo = offsets[self._id]
+        hi = offsets[self._id + 1]
+        if isinstance(node, _NodeView) and node._store is store:
+            node_id = node._id
+            for i in range(lo, hi):
+                if targets[i] == node_id:
+                    return i - lo
+        else:
+            for i in range(lo, hi):
+                if store.node(targets[i]) == node:
+                    return i - lo
+        return -1
+
+    def get_edge_cost(self, node: Node) -> int:
+        store = self._store
+        idx = self._find(store.fanout_offsets, store.fanouts, node)
+        if idx < 0:
+            return MAX_DEFAULT_DELAY
+        return store.delays[store.fanout_offsets[self._id] + idx]
+
+    def get_conn_in(self) -> List[Node]:
+        store = self._store
+        return [store.node(i) for i in store.get_fanins(self._id)]
+
+    def iter_conn_in(self) -> Iterator[Node]:
+        store = self._store
+        return map(store.node, store.get_fanins(self._id))
+
+    def get_conn_in_index(self, node: Node) -> int:
+        store = self._store
+        idx = self._find(store.fanin_offsets, store.fanins, node)
+        if idx < 0:
+            raise ValueError(f"{node} is not connected to {self}")
+        return idx
+
+    def __iter__(self) -> Iterator[Node]:
+        store = self._store
+        return map(store.node, store.get_fanouts(self._id))
+
+    def __len__(self):
+        return self._store.fanout_offsets[self._id + 1] - self._store.fanout_offsets[self._id]
+
+    def __contains__(self, item):
+        if not isinstance(item, Node):
+            return False
+        return self._find(self._store.fanout_offsets, self._store.fanouts, item) >= 0
+
+
+class SwitchBoxNodeView(_NodeView, SwitchBoxNode):
+    __slots__ = ("_store", "_id")
+
+    @property
+    def track(self) -> int:
+        return self._store.track[self._id]
+
+    @property
+    def side(self) -> SwitchBoxSide:
+        return _SIDES[self._store.side[self._id]]
+
+    @property
+    def io(self) -> SwitchBoxIO:
+        return _IOS[self._store.io[self._id]]
+
+
+class PortNodeView(_NodeView, PortNode):
+    __slots__ = ("_store", "_id")
+
+    @property
+    def name(self) -> str:
+        return self._store.names[self._id]
+
+
+class RegisterNodeView(_NodeView, RegisterNode):
+    __slots__ = ("_store", "_id")
+
+    @property
+    def name(self) -> str:
+        return self._store.names[self._id]
+
+    @property
+    def track(self) -> int:
+        return self._store.track[self._id]
+
+
+class RegisterMuxNodeView(_NodeView, RegisterMuxNode):
+    __slots__ = ("_store", "_id")
+
+    @property
+    def track(self) -> int:
+        return self._store.track[self._id]
+
+    @property
+    def side(self) -> SwitchBoxSide:
+        return _SIDES[self._store.side[self._id]]
+
+    @property
+    def name(self) -> str:
+        return self._store.get_name(self._id)
+
+
+_VIEW_TYPES: Dict[NodeType, type] = {
+    NodeType.SwitchBox: SwitchBoxNodeView,
+    NodeType.Port: PortNodeView,
+    NodeType.Register: RegisterNodeView,
+    NodeType.RegisterMux: RegisterMuxNodeView,
+}
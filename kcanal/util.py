@@ -2,8 +2,12 @@ from .circuit import Core
 from typing import Tuple, List, Dict, Callable
 from .cyclone import SwitchBoxSide, SwitchBoxIO, InterconnectPolicy, \
     InterconnectGraph, DisjointSwitchBox, WiltonSwitchBox, \
-    ImranSwitchBox, Tile, SwitchBox
+    ImranSwitchBox, Tile, SwitchBox, NodeType
+from .store import GraphStore, StoreNodeList, StoreNodeDict
+from .bitstream import Bitstream
+from .parallel import parallel_map
 import enum
+import numpy as np
 
 
 @enum.unique
@@ -56,7 +60,8 @@ def create_uniform_interconnect(width: int,
                                 pipeline_reg:
                                 List[Tuple[int, SwitchBoxSide]] = None,
                                 io_sides: IOSide = IOSide.None_,
-                                io_conn: Dict[str, Dict[str, List[int]]] = None
+                                io_conn: Dict[str, Dict[str, List[int]]] = None,
+                                bulk: bool = False
                                 ) -> InterconnectGraph:
     """Create a uniform interconnect with column-based design. We will use
     disjoint switch for now. Configurable parameters in terms of interconnect
@@ -81,9 +86,19 @@ def create_uniform_interconnect(width: int,
     :parameter io_sides: which side has IO core.
     :parameter io_conn: Specify the IO connections. only valid when margin is
                         set to 1
+    :parameter bulk: compute all the nodes and connections as index arrays and
+                     fill the graph store in one pass. the result is identical
+                     to the compacted graph, hence read-only
 
     :return configured Interconnect object
     """
+    if bulk:
+        return _create_uniform_interconnect_bulk(width, height, track_width,
+                                                 column_core_fn,
+                                                 port_connections,
+                                                 track_info, sb_type,
+                                                 pipeline_reg, io_sides,
+                                                 io_conn)
     if io_sides & IOSide.None_ or io_conn is None:
         io_conn = {"in": {}, "out": {}}
     tile_height = 1
@@ -93,6 +108,9 @@ def create_uniform_interconnect(width: int,
     if io_sides & IOSide.None_:
         io_sides = IOSide.None_
     x_min, x_max, y_min, y_max = get_array_size(width, height, io_sides)
+    # switches only serve as the topology of the tiles, hence are shared
+    # by the tiles with the same number of tracks
+    switches: Dict[int, SwitchBox] = {}
     # create tiles and set cores
     for x in range(x_min, x_max + 1):
         for y in range(y_min, y_max + 1, tile_height):
@@ -100,14 +118,17 @@ def create_uniform_interconnect(width: int,
             num_track = compute_num_tracks(x_min, y_min,
                                            x, y, track_info)
             # create switch based on the type passed in
-            if sb_type == SwitchBoxType.Disjoint:
-                sb = DisjointSwitchBox(x, y, num_track, track_width)
-            elif sb_type == SwitchBoxType.Wilton:
-                sb = WiltonSwitchBox(x, y, num_track, track_width)
-            elif sb_type == SwitchBoxType.Imran:
-                sb = ImranSwitchBox(x, y, num_track, track_width)
-            else:
-                raise NotImplementedError(sb_type)
+            sb = switches.get(num_track, None)
+            if sb is None:
+                if sb_type == SwitchBoxType.Disjoint:
+                    sb = DisjointSwitchBox(x, y, num_track, track_width)
+                elif sb_type == SwitchBoxType.Wilton:
+                    sb = WiltonSwitchBox(x, y, num_track, track_width)
+                elif sb_type == SwitchBoxType.Imran:
+                    sb = ImranSwitchBox(x, y, num_track, track_width)
+                else:
+                    raise NotImplementedError(sb_type)
+                switches[num_track] = sb
             tile_circuit = Tile(x, y, track_width, sb, tile_height)
 
             interconnect.add_tile(tile_circuit)
@@ -165,6 +186,431 @@ def create_uniform_interconnect(width: int,
     return interconnect
 
 
+def create_uniform_interconnects(width: int,
+                                 height: int,
+                                 bit_widths: List[int],
+                                 column_core_fn: Callable[[int, int], Core],
+                                 port_connections:
+                                 Dict[str, List[Tuple[SwitchBoxSide,
+                                                      SwitchBoxIO]]],
+                                 track_info: Dict[int, int],
+                                 sb_type: SwitchBoxType,
+                                 pipeline_reg:
+                                 List[Tuple[int, SwitchBoxSide]] = None,
+                                 io_sides: IOSide = IOSide.None_,
+                                 io_conn: Dict[str, Dict[str, List[int]]]
+                                 = None,
+                                 processes: int = None
+                                 ) -> Dict[int, InterconnectGraph]:
+    """Create the uniform interconnect graphs for multiple bit widths
+    concurrently, one process per bit width. The graphs are built in bulk
+    mode and sent back in compact form. The cores are created once per tile
+    beforehand and resolved afterwards, hence are shared by all the bit
+    widths, including the IO cores of the margin tiles. See
+    create_uniform_interconnect for the parameters.
+
+    :parameter bit_widths: track widths to create, e.g. [1, 16]
+    :parameter processes: max number of processes. defaults to the number of
+                          CPUs
+
+    :return graphs indexed by bit width, which can be passed to Interconnect
+    """
+    x_min, x_max, y_min, y_max = get_array_size(width, height, IOSide.None_)
+    cores = {(x, y): column_core_fn(x, y) for x in range(x_min, x_max + 1)
+             for y in range(y_min, y_max + 1)}
+
+    def create_graph(bit_width: int):
+        return _create_uniform_interconnect_bulk(width, height, bit_width,
+                                                 lambda x, y: cores[x, y],
+                                                 port_connections,
+                                                 track_info, sb_type,
+                                                 pipeline_reg, io_sides,
+                                                 io_conn)
+
+    graphs = parallel_map(create_graph, bit_widths, processes)
+    for graph in graphs:
+        graph.resolve_cores(lambda x, y: cores[x, y])
+    return dict(zip(bit_widths, graphs))
+
+
+# switch box nodes are laid out per tile in the same order as get_all_sbs(),
+# i.e. track * 8 + side * 2 + io, where side is the position in SwitchBoxSide
+_SIDE_POS = np.array([list(SwitchBoxSide).index(side)
+                      for side in sorted(SwitchBoxSide)], dtype=np.int64)
+_SB_PER_TRACK = len(SwitchBoxSide) * len(SwitchBoxIO)
+
+
+def _sb_offset(side, track, io):
+    return track * _SB_PER_TRACK + _SIDE_POS[side] * len(SwitchBoxIO) + io
+
+
+def _create_uniform_interconnect_bulk(width: int,
+                                      height: int,
+                                      track_width: int,
+                                      column_core_fn: Callable[[int, int],
+                                                               Core],
+                                      port_connections:
+                                      Dict[str, List[Tuple[SwitchBoxSide,
+                                                           SwitchBoxIO]]],
+                                      track_info: Dict[int, int],
+                                      sb_type: SwitchBoxType,
+                                      pipeline_reg:
+                                      List[Tuple[int, SwitchBoxSide]] = None,
+                                      io_sides: IOSide = IOSide.None_,
+                                      io_conn: Dict[str, Dict[str, List[int]]]
+                                      = None
+                                      ) -> InterconnectGraph:
+    """bulk construction path of create_uniform_interconnect. nodes and
+    edges are generated in the same order as they are added one by one, so
+    that mux port ordering stays the same"""
+    sb_types = {SwitchBoxType.Disjoint: DisjointSwitchBox,
+                SwitchBoxType.Wilton: WiltonSwitchBox,
+                SwitchBoxType.Imran: ImranSwitchBox}
+    if sb_type not in sb_types:
+        raise NotImplementedError(sb_type)
+    if pipeline_reg is None:
+        pipeline_reg = []
+    if io_sides & IOSide.None_ or io_conn is None:
+        io_conn = {"in": {}, "out": {}}
+    if io_sides & IOSide.None_:
+        io_sides = IOSide.None_
+    x_min, x_max, y_min, y_max = get_array_size(width, height, io_sides)
+    # tiles are created column by column, followed by the margin tiles
+    array_height = y_max - y_min + 1
+    num_array_tiles = (x_max - x_min + 1) * array_height
+    margin_x, margin_y = np.meshgrid(np.arange(width), np.arange(height),
+                                     indexing="ij")
+    is_margin = (margin_x < x_min) | (margin_x > x_max) | \
+        (margin_y < y_min) | (margin_y > y_max)
+    tile_x = np.concatenate([np.repeat(np.arange(x_min, x_max + 1),
+                                       array_height), margin_x[is_margin]])
+    tile_y = np.concatenate([np.tile(np.arange(y_min, y_max + 1),
+                                     x_max - x_min + 1), margin_y[is_margin]])
+    # margin tiles have empty switch boxes
+    is_array = np.arange(len(tile_x)) < num_array_tiles
+    num_tracks = np.zeros(len(tile_x), dtype=np.int64)
+    for length, num_track in track_info.items():
+        num_tracks += np.where(is_array &
+                               ((tile_x - x_min) % length == 0) &
+                               ((tile_y - y_min) % length == 0), num_track, 0)
+
+    def tile_index(x, y):
+        return (x - x_min) * array_height + (y - y_min)
+
+    internal_wires = {}
+    for num_track in np.unique(num_tracks).tolist():
+        internal_wires[num_track] = sb_types[sb_type](0, 0, num_track,
+                                                      track_width) \
+            .internal_wires
+
+    # pipeline registers applied to each tile, in insertion order
+    reg_tracks = np.array([track for track, _ in pipeline_reg],
+                          dtype=np.int64)
+    applied = reg_tracks[None, :] < num_tracks[:, None]
+    reg_rank = np.cumsum(applied, axis=1) - applied
+    for idx, (track, side) in enumerate(pipeline_reg):
+        if (track, side) in pipeline_reg[:idx] and applied[:, idx].any():
+            raise Exception("pipeline register already inserted")
+
+    # create tiles and set cores, once per tile as the cores are. switch
+    # boxes are swapped in once the nodes are created. tiles with the same
+    # number of tracks, core ports and pipeline registers share a node layout
+    empty_switchbox = SwitchBox(0, 0, 0, track_width, [])
+    tiles: List[Tile] = []
+    layouts: Dict[Tuple, List[int]] = {}
+    for idx, (x, y) in enumerate(zip(tile_x.tolist(), tile_y.tolist())):
+        tile = Tile(x, y, track_width, empty_switchbox)
+        tile.set_core(column_core_fn(x, y))
+        tiles.append(tile)
+        layout = (int(num_tracks[idx]), tuple(tile.ports), tuple(tile.inputs),
+                  tuple(tile.outputs), applied[idx].tobytes())
+        layouts.setdefault(layout, []).append(idx)
+    layouts = {layout: np.array(tile_ids, dtype=np.int64)
+               for layout, tile_ids in layouts.items()}
+
+    # node layout per tile: switch boxes, ports, registers and register muxes
+    num_sbs = num_tracks * _SB_PER_TRACK
+    num_ports = np.zeros(len(tiles), dtype=np.int64)
+    for (_, ports, _, _, _), tile_ids in layouts.items():
+        num_ports[tile_ids] = len(ports)
+    num_regs = applied.sum(axis=1)
+    tile_base = np.zeros(len(tiles) + 1, dtype=np.int64)
+    np.cumsum(num_sbs + num_ports + 2 * num_regs, out=tile_base[1:])
+    port_base = tile_base[:-1] + num_sbs
+    reg_base = port_base + num_ports
+    rmux_base = reg_base + num_regs
+
+    # node columns, filled layout by layout
+    num_nodes = int(tile_base[-1])
+    node_tile = np.repeat(np.arange(len(tiles)), np.diff(tile_base))
+    kind = np.empty(num_nodes, dtype=np.int64)
+    tracks = np.zeros(num_nodes, dtype=np.int64)
+    sides = np.zeros(num_nodes, dtype=np.int64)
+    ios = np.zeros(num_nodes, dtype=np.int64)
+    names = np.full(num_nodes, "", dtype=object)
+    for (num_track, ports, _, _, reg_mask), tile_ids in layouts.items():
+        regs = [pipeline_reg[i] for i in
+                np.nonzero(np.frombuffer(reg_mask, dtype=bool))[0]]
+        num_sb = num_track * _SB_PER_TRACK
+        sb_tracks = np.repeat(np.arange(num_track), _SB_PER_TRACK)
+        sb_sides = np.tile(np.repeat([int(side) for side in SwitchBoxSide],
+                                     len(SwitchBoxIO)), num_track)
+        sb_ios = np.tile([int(io) for io in SwitchBoxIO],
+                         num_track * len(SwitchBoxSide))
+        layout_kind = [NodeType.SwitchBox] * num_sb + \
+            [NodeType.Port] * len(ports) + \
+            [NodeType.Register] * len(regs) + \
+            [NodeType.RegisterMux] * len(regs)
+        layout_tracks = np.concatenate([sb_tracks, [0] * len(ports),
+                                        [track for track, _ in regs] * 2])
+        layout_sides = np.concatenate([sb_sides, [0] * (len(ports) +
+                                                        len(regs)),
+                                       [int(side) for _, side in regs]])
+        layout_ios = np.concatenate([sb_ios, [0] * (len(ports) +
+                                                    2 * len(regs))])
+        layout_names = np.array([""] * num_sb + list(ports) +
+                                [f"T{track}_{side.name}"
+                                 for track, side in regs] +
+                                [""] * len(regs), dtype=object)
+        positions = (tile_base[tile_ids, None] +
+                     np.arange(len(layout_kind))).ravel()
+        num_tiles = len(tile_ids)
+        kind[positions] = np.tile([int(k) for k in layout_kind], num_tiles)
+        tracks[positions] = np.tile(layout_tracks, num_tiles)
+        sides[positions] = np.tile(layout_sides, num_tiles)
+        ios[positions] = np.tile(layout_ios, num_tiles)
+        names[positions] = np.tile(layout_names, num_tiles)
+    store = GraphStore(track_width)
+    store.add_nodes(kind.tolist(), tile_x[node_tile].tolist(),
+                    tile_y[node_tile].tolist(), [track_width] * num_nodes,
+                    tracks.tolist(), sides.tolist(), ios.tolist(),
+                    names.tolist())
+
+    # edges in insertion order
+    srcs, dsts = [], []
+
+    # switch box internal wires, tile by tile
+    wire_tiles = []
+    for num_track, wires in internal_wires.items():
+        edges = SwitchBox.get_template(num_track, track_width, wires).edges
+        if not edges:
+            continue
+        idx_from, idx_to = (np.array(v, dtype=np.int64) for v in zip(*edges))
+        tile_ids = np.nonzero(num_tracks == num_track)[0]
+        base = tile_base[tile_ids, None]
+        srcs.append((base + idx_from).ravel())
+        dsts.append((base + idx_to).ravel())
+        wire_tiles.append(np.repeat(tile_ids, len(edges)))
+    if wire_tiles:
+        order = np.argsort(np.concatenate(wire_tiles), kind="stable")
+        srcs = [np.concatenate(srcs)[order]]
+        dsts = [np.concatenate(dsts)[order]]
+
+    # core port connections
+    for port_name in sorted(port_connections):
+        conns = port_connections[port_name]
+        tile_ids, port_ids, is_input = [], [], []
+        for (_, ports, inputs, outputs, _), layout_ids in layouts.items():
+            port_is_input = port_name in inputs
+            port_is_output = port_name in outputs
+            if not port_is_input and not port_is_output:
+                continue
+            elif not (port_is_input ^ port_is_output):
+                raise ValueError("core design error. " + port_name +
+                                 " cannot be  both input and output port")
+            tile_ids.append(layout_ids)
+            port_ids.append(port_base[layout_ids] + ports.index(port_name))
+            is_input.append(np.full(len(layout_ids), port_is_input))
+        if not tile_ids or not conns:
+            continue
+        # in tile order
+        tile_ids = np.concatenate(tile_ids)
+        order = np.argsort(tile_ids, kind="stable")
+        tile_ids = tile_ids[order]
+        port_ids = np.concatenate(port_ids)[order]
+        is_input = np.concatenate(is_input)[order]
+        counts = num_tracks[tile_ids]
+        tile_tracks = np.arange(counts.sum()) - \
+            np.repeat(np.cumsum(counts) - counts, counts)
+        conn_offsets = np.array([_sb_offset(side, 0, io) for side, io in conns],
+                                dtype=np.int64)
+        sb_ids = ((np.repeat(tile_base[tile_ids], counts) +
+                   tile_tracks * _SB_PER_TRACK)[:, None] +
+                  conn_offsets[None, :]).ravel()
+        port_ids = np.repeat(port_ids, counts * len(conns))
+        is_input = np.repeat(is_input, counts * len(conns))
+        srcs.append(np.where(is_input, sb_ids, port_ids))
+        dsts.append(np.where(is_input, port_ids, sb_ids))
+
+    # inter-tile connections, track by track sorted by length
+    current_track = 0
+    for track_len in sorted(track_info):
+        if (x_max - x_min - 1) % track_len != 0:
+            raise ValueError("the region x has to be divisible by expected_"
+                             "length")
+        if (y_max - y_min - 1) % track_len != 0:
+            raise ValueError("the region y has to be divisible by expected_"
+                             "length")
+        horizontal = np.meshgrid(np.arange(x_min, x_max - track_len + 1,
+                                           track_len),
+                                 np.arange(y_min, y_max + 1, track_len),
+                                 indexing="ij")
+        vertical = np.meshgrid(np.arange(x_min, x_max + 1),
+                               np.arange(y_min, y_max - track_len + 1,
+                                         track_len),
+                               indexing="ij")
+        for _ in range(track_info[track_len]):
+            track = current_track
+            for (x, y), (dx, dy), side in ((horizontal, (track_len, 0),
+                                            SwitchBoxSide.EAST),
+                                           (vertical, (0, track_len),
+                                            SwitchBoxSide.SOUTH)):
+                tile_from = tile_index(x.ravel(), y.ravel())
+                tile_to = tile_index(x.ravel() + dx, y.ravel() + dy)
+                assert (num_tracks[tile_from] > track).all()
+                assert (num_tracks[tile_to] > track).all()
+                opposite = side.get_opposite_side()
+                base_from = tile_base[tile_from]
+                base_to = tile_base[tile_to]
+                # forward and backward connections are interleaved
+                srcs.append(np.stack(
+                    [base_from + _sb_offset(side, track, SwitchBoxIO.SB_OUT),
+                     base_to + _sb_offset(opposite, track,
+                                          SwitchBoxIO.SB_OUT)],
+                    axis=1).ravel())
+                dsts.append(np.stack(
+                    [base_to + _sb_offset(opposite, track, SwitchBoxIO.SB_IN),
+                     base_from + _sb_offset(side, track, SwitchBoxIO.SB_IN)],
+                    axis=1).ravel())
+            current_track += 1
+
+    # IO connections of the margin tiles, in the same order as connect_io()
+    if not io_sides & IOSide.None_:
+        grid = np.full((width, height), -1, dtype=np.int64)
+        grid[tile_x, tile_y] = np.arange(len(tiles))
+        # the nearby tile and its side facing the margin tile
+        margin_ids = np.arange(num_array_tiles, len(tiles))
+        x, y = tile_x[margin_ids], tile_y[margin_ids]
+        west, east, north = x < x_min, x > x_max, y < y_min
+        next_ids = grid[np.select([west, east], [x + 1, x - 1], x),
+                        np.select([west, east, north], [y, y, y + 1], y - 1)]
+        next_sides = np.select([west, east, north],
+                               [int(SwitchBoxSide.WEST),
+                                int(SwitchBoxSide.EAST),
+                                int(SwitchBoxSide.NORTH)],
+                               int(SwitchBoxSide.SOUTH))
+        # input is from fabric to IO, output is IO to fabric
+        io_ports = [(port_name, conn, True)
+                    for port_name, conn in io_conn["in"].items()] + \
+                   [(port_name, conn, False)
+                    for port_name, conn in io_conn["out"].items()]
+        keys, io_srcs, io_dsts = [], [], []
+        for group, (port_name, conn, is_input) in enumerate(io_ports):
+            for (_, ports, _, _, _), layout_ids in layouts.items():
+                if port_name not in ports:
+                    continue
+                tile_ids = layout_ids[layout_ids >= num_array_tiles]
+                next_tiles = next_ids[tile_ids - num_array_tiles]
+                side = next_sides[tile_ids - num_array_tiles]
+                port_ids = port_base[tile_ids] + ports.index(port_name)
+                io = SwitchBoxIO.SB_OUT if is_input else SwitchBoxIO.SB_IN
+                for conn_idx, track in enumerate(conn):
+                    # to be conservative when connecting the nodes
+                    valid = track < num_tracks[next_tiles]
+                    sb_ids = tile_base[next_tiles[valid]] + \
+                        _sb_offset(side[valid], track, io)
+                    io_srcs.append(sb_ids if is_input else port_ids[valid])
+                    io_dsts.append(port_ids[valid] if is_input else sb_ids)
+                    keys.append(np.stack(
+                        [tile_ids[valid],
+                         np.full(len(sb_ids), group),
+                         np.full(len(sb_ids), conn_idx)], axis=1))
+        if keys:
+            keys = np.concatenate(keys)
+            order = np.lexsort((keys[:, 2], keys[:, 1], keys[:, 0]))
+            srcs.append(np.concatenate(io_srcs)[order])
+            dsts.append(np.concatenate(io_dsts)[order])
+
+    src = np.concatenate(srcs) if srcs else np.zeros(0, dtype=np.int64)
+    dst = np.concatenate(dsts) if dsts else np.zeros(0, dtype=np.int64)
+    # connecting the same nodes twice is a no-op
+    _, first = np.unique(src * len(store) + dst, return_index=True)
+    first.sort()
+    src = src[first]
+    dst = dst[first]
+    delays = np.zeros(len(src), dtype=np.int64)
+
+    # pipeline registers. the fanouts of the switch box are moved to the
+    # register mux, after the register and the register mux
+    reg_nodes, regs, rmuxs = [], [], []
+    for idx, (track, side) in enumerate(pipeline_reg):
+        tile_ids = np.nonzero(applied[:, idx])[0]
+        reg_nodes.append(tile_base[tile_ids] +
+                         _sb_offset(side, track, SwitchBoxIO.SB_OUT))
+        regs.append(reg_base[tile_ids] + reg_rank[tile_ids, idx])
+        rmuxs.append(rmux_base[tile_ids] + reg_rank[tile_ids, idx])
+    if reg_nodes:
+        reg_nodes = np.concatenate(reg_nodes)
+        regs = np.concatenate(regs)
+        rmuxs = np.concatenate(rmuxs)
+        fanout_order = np.argsort(src, kind="stable")
+        fanout_offsets = np.zeros(len(store) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(store)),
+                  out=fanout_offsets[1:])
+        degrees = fanout_offsets[reg_nodes + 1] - fanout_offsets[reg_nodes]
+        block_sizes = degrees + 3
+        block_starts = np.cumsum(block_sizes) - block_sizes
+        new_src = np.empty(block_sizes.sum(), dtype=np.int64)
+        new_dst = np.empty_like(new_src)
+        new_delays = np.zeros_like(new_src)
+        new_src[block_starts] = reg_nodes
+        new_dst[block_starts] = regs
+        new_src[block_starts + 1] = reg_nodes
+        new_dst[block_starts + 1] = rmuxs
+        new_src[block_starts + 2] = regs
+        new_dst[block_starts + 2] = rmuxs
+        offsets = np.arange(degrees.sum()) - \
+            np.repeat(np.cumsum(degrees) - degrees, degrees)
+        fanouts = fanout_order[np.repeat(fanout_offsets[reg_nodes], degrees) +
+                               offsets]
+        positions = np.repeat(block_starts + 3, degrees) + offsets
+        new_src[positions] = np.repeat(rmuxs, degrees)
+        new_dst[positions] = dst[fanouts]
+        new_delays[positions] = delays[fanouts]
+
+        is_removed = np.zeros(len(store), dtype=bool)
+        is_removed[reg_nodes] = True
+        kept = ~is_removed[src]
+        src = np.concatenate([src[kept], new_src])
+        dst = np.concatenate([dst[kept], new_dst])
+        delays = np.concatenate([delays[kept], new_delays])
+    store.set_edges(src, dst, delays)
+
+    # swap in the node ids and add the tiles to the graph. the views are
+    # created when the nodes are accessed
+    interconnect = InterconnectGraph(track_width)
+    for idx, tile in enumerate(tiles):
+        num_track = int(num_tracks[idx])
+        base = int(tile_base[idx])
+        switchbox = SwitchBox(tile.x, tile.y, num_track, track_width,
+                              list(internal_wires[num_track]),
+                              StoreNodeList(store, range(
+                                  base, base + num_track * _SB_PER_TRACK)))
+        tile.switchbox = switchbox
+        base = int(port_base[idx])
+        tile.ports = StoreNodeDict(store, range(base, base + len(tile.ports)))
+        reg_idx = int(reg_base[idx])
+        rmux_idx = int(rmux_base[idx])
+        num_reg = int(num_regs[idx])
+        switchbox.registers = StoreNodeDict(store,
+                                            range(reg_idx, reg_idx + num_reg))
+        switchbox.reg_muxs = StoreNodeDict(store,
+                                           range(rmux_idx, rmux_idx + num_reg))
+        interconnect.add_tile(tile)
+    interconnect.store = store
+    return interconnect
+
+
 def connect_io(interconnect: InterconnectGraph,
                input_port_conn: Dict[str, List[int]],
                output_port_conn: Dict[str, List[int]],
@@ -183,7 +629,7 @@ def connect_io(interconnect: InterconnectGraph,
                 continue
             # make sure that these margins tiles have empty switch boxes
             tile = interconnect[(x, y)]
-            if tile.core.core is None:
+            if tile.core is None:
                 continue
             assert tile.switchbox.num_track == 0
             # compute the nearby tile
@@ -241,24 +687,17 @@ class DummyCore(Core):
 
 
 def write_bitstream(config_data, filename):
-    with open(filename, "w+") as f:
-        for addr, data in config_data:
-            f.write("{0:08X} {1:08X}\n".format(addr, data))
+    if not isinstance(config_data, Bitstream):
+        config_data = Bitstream.from_configs(config_data)
+    config_data.write(filename)
 
 
 def merge_bitstream(config_data):
-    res = {}
-    for addr, data in config_data:
-        if addr in res:
-            v = res[addr]
-            v |= data
-            res[addr] = v
-        else:
-            res[addr] = data
-    result = []
-    for addr, data in res.items():
-        result.append((addr, data))
-    return result
+    """ORs the config data with the same address together. a list of
+    (addr, data) is returned for a list input, and a Bitstream for a Bitstream"""
+    if isinstance(config_data, Bitstream):
+        return config_data.merge()
+    return Bitstream.from_configs(config_data).merge().to_list()
 
 
 if __name__ == "__main__":
@@ -18,6 +18,7 @@ setup(
     url="https://github.com/Kuree/kcanal",
     install_requires=[
         "kratos",
+        "numpy",
     ],
     license_files=['LICENSE'],
     python_requires=">=3.6",
@@ -0,0 +1,172 @@
+import os
+import random
+import tempfile
+import zlib
+
+import pytest
+
+from kcanal.bitstream import Bitstream, read_header
+from kcanal.util import merge_bitstream, write_bitstream
+
+
+def get_random_configs(num_entries, num_addrs=64, seed=0):
+    rand = random.Random(seed)
+    return [(rand.randrange(num_addrs) << 8, 1 << rand.randrange(32)) for _ in range(num_entries)]
+
+
+def test_merge():
+    configs = get_random_configs(1000)
+
+    # USAGE
+    bitstream = Bitstream.from_configs(configs).merge()
+
+    # TESTS
+    expected = {}
+    for addr, data in configs:
+        expected[addr] = expected.get(addr, 0) | data
+    assert bitstream.to_list() == list(expected.items())
+    assert merge_bitstream(configs) == list(expected.items())
+    assert merge_bitstream([]) == []
+
+
+def test_conflicts():
+    configs = [(0x100, 0xF, 0x1), (0x200, 0xF0, 0x20), (0x100, 0xF, 0x1), (0x100, 0xF0, 0x30)]
+    bitstream = Bitstream.from_configs(configs)
+    assert len(bitstream.conflicts()) == 0
+    bitstream.check_conflicts()
+    assert bitstream.merge().to_list() == [(0x100, 0x31), (0x200, 0x20)]
+
+    # two routes selecting different inputs of the same mux
+    configs.append((0x200, 0xF0, 0x10))
+    bitstream = Bitstream.from_configs(configs)
+    assert bitstream.conflicts().tolist() == [0x200]
+    with pytest.raises(ValueError) as ex:
+        bitstream.check_conflicts()
+    assert "0x00000200" in str(ex.value)
+
+
+def test_write():
+    configs = get_random_configs(100) + [(0xFFFFFFFF, 0)]
+    bitstream = Bitstream.from_configs(configs)
+    with tempfile.TemporaryDirectory() as temp:
+        filename = os.path.join(temp, "config.bs")
+        write_bitstream(bitstream, filename)
+        with open(filename) as f:
+            lines = f.read().splitlines()
+        assert lines == ["{0:08X} {1:08X}".format(addr, data) for addr, data in configs]
+
+        filename = os.path.join(temp, "config.bin")
+        bitstream.write_binary(filename)
+        with open(filename, "rb") as f:
+            raw = f.read()
+        header = read_header(filename)
+        assert header == (32, 32, len(configs), zlib.crc32(bitstream.to_bytes()))
+        assert len(raw) == 24 + len(configs) * 8
+        assert int.from_bytes(raw[24:28], "little") == configs[0][0]
+        assert int.from_bytes(raw[28:32], "little") == configs[0][1]
+        with pytest.raises(ValueError):
+            bitstream.write_binary(filename, addr_width=16)
+
+
+@pytest.mark.parametrize("fmt", ["hex", "binary", "npy"])
+@pytest.mark.parametrize("mmap", [True, False])
+def test_read(fmt, mmap):
+    bitstream = Bitstream.from_configs(get_random_configs(100))
+    with tempfile.TemporaryDirectory() as temp:
+        filename = os.path.join(temp, "config." + fmt)
+        if fmt == "hex":
+            bitstream.write(filename)
+        elif fmt == "binary":
+            bitstream.write_binary(filename)
+        else:
+            bitstream.write_npy(filename)
+
+        # USAGE
+        result = Bitstream.read(filename, mmap=mmap)
+
+        # TESTS
+        assert result == bitstream
+        assert Bitstream.read(filename, mmap=mmap).merge() == bitstream.merge()
+        del result
+
+    assert Bitstream.from_hex("0000000A 0000000b\n1 2\n").to_list() == [(10, 11), (1, 2)]
+
+
+def test_read_corrupted():
+    bitstream = Bitstream.from_configs(get_random_configs(100))
+    with tempfile.TemporaryDirectory() as temp:
+        filename = os.path.join(temp, "config.bin")
+        bitstream.write_binary(filename)
+        with open(filename, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            value = f.read(1)[0]
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([value ^ 1]))
+        with pytest.raises(ValueError):
+            Bitstream.read(filename)
+        assert len(Bitstream.read(filename, verify=False)) == len(bitstream)
+
+
+def test_overlapping_conflicts():
+    # a whole-word write overlapping a field write with a different value
+    bitstream = Bitstream.from_configs([(0x100, 0xF, 0x3), (0x100, 0xFFFFFFFF, 0x3), (0x200, 0xFF, 0x12),
+                                        (0x200, 0xF0, 0x20)])
+    assert bitstream.conflicts().tolist() == [0x200]
+    with pytest.raises(ValueError):
+        bitstream.merge()
+    # an unchecked merge ORs the values as before
+    assert bitstream.merge(check=False).to_list() == [(0x100, 0x3), (0x200, 0x32)]
+
+
+def test_merge_base():
+    base = Bitstream([0x100, 0x200, 0x300], [0xFFFF0000, 0x12345678, 0x1])
+    bitstream = Bitstream.from_configs([(0x200, 0xF, 0x1), (0x400, 0xF0, 0x70), (0x200, 0xF00, 0x200),
+                                        (0x300, 0xFFFFFFFF, 0x2)])
+
+    # USAGE
+    result = bitstream.merge(base=base)
+
+    # TESTS
+    assert result.to_list() == [(0x100, 0xFFFF0000), (0x200, 0x12345271), (0x300, 0x2), (0x400, 0x70)]
+    # entries without a mask replace the whole word
+    assert Bitstream([0x100], [0x1]).merge(base=base).to_list()[0] == (0x100, 0x1)
+    assert Bitstream([], []).merge(base=base) == base
+
+
+def test_delta():
+    old = Bitstream.from_configs([(0x100, 0xF, 0x1), (0x100, 0xF0, 0x10), (0x200, 0xF, 0x2), (0x300, 0xF, 0x3)])
+    new = Bitstream.from_configs([(0x100, 0xF, 0x1), (0x100, 0xF0, 0x20), (0x300, 0xF, 0x3), (0x400, 0xF, 0x4),
+                                  (0x500, 0xF, 0x0)])
+
+    # USAGE
+    delta = new.delta(old)
+
+    # TESTS
+    # unchanged words and words staying at reset are skipped, unused ones are cleared
+    assert delta.to_list() == [(0x100, 0x21), (0x400, 0x4), (0x200, 0x0)]
+    assert len(new.delta(new)) == 0
+    # everything is written from reset, or cleared back to it
+    empty = Bitstream.from_configs([])
+    assert new.delta(empty).to_list() == [(0x100, 0x21), (0x300, 0x3), (0x400, 0x4)]
+    assert empty.delta(old).to_list() == [(0x100, 0x0), (0x200, 0x0), (0x300, 0x0)]
+    # applying the delta to the old image gives the new one
+    image = delta.merge(base=old.merge())
+    assert {addr: data for addr, data in image if data} == {addr: data for addr, data in new.merge() if data}
+
+
+def test_bursts():
+    step = 1 << 24
+    bitstream = Bitstream.from_configs([(0x0100 | 2 * step, 0x3), (0x0100, 0x1), (0x0200, 0x7), (0x0100 | step, 0x2),
+                                        (0x0100 | 4 * step, 0x5), (0x0100, 0x10)])
+
+    # USAGE
+    bursts = bitstream.to_bursts(step)
+
+    # TESTS
+    # consecutive words of the same feature form one burst, word 3 is not written
+    assert bursts == [(0x0100, [0x11, 0x2, 0x3]), (0x0100 | 4 * step, [0x5]), (0x0200, [0x7])]
+    # each burst costs its start address plus one beat per word
+    assert sum(1 + len(data) for _, data in bursts) == 8
+    assert Bitstream.from_configs([(0x10, 0x1), (0x11, 0x2), (0x13, 0x3)]).to_bursts() == [(0x10, [0x1, 0x2]),
+                                                                                             (0x13, [0x3])]
+    assert Bitstream([], []).to_bursts() == []
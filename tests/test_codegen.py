@@ -1,7 +1,9 @@
+import json
 import subprocess
 
 from kcanal.circuit import CB, SB, TileCircuit
 from kcanal.interconnect import Interconnect
+from kcanal.logic import ConfigPacking, Configurable, WireMux
 from kcanal.util import DummyCore, create_uniform_interconnect, SwitchBoxType
 from kcanal.cyclone import PortNode, Node, ImranSwitchBox, DisjointSwitchBox, Tile, SwitchBoxSide, SwitchBoxIO, \
     SBConnectionType, SwitchBox
@@ -27,25 +29,76 @@ def insert_pipeline_registers(sb: SwitchBox):
             sb.add_pipeline_register(side, track)
 
 
-def test_cb_codegen():
+@pytest.mark.parametrize("register_file", [False, True])
+def test_cb_codegen(register_file):
     node = PortNode("test", 0, 0, 16)
     for _ in range(5):
         Node(0, 0, 16).add_edge(node)
 
     cb = CB(node, 32, 32)
+    cb.register_file = register_file
     cb.finalize()
     with tempfile.TemporaryDirectory() as temp:
         filename = os.path.join(temp, "cb.sv")
         check_verilog(cb, filename)
 
 
+def test_cb_clone():
+    def create_node(name, height, width=16):
+        node = PortNode(name, 0, 0, width)
+        for _ in range(height):
+            Node(0, 0, width).add_edge(node)
+        return node
+
+    cb = CB.clone(node=create_node("cb_clone", 4), config_addr_width=8, config_data_width=32)
+    # CBs are only shared if the mux is the same
+    assert CB.clone(node=create_node("cb_clone", 4), config_addr_width=8, config_data_width=32).def_instance is cb
+    assert CB.clone(node=create_node("cb_clone", 5), config_addr_width=8, config_data_width=32).def_instance is not cb
+    assert CB.clone(node=create_node("cb_clone", 4, 1), config_addr_width=8,
+                    config_data_width=32).def_instance is not cb
+
+
+@pytest.mark.parametrize("config_packing", [ConfigPacking.FirstFit, ConfigPacking.Tile])
+def test_sb_clone(config_packing):
+    num_tracks = 5
+    input_connections, output_connections = get_in_out_connections(num_tracks)
+    tile_circuits = []
+    for x in range(2):
+        core = DummyCore()
+        tiles = {}
+        for bit_width in [1, 16]:
+            tile = Tile(x, 0, bit_width, DisjointSwitchBox(x, 0, num_tracks, bit_width))
+            tile.set_core(core)
+            tile.set_core_connection(f"in{bit_width}", input_connections)
+            tile.set_core_connection(f"out{bit_width}", output_connections)
+            tiles[bit_width] = tile
+        tile_circuits.append(TileCircuit(tiles, 8, 32, config_packing=config_packing))
+
+    # switch boxes with the same structure share one circuit
+    for bit_width in [1, 16]:
+        sb = tile_circuits[1].sbs[bit_width]
+        assert sb.is_cloned
+        assert sb.def_instance is tile_circuits[0].sbs[bit_width]
+    for tile_circuit in tile_circuits:
+        tile_circuit.finalize()
+    configs = []
+    for tile_circuit in tile_circuits:
+        sb_node = tile_circuit.tiles[16].get_sb(SwitchBoxSide.EAST, 0, SwitchBoxIO.SB_OUT)
+        configs.append(tile_circuit.get_route_bitstream_config(sb_node.get_conn_in()[1], sb_node))
+    assert configs[0] == configs[1]
+
+
 @pytest.mark.parametrize("insert_pipline", [True, False])
-def test_sb_codegen(insert_pipline):
+@pytest.mark.parametrize("inline_mux", [True, False])
+def test_sb_codegen(insert_pipline, inline_mux):
     switchbox = ImranSwitchBox(0, 0, 2, 1)
     if insert_pipline:
         insert_pipeline_registers(switchbox)
-    sb = SB(switchbox, 8, 32, "Test")
+    sb = SB(switchbox, 8, 32, "Test", inline_mux=inline_mux)
     sb.finalize()
+    for node, mux in sb.sb_muxs.values():
+        # incoming tracks have a single input
+        assert isinstance(mux, WireMux) == (inline_mux and node.io == SwitchBoxIO.SB_IN)
     with tempfile.TemporaryDirectory() as temp:
         filename = os.path.join(temp, "sb.sv")
         check_verilog(sb, filename)
@@ -65,7 +118,8 @@ def get_in_out_connections(num_tracks):
     return input_connections, output_connections
 
 
-def test_tile_codegen():
+@pytest.mark.parametrize("burst", [False, True])
+def test_tile_codegen(burst):
     x, y = 0, 0
     tiles = {}
     bit_widths = [1, 16]
@@ -94,8 +148,9 @@ def test_tile_codegen():
         tile.set_core_connection(output_port_name, output_connections)
 
     tile_circuit = TileCircuit(tiles, addr_width, data_width,
-                               tile_id_width=tile_id_width)
+                               tile_id_width=tile_id_width, burst=burst)
     tile_circuit.finalize()
+    assert ("config_burst" in tile_circuit.ports) == ("config_en" in tile_circuit.ports) == burst
     with tempfile.TemporaryDirectory() as temp:
         filename = os.path.join(temp, "tile.sv")
         check_verilog(tile_circuit, filename)
@@ -109,6 +164,144 @@ def test_interconnect_codegen(create_dummy_interconnect):
         check_verilog(interconnect, filename)
 
 
+@pytest.mark.parametrize("widths", [(8, 32, 16), (4, 24, 8), (6, 32, 12)])
+def test_config_addr_widths(create_dummy_interconnect, widths):
+    # register address, full address and tile id widths. only the default split gives equal field widths
+    addr_width, full_config_addr_width, tile_id_width = widths
+    interconnect = create_dummy_interconnect(2, 2, addr_width=addr_width, tile_id_width=tile_id_width,
+                                             full_config_addr_width=full_config_addr_width)
+    for (x, y), tile in interconnect.tile_circuits.items():
+        features = tile.features if tile.tile_config is None else tile.features + [tile.tile_config]
+        assert tile.feature_addr_slice == slice(tile_id_width, full_config_addr_width - addr_width)
+        assert tile.feature_config_slice == slice(full_config_addr_width - addr_width, full_config_addr_width)
+        for feat_addr, feature in enumerate(features):
+            # the features are addressed by the register address bits only
+            assert feature.config_addr.width == addr_width
+            # the tile decodes the addresses of Interconnect.get_config_addr()
+            reg_addr = (1 << addr_width) - 1
+            addr = interconnect.get_config_addr(reg_addr, feat_addr, x, y)
+            assert addr < 1 << full_config_addr_width
+            assert addr & ((1 << tile_id_width) - 1) == interconnect.get_tile_id(x, y)
+            assert (addr >> tile.feature_addr_slice.start) & ((1 << tile.feature_addr_size) - 1) == feat_addr
+            assert addr >> tile.feature_config_slice.start == reg_addr
+    with tempfile.TemporaryDirectory() as temp:
+        filename = os.path.join(temp, "interconnect.sv")
+        check_verilog(interconnect, filename)
+
+
+def test_tile_definitions(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+    tile_circuits = interconnect.tile_circuits
+    definitions = [tile for tile in tile_circuits.values() if tile.is_definition]
+    # all the dummy tiles are identical
+    assert len(definitions) == 1
+    definition = definitions[0]
+    for tile in tile_circuits.values():
+        assert tile.definition is definition
+        assert tile.name == definition.name
+        assert TileCircuit.get_signature(tile.tiles) == TileCircuit.get_signature(definition.tiles)
+        assert set(tile.ports) == set(definition.ports)
+        assert tile.sbs is definition.sbs
+    with tempfile.TemporaryDirectory() as temp:
+        filename = os.path.join(temp, "interconnect.sv")
+        check_verilog(interconnect, filename)
+
+
+def test_heterogeneous_tile_definitions():
+    cores = {}
+    in_conn = [(side, SwitchBoxIO.SB_IN) for side in SwitchBoxSide]
+    out_conn = [(side, SwitchBoxIO.SB_OUT) for side in SwitchBoxSide]
+    reg_coords = [(1, 1), (2, 2)]
+    ics = {}
+    for bit_width in [1, 16]:
+        ic = create_uniform_interconnect(4, 4, bit_width, lambda x, y: cores.setdefault((x, y), DummyCore()),
+                                         {f"in{bit_width}": in_conn, f"out{bit_width}": out_conn},
+                                         {1: 5}, SwitchBoxType.Disjoint)
+        # pipeline registers only on some of the tiles
+        for x, y in reg_coords:
+            ic[x, y].switchbox.add_pipeline_register(SwitchBoxSide.EAST, 0)
+        ics[bit_width] = ic
+    interconnect = Interconnect(ics, 8, 32, tile_id_width=16, lift_ports=True)
+    interconnect.finalize()
+
+    tile_circuits = interconnect.tile_circuits
+    definitions = {tile.definition for tile in tile_circuits.values()}
+    assert len(definitions) == 2
+    reg_tile = tile_circuits[reg_coords[0]]
+    assert reg_tile.definition is tile_circuits[reg_coords[1]].definition
+    assert reg_tile.definition is not tile_circuits[0, 0].definition
+    assert reg_tile.name != tile_circuits[0, 0].name
+    for bit_width in [1, 16]:
+        assert reg_tile.sbs[bit_width] is not tile_circuits[0, 0].sbs[bit_width]
+        assert len(reg_tile.sbs[bit_width].regs) == 1
+        assert len(tile_circuits[0, 0].sbs[bit_width].regs) == 0
+        # module names are unique across the tiles
+        assert reg_tile.sbs[bit_width].name != tile_circuits[0, 0].sbs[bit_width].name
+    with tempfile.TemporaryDirectory() as temp:
+        filename = os.path.join(temp, "interconnect.sv")
+        check_verilog(interconnect, filename)
+
+
+def test_config_packing(create_dummy_interconnect):
+    config = Configurable("test_config_packing", 8, 32)
+    for name, width in [("a", 12), ("b", 12), ("c", 20), ("d", 20)]:
+        config.add_config(name, width)
+    assert config.get_num_config_words() == 3
+    assert config.get_num_config_words(ConfigPacking.FirstFitDecreasing) == 2
+
+    config.config_packing = ConfigPacking.FirstFitDecreasing
+    config.finalize()
+    assert config.get_config_field("c") == (0, 0, 19)
+    assert config.get_config_field("d") == (1, 0, 19)
+    assert config.get_config_field("a") == (0, 20, 31)
+    assert config.get_config_field("b") == (1, 20, 31)
+
+    # all the fields of a tile packed together
+    interconnect = create_dummy_interconnect(2, 2, config_packing=ConfigPacking.Tile)
+    first_fit, packed = interconnect.get_config_packing_report()
+    assert packed < first_fit
+    assert first_fit == interconnect.get_config_packing_report(ConfigPacking.FirstFit)[1]
+    # instances are built like their definition
+    assert all(tile.config_packing == ConfigPacking.Tile for tile in interconnect.tile_circuits.values())
+    tile = interconnect.tile_circuits[1, 1]
+    definition = tile.definition
+    assert tile.get_num_config_words() == definition.tile_config.get_num_config_words() < \
+           tile.get_num_config_words(ConfigPacking.FirstFit)
+    # every field is in a register of the tile, without overlapping another one
+    masks = {}
+    for feature_addr, name in definition.tile_config.fields:
+        reg_idx, config_addr, lo, hi = tile.get_config_field(feature_addr, name)
+        assert config_addr == len(definition.features)
+        mask = ((1 << (hi - lo + 1)) - 1) << lo
+        assert masks.get(reg_idx, 0) & mask == 0
+        masks[reg_idx] = masks.get(reg_idx, 0) | mask
+    assert len(masks) == tile.get_num_config_words()
+    for feature in definition.features:
+        for name in feature.def_instance.registers:
+            assert f"config_{name}" in feature.ports
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_split_codegen(create_dummy_interconnect, processes):
+    interconnect = create_dummy_interconnect(4, 4)
+    options = kratos.SystemVerilogCodeGenOptions()
+    options.unique_case = False
+    with tempfile.TemporaryDirectory() as temp:
+        # USAGE
+        manifest = interconnect.write_verilog(temp, processes=processes, codegen_options=options)
+
+        # TESTS
+        with open(os.path.join(temp, "manifest.json")) as f:
+            assert json.load(f) == manifest
+        assert manifest["top"] == interconnect.name
+        assert manifest["modules"][interconnect.name] == manifest["top_file"]
+        assert manifest["modules"]["Tile_DummyCore"] in manifest["files"]
+        assert len(manifest["tiles"]["Tile_DummyCore"]) == len(interconnect.tile_circuits)
+        for filename in manifest["files"]:
+            assert os.path.isfile(os.path.join(temp, filename))
+        subprocess.check_call(["iverilog", "-g2012"] + manifest["files"], cwd=temp, stdout=None)
+
+
 if __name__ == "__main__":
     from conftest import create_dummy_interconnect_fn
     test_interconnect_codegen(create_dummy_interconnect_fn)
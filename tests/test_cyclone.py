@@ -1,8 +1,14 @@
 """Because the majority of Cyclone's functionality has already been tested in
 test_circuit.py, we will focus on functions have not been fully tested yet """
 from kcanal.cyclone import *
-from kcanal.util import create_uniform_interconnect, SwitchBoxType, DummyCore
+from kcanal.util import create_uniform_interconnect, \
+    create_uniform_interconnects, SwitchBoxType, DummyCore, IOSide
+import filecmp
+import pickle
+import os
 import pytest
+import tempfile
+import warnings
 
 
 def test_remove_side_sb():
@@ -49,6 +55,39 @@ def test_remove_side_sb():
     assert len(all_sbs) == (2 * 4 - 1) * num_tracks
 
 
+def test_switchbox_template():
+    wires = SwitchBoxHelper.get_wilton_sb_wires(1)
+    template = SwitchBox.get_template(1, 16, wires)
+    assert SwitchBox.get_template(1, 16, list(wires)) is template
+    # duplicated wires are only connected once
+    duplicated = SwitchBox.get_template(1, 16, wires + wires[:2])
+    assert duplicated.edges == template.edges
+
+    switch = WiltonSwitchBox(0, 0, 1, 16)
+    assert switch.get_all_sbs() == [SwitchBoxNode(0, 0, track, 16, side, io)
+                                    for track, side, io in template.nodes]
+    for track_from, side_from, track_to, side_to in wires:
+        sb_from = switch[side_from, track_from, SwitchBoxIO.SB_IN]
+        sb_to = switch[side_to, track_to, SwitchBoxIO.SB_OUT]
+        assert sb_to in sb_from
+
+    with pytest.raises(IndexError):
+        SwitchBox(0, 0, 1, 16, SwitchBoxHelper.get_disjoint_sb_wires(2))
+
+
+def test_switch_id():
+    graph = InterconnectGraph(16)
+    wires = SwitchBoxHelper.get_disjoint_sb_wires(2)
+    for x in range(4):
+        # same set of wires, in a different order
+        tile_wires = wires if x % 2 == 0 else wires[::-1]
+        graph.add_tile(Tile.create_tile(x, 0, 16, 2, tile_wires))
+    graph.add_tile(Tile.create_tile(4, 0, 16, 3,
+                                    SwitchBoxHelper.get_disjoint_sb_wires(3)))
+    graph.add_tile(Tile.create_tile(5, 0, 16, 2, wires))
+    assert [graph[x, 0].switchbox.id for x in range(6)] == [0, 0, 0, 0, 1, 0]
+
+
 def test_tiling():
     """test low-level tiling. we expect the tiling be handled internally.
     as a result, users do not need to create a graph tile by hand
@@ -286,3 +325,416 @@ def test_uniform(chip_size: int, num_track: int, track_width):
                                               SwitchBoxIO.SB_IN)
                 assert tile_from_sb in ic and tile_to_sb in ic
                 assert tile_to_sb in tile_from_sb
+
+
+def create_pipelined_interconnect(chip_size: int, track_width: int,
+                                  num_track: int = 5,
+                                  sb_type: SwitchBoxType = SwitchBoxType.Imran,
+                                  bulk: bool = False):
+    def dummy_col(_: int, __: int):
+        return DummyCore()
+
+    in_conn = [(side, SwitchBoxIO.SB_IN) for side in SwitchBoxSide]
+    out_conn = [(side, SwitchBoxIO.SB_OUT) for side in SwitchBoxSide]
+    pipeline_regs = [(track, side) for track in range(num_track)
+                     for side in SwitchBoxSide]
+    return create_uniform_interconnect(chip_size, chip_size, track_width,
+                                       dummy_col,
+                                       {f"in{track_width}": in_conn,
+                                        f"out{track_width}": out_conn},
+                                       {1: num_track},
+                                       sb_type,
+                                       pipeline_regs,
+                                       bulk=bulk)
+
+
+def get_tile_nodes(tile: Tile):
+    return tile.switchbox.get_all_sbs() + list(tile.ports.values()) + \
+        list(tile.switchbox.registers.values()) + \
+        list(tile.switchbox.reg_muxs.values())
+
+
+def get_all_nodes(ic: InterconnectGraph):
+    nodes = []
+    for coord in ic:
+        nodes += get_tile_nodes(ic[coord])
+    return nodes
+
+
+def test_compact():
+    ic = create_pipelined_interconnect(3, 16)
+    expected = [(str(node), node.node_str(),
+                 [n.node_str() for n in node],
+                 [n.node_str() for n in node.get_conn_in()])
+                for node in get_all_nodes(ic)]
+    with tempfile.TemporaryDirectory() as temp:
+        before = os.path.join(temp, "before.graph")
+        ic.dump_graph(before, 3)
+
+        # USAGE
+        store = ic.compact()
+
+        # TESTS
+        # views are only created when the nodes are accessed
+        assert store.num_views == 0
+        after = os.path.join(temp, "after.graph")
+        ic.dump_graph(after, 3)
+        assert filecmp.cmp(before, after, shallow=False)
+    assert ic.store is store
+    nodes = get_all_nodes(ic)
+    assert len(store) == len(nodes)
+    result = [(str(node), node.node_str(),
+               [n.node_str() for n in node],
+               [n.node_str() for n in node.get_conn_in()])
+              for node in nodes]
+    assert result == expected
+
+    sb = ic.get_sb(1, 1, SwitchBoxSide.EAST, 0, SwitchBoxIO.SB_OUT)
+    assert isinstance(sb, SwitchBoxNode)
+    assert not hasattr(sb, "__dict__")
+    assert sb in ic
+    reg_mux = ic[1, 1].switchbox.get_reg_mux(SwitchBoxSide.EAST, 0)
+    assert reg_mux in sb and sb.get_edge_cost(reg_mux) == 0
+    with pytest.raises(RuntimeError):
+        sb.remove_edge(reg_mux)
+
+
+def dump_graph_lines(ic: InterconnectGraph, switches: List[SwitchBox],
+                     max_num_col: int):
+    # line by line reference of the .graph format
+    lines = []
+    for switch in switches:
+        lines += [str(switch), "BEGIN"]
+        lines += [f"  {t0} {s0.value} {t1} {s1.value}"
+                  for t0, s0, t1, s1 in switch.internal_wires]
+        lines.append("END")
+    for coord in ic:
+        tile = ic[coord]
+        if coord[0] >= max_num_col:
+            continue
+        lines.append(str(tile))
+        for node in get_tile_nodes(tile):
+            if len(node) == 0 or node.x >= max_num_col:
+                continue
+            lines += ["  " + node.node_str(), "  BEGIN"]
+            for n in node:
+                if isinstance(node, SwitchBoxNode) and \
+                        isinstance(n, SwitchBoxNode) and \
+                        (node.x, node.y) == (n.x, n.y):
+                    continue
+                if n.x < max_num_col:
+                    lines.append("      " + n.node_str())
+            lines.append("  END")
+    return lines
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_graph_writer(compact: bool):
+    ic = create_pipelined_interconnect(4, 16)
+    if compact:
+        ic.compact()
+    switches = [ic[0, 0].switchbox, ic[1, 1].switchbox]
+    with tempfile.TemporaryDirectory() as temp:
+        for max_num_col in (2, 5):
+            filename = os.path.join(temp, "graph")
+            writer = GraphWriter(switches, [(coord, ic[coord]) for coord in ic],
+                                 max_num_col, ic.store)
+            # flush as often as possible
+            writer.CHUNK_SIZE = 1
+            writer.write(filename)
+            with open(filename) as f:
+                lines = f.read().splitlines()
+            assert lines == dump_graph_lines(ic, switches, max_num_col)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_node_index(compact: bool):
+    ic = create_pipelined_interconnect(3, 16)
+    if compact:
+        ic.compact()
+    index = ic.get_node_index()
+    nodes = get_all_nodes(ic)
+    assert len(index) == len(nodes)
+    for node in nodes:
+        assert index[node.key()] is node
+
+
+def test_graph_reader():
+    ic = create_pipelined_interconnect(4, 16)
+    with tempfile.TemporaryDirectory() as temp:
+        expected_filename = os.path.join(temp, "expected.graph")
+        ic.dump_graph(expected_filename, 5)
+
+        # USAGE
+        reader = GraphReader(expected_filename)
+        graph = reader.read()
+
+        # TESTS
+        assert graph.store.num_views == 0
+        filename = os.path.join(temp, "actual.graph")
+        graph.dump_graph(filename, 5)
+        assert filecmp.cmp(expected_filename, filename, shallow=False)
+
+        with open(filename, "a") as f:
+            f.write("  PORT unknown (100, 100, 16)\n")
+        with pytest.raises(ValueError):
+            GraphReader(filename).read()
+    assert graph.store is not None
+    assert list(graph) == list(ic)
+    for coord in ic:
+        assert graph[coord].switchbox.id == ic[coord].switchbox.id
+        assert graph[coord].core is None
+    for node in get_all_nodes(ic):
+        new = reader.nodes[node.node_str()]
+        assert new == node
+        assert [n.key() for n in new] == [n.key() for n in node]
+        # mux select order is kept
+        assert [n.key() for n in new.get_conn_in()] == \
+            [n.key() for n in node.get_conn_in()]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_graph_writer_roundtrip_check(compact: bool):
+    ic = create_pipelined_interconnect(3, 16)
+    port = ic[1, 1].ports["in16"]
+    # mux select order that is not in file order
+    fanins = list(port.get_conn_in())
+    for node in fanins:
+        node.remove_edge(port)
+    for node in reversed(fanins):
+        node.add_edge(port)
+    # port without any connection
+    out_port = ic[1, 1].ports["out16"]
+    for node in list(out_port):
+        out_port.remove_edge(node)
+    if compact:
+        ic.compact()
+    with tempfile.TemporaryDirectory() as temp:
+        filename = os.path.join(temp, "graph")
+        # only checked on request
+        assert ic.dump_graph(filename, 3) == []
+        messages = ic.dump_graph(filename, 3, check_roundtrip=True)
+    assert len(messages) == 2
+    assert messages[0].startswith(out_port.node_str())
+    assert port.node_str() in messages[1]
+
+
+@pytest.mark.parametrize("sb_type", [SwitchBoxType.Disjoint,
+                                     SwitchBoxType.Wilton,
+                                     SwitchBoxType.Imran])
+@pytest.mark.parametrize("track_width", [1, 16])
+def test_uniform_bulk(sb_type: SwitchBoxType, track_width: int):
+    expected = create_pipelined_interconnect(3, track_width, 4, sb_type)
+    expected_store = expected.compact()
+
+    # USAGE
+    ic = create_pipelined_interconnect(3, track_width, 4, sb_type, bulk=True)
+
+    # TESTS
+    store = ic.store
+    assert store is not None
+    assert store.num_views == 0
+    for name in ("kind", "x", "y", "track", "side", "io", "width", "names",
+                 "hashes", "fanout_offsets", "fanouts", "delays",
+                 "fanin_offsets", "fanins"):
+        assert getattr(store, name) == getattr(expected_store, name), name
+    for old, new in zip(get_all_nodes(expected), get_all_nodes(ic)):
+        assert old == new
+    with tempfile.TemporaryDirectory() as temp:
+        expected_filename = os.path.join(temp, "expected.graph")
+        filename = os.path.join(temp, "bulk.graph")
+        expected.dump_graph(expected_filename, 3)
+        ic.dump_graph(filename, 3)
+        assert filecmp.cmp(expected_filename, filename, shallow=False)
+
+
+@pytest.mark.parametrize("io_sides", [IOSide.North | IOSide.West,
+                                      IOSide.North | IOSide.East |
+                                      IOSide.South | IOSide.West])
+def test_uniform_bulk_io(io_sides: IOSide):
+    def create_interconnect(bulk: bool):
+        in_conn = [(side, SwitchBoxIO.SB_IN) for side in SwitchBoxSide]
+        out_conn = [(side, SwitchBoxIO.SB_OUT) for side in SwitchBoxSide]
+        pipeline_regs = [(track, side) for track in range(2)
+                         for side in SwitchBoxSide]
+        return create_uniform_interconnect(5, 5, 16, lambda x, y: DummyCore(),
+                                           {"in16": in_conn,
+                                            "out16": out_conn},
+                                           {1: 3}, SwitchBoxType.Imran,
+                                           pipeline_regs, io_sides,
+                                           {"in": {"in16": [0, 2]},
+                                            "out": {"out16": [1, 0, 5]}},
+                                           bulk=bulk)
+
+    expected = create_interconnect(False)
+    expected_store = expected.compact()
+
+    # USAGE
+    ic = create_interconnect(True)
+
+    # TESTS
+    store = ic.store
+    for name in ("kind", "x", "y", "track", "side", "io", "width", "names",
+                 "hashes", "fanout_offsets", "fanouts", "delays",
+                 "fanin_offsets", "fanins"):
+        assert getattr(store, name) == getattr(expected_store, name), name
+    # the margin tiles are connected to the fabric
+    port = ic[0, 2].ports["in16"]
+    assert [n.node_str() for n in port.get_conn_in()] == \
+        [n.node_str() for n in expected[0, 2].ports["in16"].get_conn_in()]
+    assert len(port.get_conn_in()) == 2
+    # the unused ports of the margin tiles are not read back, which is only
+    # reported on request
+    with tempfile.TemporaryDirectory() as temp:
+        filename = os.path.join(temp, "graph")
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            assert ic.dump_graph(filename, 5) == []
+        messages = ic.dump_graph(filename, 5, check_roundtrip=True)
+    assert len(messages) == 1 and "has no connections" in messages[0]
+
+
+@pytest.mark.parametrize("io_sides", [IOSide.None_,
+                                      IOSide.North | IOSide.West])
+def test_create_uniform_interconnects(io_sides: IOSide):
+    cores = {}
+
+    def dummy_col(x: int, y: int):
+        if (x, y) not in cores:
+            cores[x, y] = DummyCore()
+        return cores[x, y]
+
+    in_conn = [(side, SwitchBoxIO.SB_IN) for side in SwitchBoxSide]
+    out_conn = [(side, SwitchBoxIO.SB_OUT) for side in SwitchBoxSide]
+    port_connections = {"in1": in_conn, "out1": out_conn,
+                        "in16": in_conn, "out16": out_conn}
+    pipeline_regs = [(0, side) for side in SwitchBoxSide]
+    io_conn = {"in": {"in1": [0], "in16": [0, 1]},
+               "out": {"out1": [1], "out16": [1, 0]}}
+    expected = {bit_width: create_uniform_interconnect(
+        3, 3, bit_width, dummy_col, port_connections, {1: 2},
+        SwitchBoxType.Imran, pipeline_regs, io_sides, io_conn, bulk=True)
+        for bit_width in [1, 16]}
+
+    # USAGE
+    cores.clear()
+    graphs = create_uniform_interconnects(3, 3, [1, 16], dummy_col,
+                                          port_connections, {1: 2},
+                                          SwitchBoxType.Imran, pipeline_regs,
+                                          io_sides, io_conn, processes=2)
+
+    # TESTS
+    assert list(graphs) == [1, 16]
+    for bit_width, graph in graphs.items():
+        assert graph.store.fanouts == expected[bit_width].store.fanouts
+        assert graph.store.fanins == expected[bit_width].store.fanins
+        # the margin tiles are connected to the fabric
+        num_io_conns = len(io_conn["in"][f"in{bit_width}"])
+        for coord in [(0, 1), (1, 0)]:
+            port = graph[coord].ports[f"in{bit_width}"]
+            num_conns = num_io_conns if io_sides & IOSide.North else \
+                len(in_conn) * 2
+            assert len(port.get_conn_in()) == num_conns
+        for coord in graph:
+            tile = graph[coord]
+            # cores are shared across bit widths
+            assert tile.core is cores[coord]
+            assert tile.ports.keys() == expected[bit_width][coord].ports.keys()
+        for node in get_all_nodes(graph):
+            assert node.store is graph.store
+        # compacted graphs survive pickling
+        graph = pickle.loads(pickle.dumps(graph))
+        assert graph[1, 1].core is None
+        graph.resolve_cores(dummy_col)
+        assert graph[1, 1].core is cores[1, 1]
+        for old, new in zip(get_all_nodes(expected[bit_width]),
+                            get_all_nodes(graph)):
+            assert old == new
+            assert [n.key() for n in old] == [n.key() for n in new]
+
+
+def test_node_conn_in_index():
+    port = PortNode("test", 0, 0, 16)
+    nodes = [SwitchBoxNode(0, 0, track, 16, SwitchBoxSide.EAST,
+                           SwitchBoxIO.SB_IN) for track in range(5)]
+    for idx, node in enumerate(nodes):
+        node.add_edge(port, idx)
+        # duplicated edges are ignored
+        node.add_edge(port)
+    assert port.get_conn_in() == nodes
+    for idx, node in enumerate(nodes):
+        assert port.get_conn_in_index(node) == idx
+        assert node.get_edge_cost(port) == idx
+
+    # removing an edge shifts the ports after it and re-adding appends it
+    nodes[1].remove_edge(port)
+    assert port.get_conn_in() == [nodes[0]] + nodes[2:]
+    assert port.get_conn_in_index(nodes[2]) == 1
+    with pytest.raises(ValueError):
+        port.get_conn_in_index(nodes[1])
+    assert nodes[1].get_edge_cost(port) == MAX_DEFAULT_DELAY
+    nodes[1].add_edge(port)
+    assert port.get_conn_in_index(nodes[1]) == 4
+    assert port in nodes[1]
+
+
+def test_node_identity():
+    def sb_node(x, y):
+        return SwitchBoxNode(x, y, 0, 16, SwitchBoxSide.EAST,
+                             SwitchBoxIO.SB_IN)
+    # symmetric coordinates used to collide
+    assert hash(sb_node(1, 2)) != hash(sb_node(2, 1))
+    assert sb_node(1, 2) != sb_node(2, 1)
+    assert sb_node(1, 2) == sb_node(1, 2)
+    assert hash(sb_node(1, 2)) == hash(sb_node(1, 2))
+    assert len({sb_node(x, y) for x in range(8) for y in range(8)}) == 64
+
+    assert PortNode("a", 0, 0, 16) == PortNode("a", 0, 0, 16)
+    assert PortNode("a", 0, 0, 16) != PortNode("a", 0, 0, 1)
+    assert PortNode("a", 0, 0, 16) != RegisterNode("a", 0, 0, 0, 16)
+    # generic nodes don't have a structural identity
+    assert Node(0, 0, 16) != Node(0, 0, 16)
+
+    # views are interchangeable with the node objects
+    ic = create_pipelined_interconnect(2, 16, 2)
+    expected = get_all_nodes(ic)
+    ic.compact()
+    for old, new in zip(expected, get_all_nodes(ic)):
+        assert old is not new
+        assert old == new and hash(old) == hash(new)
+        assert old.key() == new.key()
+        assert old.circuit_name() == new.circuit_name() == create_name(str(old))
+        # the names are only computed once
+        assert new.circuit_name() is new.circuit_name()
+
+
+def test_save_load():
+    ic = create_pipelined_interconnect(3, 16)
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "graph.bin")
+        ic.save(filename)
+        graph = InterconnectGraph.load(filename)
+        assert graph.store.num_views == 0
+
+        expected_filename = os.path.join(tempdir, "expected.graph")
+        ic.dump_graph(expected_filename, 3)
+        actual_filename = os.path.join(tempdir, "actual.graph")
+        graph.dump_graph(actual_filename, 3)
+        assert filecmp.cmp(expected_filename, actual_filename, shallow=False)
+        for old, new in zip(get_all_nodes(ic), get_all_nodes(graph)):
+            assert old == new and hash(old) == hash(new)
+            assert [n.key() for n in old] == [n.key() for n in new]
+            for n in new:
+                assert new.get_edge_cost(n) == old.get_edge_cost(n)
+        # views are created once, on first access
+        for node in get_all_nodes(graph):
+            assert graph.store.node(node.node_id) is node
+        assert graph[1, 1].switchbox.id == ic[1, 1].switchbox.id
+        assert graph[1, 1].core is None
+        graph.resolve_cores(lambda x, y: ic[x, y].core)
+        assert graph[1, 1].core is ic[1, 1].core
+
+        with open(filename, "r+b") as f:
+            f.write(b"garbage")
+        with pytest.raises(ValueError):
+            InterconnectGraph.load(filename)
@@ -0,0 +1,73 @@
+from kcanal.tester import Tester
+from kcanal.cyclone import SwitchBoxSide, SwitchBoxIO
+from kratos import initial, posedge, negedge
+from kratos.util import fopen, fscanf, fclose, urandom, finish
+from kratos.tb import delay, assert_
+
+import os
+import pytest
+import tempfile
+
+
+@pytest.mark.parametrize("widths", [(8, 32, 16), (4, 24, 8)])
+def test_interconnect_burst(create_dummy_interconnect, widths):
+    addr_width, full_config_addr_width, tile_id_width = widths
+    interconnect = create_dummy_interconnect(2, 2, addr_width=addr_width, tile_id_width=tile_id_width,
+                                             full_config_addr_width=full_config_addr_width, burst=True)
+    graph = interconnect.get_graph(16)
+    # a track from the west edge to the east edge of the first row, bypassing the pipeline registers
+    route = []
+    for x in range(2):
+        sb_in = graph.get_sb(x, 0, SwitchBoxSide.WEST, 0, SwitchBoxIO.SB_IN)
+        sb_out = graph.get_sb(x, 0, SwitchBoxSide.EAST, 0, SwitchBoxIO.SB_OUT)
+        route += [sb_in, sb_out, graph[x, 0].switchbox.get_reg_mux(SwitchBoxSide.EAST, 0)]
+    src_name = route[0].circuit_name() + "_X0_Y0"
+    dst_name = route[-2].circuit_name() + "_X1_Y0"
+    bursts = interconnect.get_burst_bitstream({"e0": [route]})
+    num_beats = sum(len(data) for _, data in bursts)
+
+    with tempfile.TemporaryDirectory() as temp:
+        # one beat per line: config_burst, config_addr and config_data. the address of the beats that continue a
+        # burst is ignored
+        with open(os.path.join(temp, "config_data.bs"), "w+") as f:
+            for start, data in bursts:
+                for i, word in enumerate(data):
+                    f.write(f"{int(i > 0)} {start if i == 0 else 0:08X} {word:08X}\n")
+
+        class InterconnectTester(Tester):
+            def __init__(self):
+                super(InterconnectTester, self).__init__(interconnect.config_addr.width,
+                                                         interconnect.config_data_width)
+                self.value = self.var("value", 32)
+                self.add_dut(interconnect)
+                self.bs_filename = "config_data.bs"
+                self.num_config = num_beats
+                self.add_code(self.test_config, unroll_for=True)
+
+            @initial
+            def test_config(self):
+                self.reset()
+                self.fd = fopen(self.bs_filename, "r")
+                for i in range(self.num_config):
+                    self.scanf_read = fscanf(self.fd, "%1h %08h %08h", self.vars.config_burst, self.config_addr,
+                                             self.config_data)
+                    self.configure(self.config_addr, self.config_data)
+                    # an idle cycle between the beats does not advance the burst
+                    posedge(self.clk)
+                    negedge(self.clk)
+                fclose(self.fd)
+                self.vars.config_burst = 0
+
+                # test it 42 times
+                for i in range(42):
+                    self.value = urandom() % 0xFFFF
+                    self.vars[src_name] = self.value[15, 0]
+                    delay(1, None)
+                    assert_(self.vars[dst_name] == self.value)
+
+                finish()
+
+        tester = InterconnectTester()
+
+        filename = os.path.join(temp, "test.sv")
+        tester.run(filename)
@@ -1,8 +1,12 @@
 import tempfile
 import os
 import archipelago
+import pytest
 
-from kcanal.cyclone import PortNode
+from kcanal import ConfigPacking
+from kcanal.cyclone import PortNode, SwitchBoxSide, SwitchBoxIO
+from kcanal.pnr import read_pnr, build_node_index, RouteErrorKind
+from kcanal.util import merge_bitstream
 
 
 def test_dump_pnr(create_dummy_interconnect):
@@ -18,6 +22,284 @@ def test_dump_pnr(create_dummy_interconnect):
         assert os.path.isfile(os.path.join(tempdir, f"{design_name}.layout"))
 
 
+def test_parallel_dump_pnr(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+
+    with tempfile.TemporaryDirectory() as serial, tempfile.TemporaryDirectory() as parallel:
+        # USAGE
+        interconnect.dump_pnr(serial, "test")
+        interconnect.dump_pnr(parallel, "test", processes=2)
+
+        # TESTS
+        filenames = sorted(os.listdir(serial))
+        assert filenames == sorted(os.listdir(parallel)) == ["1.graph", "16.graph", "test.info", "test.layout"]
+        for filename in filenames:
+            with open(os.path.join(serial, filename), "rb") as f:
+                expected = f.read()
+            with open(os.path.join(parallel, filename), "rb") as f:
+                # the info file holds the paths of the other files
+                assert f.read().replace(parallel.encode(), serial.encode()) == expected
+
+
+def test_dump_pnr_roundtrip_check(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+    port = interconnect.get_graph(16).get_port(1, 1, "out16")
+    for node in list(port):
+        port.remove_edge(node)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        # USAGE
+        with pytest.warns(UserWarning) as record:
+            findings = interconnect.dump_pnr(tempdir, "test", processes=2, check_roundtrip=True)
+
+        # TESTS
+        # the workers return what they found, which is warned about in this process
+        assert findings[1] == [] and len(findings[16]) == 1
+        assert port.node_str() in findings[16][0]
+        assert [str(r.message) for r in record] == [f"16.graph: {findings[16][0]}"]
+        assert interconnect.dump_pnr(tempdir, "test", processes=2) == {1: [], 16: []}
+
+
+def test_read_pnr(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+
+    design_name = "test"
+    with tempfile.TemporaryDirectory() as tempdir:
+        interconnect.dump_pnr(tempdir, design_name)
+
+        # USAGE
+        pnr_collateral = read_pnr(os.path.join(tempdir, f"{design_name}.info"))
+
+    # TESTS
+    assert " " in pnr_collateral.layout
+    assert set(pnr_collateral.graphs) == {1, 16}
+    index = build_node_index([interconnect.get_graph(1), interconnect.get_graph(16)])
+    for node_str, node in pnr_collateral.nodes.items():
+        assert index[node_str] == node
+
+
+def test_parse_routes(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+    graph = interconnect.get_graph(16)
+    sb = graph.get_sb(1, 1, SwitchBoxSide.EAST, 0, SwitchBoxIO.SB_OUT)
+    port = next(iter(graph[1, 1].ports.values()))
+    routes = {"e0": [[("SB", 0, 1, 1, SwitchBoxSide.EAST.value, SwitchBoxIO.SB_OUT.value, 16),
+                      ("PORT", port.name, 1, 1, 16)]]}
+
+    # USAGE
+    result = interconnect.parse_routes(routes)
+
+    # TESTS
+    assert result == {"e0": [[sb, port]]}
+    assert result["e0"][0] == [interconnect.parse_node(node_str) for node_str in routes["e0"][0]]
+    routes["e1"] = [[("PORT", "unknown", 1, 1, 16), ("SB", 100, 1, 1, 0, 0, 16)]]
+    with pytest.raises(ValueError) as ex:
+        interconnect.parse_routes(routes)
+    # all the unresolved nodes are reported
+    assert "unknown" in str(ex.value) and "SB 100" in str(ex.value)
+
+
+def test_route_config_table(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+
+    # USAGE
+    table = interconnect.get_route_config_table()
+
+    # TESTS
+    assert len(table) > 0
+    for (src_node, dst_node), configs in table.items():
+        assert dst_node in src_node
+        expected = interconnect.get_node_bitstream_config(src_node, dst_node)
+        assert [(addr, value) for addr, _, value in configs] == expected
+        for _, mask, value in configs:
+            assert value & mask == value
+
+
+
+def test_route_bitstream(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+    graph = interconnect.get_graph(16)
+    sb = graph.get_sb(1, 1, SwitchBoxSide.EAST, 0, SwitchBoxIO.SB_OUT)
+    src0, src1 = sb.get_conn_in()[:2]
+    routes = {"e0": [[src0, sb]]}
+
+    # USAGE
+    bitstream = interconnect.get_bitstream(routes)
+
+    # TESTS
+    assert bitstream.to_list() == merge_bitstream(interconnect.get_route_bitstream(routes))
+    assert len(bitstream.mask) == len(bitstream)
+    # two nets driving the same mux
+    routes["e1"] = [[src1, sb]]
+    with pytest.raises(ValueError):
+        interconnect.get_bitstream(routes)
+    # rerouting the mux on top of the previous image
+    result = interconnect.get_bitstream({"e1": routes["e1"]}, base=bitstream)
+    assert result.to_list() == interconnect.get_bitstream({"e1": routes["e1"]}).to_list()
+
+
+def test_tile_packed_route_bitstream(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4, config_packing=ConfigPacking.Tile)
+    graph = interconnect.get_graph(16)
+    sb = graph.get_sb(1, 1, SwitchBoxSide.EAST, 0, SwitchBoxIO.SB_OUT)
+    port = graph.get_port(1, 1, "in16")
+    edges = [(sb.get_conn_in()[1], sb), (port.get_conn_in()[1], port)]
+    routes = {f"e{i}": [list(edge)] for i, edge in enumerate(edges)}
+
+    # USAGE
+    configs = interconnect.get_route_bitstream(routes)
+
+    # TESTS
+    expected = []
+    for src_node, dst_node in edges:
+        expected += interconnect.get_node_bitstream_config(src_node, dst_node)
+    assert configs == expected
+    assert interconnect.get_bitstream(routes).to_list() == merge_bitstream(configs)
+    # the fields are in the registers of the tile, which are after the features
+    tile = interconnect.tile_circuits[1, 1]
+    for src_node, dst_node in edges:
+        (_, sel_addr, sel_mask, sel), (_, en_addr, en_mask, en) = tile.get_route_config_mask(src_node, dst_node)
+        assert sel_addr == en_addr == len(tile.features)
+        assert sel >> ((sel_mask & -sel_mask).bit_length() - 1) == dst_node.get_conn_in_index(src_node)
+        assert en == en_mask & -en_mask
+    # the features don't have registers of their own
+    with pytest.raises(ValueError):
+        tile.sbs[16].get_route_bitstream_config(*edges[0])
+    cb = tile.cbs["in16"]
+    with pytest.raises(ValueError):
+        cb.get_route_bitstream_config(cb.node.get_conn_in()[0])
+
+
+def test_bitstream_delta(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+    graph = interconnect.get_graph(16)
+    sb0 = graph.get_sb(1, 1, SwitchBoxSide.EAST, 0, SwitchBoxIO.SB_OUT)
+    sb1 = graph.get_sb(2, 2, SwitchBoxSide.EAST, 0, SwitchBoxIO.SB_OUT)
+    old_routes = {"e0": [[sb0.get_conn_in()[0], sb0]], "e1": [[sb1.get_conn_in()[0], sb1]]}
+    new_routes = {"e0": [[sb0.get_conn_in()[1], sb0]]}
+
+    # USAGE
+    delta = interconnect.get_bitstream_delta(old_routes, new_routes)
+
+    # TESTS
+    old = interconnect.get_bitstream(old_routes)
+    new = interconnect.get_bitstream(new_routes)
+    assert 0 < len(delta) < len(old) + len(new)
+    # e1 is no longer routed and its mux is cleared
+    assert set(delta.addr.tolist()) >= set(interconnect.get_bitstream({"e1": old_routes["e1"]}).addr.tolist())
+    assert len(interconnect.get_bitstream_delta(old_routes, old_routes)) == 0
+
+
+def test_parallel_route_bitstream(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+    graph = interconnect.get_graph(16)
+    routes = {}
+    for x in range(4):
+        for y in range(4):
+            sb = graph.get_sb(x, y, SwitchBoxSide.EAST, 0, SwitchBoxIO.SB_OUT)
+            routes[f"e{x}_{y}"] = [[sb.get_conn_in()[0], sb]]
+
+    # USAGE
+    configs = interconnect.get_route_bitstream(routes, processes=3)
+
+    # TESTS
+    assert configs == interconnect.get_route_bitstream(routes)
+    assert interconnect.get_bitstream(routes, processes=3) == interconnect.get_bitstream(routes)
+    assert interconnect.get_bitstream_delta(routes, {}, processes=3) == interconnect.get_bitstream_delta(routes, {})
+    assert interconnect.get_route_bitstream({}, processes=3) == []
+
+
+def test_burst_bitstream(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+    graph = interconnect.get_graph(16)
+    routes = {}
+    for x in range(4):
+        for y in range(4):
+            for track in range(4):
+                sb = graph.get_sb(x, y, SwitchBoxSide.EAST, track, SwitchBoxIO.SB_OUT)
+                routes[f"e{x}_{y}_{track}"] = [[sb.get_conn_in()[0], sb]]
+
+    # USAGE
+    bursts = interconnect.get_burst_bitstream(routes)
+
+    # TESTS
+    bitstream = interconnect.get_bitstream(routes)
+    words = {start + i * interconnect.config_burst_step: data for start, burst in bursts
+             for i, data in enumerate(burst)}
+    assert words == dict(bitstream.to_list())
+    # fewer config bus transactions than one (addr, data) pair per word
+    assert sum(1 + len(burst) for _, burst in bursts) < 2 * len(bitstream)
+
+
+def test_validate_routes(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+    graph = interconnect.get_graph(16)
+    src = graph[1, 1].ports["out16"]
+    sb_out = graph.get_sb(1, 1, SwitchBoxSide.EAST, 0, SwitchBoxIO.SB_OUT)
+    reg = graph[1, 1].switchbox.registers["T0_EAST"]
+    rmux = next(iter(reg))
+    sb_in = graph.get_sb(2, 1, SwitchBoxSide.WEST, 0, SwitchBoxIO.SB_IN)
+    dst = graph[2, 1].ports["in16"]
+    routes = {"e0": [[src, sb_out, reg, rmux, sb_in, dst]]}
+
+    # USAGE
+    diagnostics = interconnect.validate_routes(routes)
+
+    # TESTS
+    assert diagnostics == []
+    # a second net going through the same wire into a 1-bit port
+    routes["e1"] = [[graph[1, 2].ports["out16"], sb_in, interconnect.get_graph(1)[2, 1].ports["in1"]],
+                    [src, sb_out, reg]]
+    diagnostics = interconnect.validate_routes(routes)
+    kinds = {(d.net, d.segment, d.index, d.kind) for d in diagnostics}
+    assert kinds == {("e1", 0, 1, RouteErrorKind.Conflict), ("e1", 0, 1, RouteErrorKind.Disconnected),
+                     ("e1", 0, 2, RouteErrorKind.WidthMismatch), ("e1", 0, 2, RouteErrorKind.Disconnected),
+                     ("e1", 1, 0, RouteErrorKind.InvalidDriver), ("e1", 1, 0, RouteErrorKind.Conflict),
+                     ("e1", 1, 1, RouteErrorKind.Conflict), ("e1", 1, 2, RouteErrorKind.Conflict),
+                     ("e1", 1, 2, RouteErrorKind.Dangling)}
+    assert "used by e0" in str(diagnostics[0])
+
+
+def test_validate_routes_drivers(create_dummy_interconnect):
+    interconnect = create_dummy_interconnect(4, 4)
+    graph = interconnect.get_graph(16)
+
+    def hop(x, y, side_in, side_out):
+        # through the switch box at (x, y) and the register mux of its output
+        return [graph.get_sb(x, y, side_in, 0, SwitchBoxIO.SB_IN),
+                graph.get_sb(x, y, side_out, 0, SwitchBoxIO.SB_OUT),
+                graph[x, y].switchbox.get_reg_mux(side_out, 0)]
+
+    src = graph[1, 1].ports["out16"]
+    sb_out = graph.get_sb(1, 1, SwitchBoxSide.EAST, 0, SwitchBoxIO.SB_OUT)
+    reg = graph[1, 1].switchbox.registers["T0_EAST"]
+    rmux = graph[1, 1].switchbox.get_reg_mux(SwitchBoxSide.EAST, 0)
+    dst = graph[2, 1].ports["in16"]
+    sb_in = graph.get_sb(2, 1, SwitchBoxSide.WEST, 0, SwitchBoxIO.SB_IN)
+    route = [src, sb_out, reg, rmux, sb_in, dst]
+    # a segment revisiting the nodes of the net the same way is legal
+    routes = {"e0": [route, route[1:]]}
+
+    # USAGE
+    diagnostics = interconnect.validate_routes(routes)
+
+    # TESTS
+    assert diagnostics == []
+    # the register mux taking both its register and the bypass
+    routes = {"e0": [route, [sb_out, rmux, sb_in, dst]]}
+    diagnostics = interconnect.validate_routes(routes)
+    assert [(d.segment, d.index, d.kind) for d in diagnostics] == [(1, 1, RouteErrorKind.RegisterBypass)]
+    # a loop back into the switch box the net starts from
+    loop = [src, sb_out, rmux] + hop(2, 1, SwitchBoxSide.WEST, SwitchBoxSide.NORTH) + \
+        hop(2, 0, SwitchBoxSide.SOUTH, SwitchBoxSide.WEST) + hop(1, 0, SwitchBoxSide.EAST, SwitchBoxSide.SOUTH) + \
+        [graph.get_sb(1, 1, SwitchBoxSide.NORTH, 0, SwitchBoxIO.SB_IN), sb_out]
+    diagnostics = interconnect.validate_routes({"e0": [loop]})
+    assert [(d.index, d.kind) for d in diagnostics] == [(len(loop) - 1, RouteErrorKind.MultipleDrivers),
+                                                       (len(loop) - 1, RouteErrorKind.Dangling)]
+    # the first driver is looked up by its ID
+    assert diagnostics[0].message.endswith(f"reached from {loop[-2].node_str()} and {src.node_str()}")
+
+
 def test_pnr(create_dummy_interconnect):
     interconnect = create_dummy_interconnect(4, 4)
     netlist = {"e0": [("D0", "out16"), ["D1", "in16"]]}
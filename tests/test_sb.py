@@ -6,14 +6,18 @@ from kratos.util import fopen, fscanf, fclose, urandom, finish
 from kratos.tb import delay, assert_
 
 import os
+import pytest
 import tempfile
 
 
-def test_sb_no_fifo():
+@pytest.mark.parametrize("register_file", [False, True])
+def test_sb_no_fifo(register_file):
     addr_width = 8
     data_width = 32
     switchbox = DisjointSwitchBox(0, 0, 5, 16)
     sb = SB(switchbox, addr_width, data_width, "Test")
+    # the same bitstream configures either backend
+    sb.register_file = register_file
     sb.finalize()
 
     src_node = switchbox.get_sb(SwitchBoxSide.WEST, 0, SwitchBoxIO.SB_IN)